@@ -0,0 +1,98 @@
+"""Сравнение затрат CPU и экономии трафика при сжатии списка постов.
+
+Строит ответ /api/v1/posts/ из синтетических постов и для каждой кодировки
+и уровня сжатия считает время сжатия, размер и выигрыш во времени передачи
+на канале заданной ширины. Postgres и Redis не нужны.
+
+Запуск:
+    python -m benchmarks.compression_benchmark --posts 500 --bandwidth-mbit 20
+"""
+import argparse
+import random
+import statistics
+import time
+import zlib
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from src.api.v1.schemas import PostListResponse, PostModel
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+WORDS = (
+    "пост автор новость редакция обновление сервис данные запрос ответ кэш "
+    "fastapi redis postgres python benchmark latency throughput список поиск"
+).split()
+
+
+def build_payload(posts_count: int) -> bytes:
+    random.seed(42)
+    authors = [str(uuid4()) for _ in range(50)]
+    created_at = datetime(2022, 7, 19)
+    posts = [
+        PostModel(
+            id=post_id,
+            title=" ".join(random.choices(WORDS, k=6)),
+            description=" ".join(random.choices(WORDS, k=random.randint(20, 200))),
+            created_at=created_at + timedelta(minutes=post_id),
+            author_id=random.choice(authors),
+        )
+        for post_id in range(1, posts_count + 1)
+    ]
+    return PostListResponse(posts=posts).json(ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def gzip_compress(level: int):
+    def compress(body: bytes) -> bytes:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(body) + compressor.flush()
+    return compress
+
+
+def brotli_compress(quality: int):
+    return lambda body: brotli.compress(body, quality=quality)
+
+
+def measure(compress, body: bytes, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        compressed = compress(body)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), len(compressed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=500, help="количество постов в ответе")
+    parser.add_argument("--repeat", type=int, default=20, help="количество замеров на вариант")
+    parser.add_argument("--bandwidth-mbit", type=float, default=20.0, help="ширина канала до клиента")
+    args = parser.parse_args()
+
+    body = build_payload(args.posts)
+    bytes_per_second = args.bandwidth_mbit * 1_000_000 / 8
+    raw_transfer_ms = len(body) / bytes_per_second * 1000
+
+    variants = [(f"gzip-{level}", gzip_compress(level)) for level in (1, 6, 9)]
+    if brotli is not None:
+        variants += [(f"br-{quality}", brotli_compress(quality)) for quality in (1, 4, 6, 11)]
+
+    print(f"Ответ: {args.posts} постов, {len(body)} байт, передача без сжатия {raw_transfer_ms:.2f} мс")
+    print(f"{'вариант':<10}{'размер':>10}{'степень':>10}{'CPU, мс':>10}{'передача, мс':>15}{'выигрыш, мс':>14}")
+    for name, compress in variants:
+        cpu_seconds, size = measure(compress, body, args.repeat)
+        transfer_ms = size / bytes_per_second * 1000
+        # Выигрыш: сэкономленное время передачи минус время сжатия
+        gain_ms = raw_transfer_ms - transfer_ms - cpu_seconds * 1000
+        print(
+            f"{name:<10}{size:>10}{len(body) / size:>10.1f}"
+            f"{cpu_seconds * 1000:>10.2f}{transfer_ms:>15.2f}{gain_ms:>14.2f}"
+        )
+    print("Ответы, взятые из кэша уже сжатыми, не тратят CPU на сжатие")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Масштабирование пропускной способности с ростом количества процессов сервера.
+
+Для каждого значения --workers поднимает gunicorn с gunicorn.conf.py на
+свободном порту, нагружает указанный путь по keep-alive соединениям из
+нескольких клиентских процессов и печатает запросы в секунду.
+
+По умолчанию нагружается корень "/", который не ходит в Postgres и Redis,
+поэтому виден потолок самого сервера. Клиенту тоже нужны ядра: на машине
+с N ядрами честно измерить можно примерно до N/2 процессов сервера.
+
+Запуск:
+    python -m benchmarks.workers_benchmark --workers 1 2 4 --duration 10
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+CONTENT_LENGTH = re.compile(rb"content-length:\s*(\d+)", re.IGNORECASE)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start in {timeout} seconds")
+
+
+async def connection_loop(port: int, path: str, deadline: float) -> int:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    request = f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode()
+    completed = 0
+    while time.monotonic() < deadline:
+        writer.write(request)
+        headers = await reader.readuntil(b"\r\n\r\n")
+        await reader.readexactly(int(CONTENT_LENGTH.search(headers).group(1)))
+        completed += 1
+    writer.close()
+    return completed
+
+
+def client_process(port: int, path: str, connections: int, duration: float) -> int:
+    async def run() -> int:
+        deadline = time.monotonic() + duration
+        results = await asyncio.gather(*(connection_loop(port, path, deadline) for _ in range(connections)))
+        return sum(results)
+    return asyncio.run(run())
+
+
+def run_server(workers: int, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(workers),
+        "SERVER_HOST": "127.0.0.1",
+        "SERVER_PORT": str(port),
+        # Фоновые воркеры не нужны и только мешают замеру
+        "POST_OUTBOX_WORKER_ENABLED": "false",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--access-logfile", os.devnull, "main:app"],
+        cwd=PROJECT_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="количество процессов сервера")
+    parser.add_argument("--path", default="/", help="нагружаемый путь")
+    parser.add_argument("--duration", type=float, default=10, help="длительность замера, секунд")
+    parser.add_argument("--clients", type=int, default=max(1, multiprocessing.cpu_count() // 2),
+                        help="количество клиентских процессов")
+    parser.add_argument("--connections", type=int, default=32, help="соединений на клиентский процесс")
+    args = parser.parse_args()
+
+    print(f"Ядер: {multiprocessing.cpu_count()}, клиентов: {args.clients} x {args.connections} соединений")
+    print(f"{'процессов':>10}{'запросов/с':>14}{'ускорение':>12}")
+    baseline = None
+    for workers in args.workers:
+        port = free_port()
+        server = run_server(workers, port)
+        try:
+            wait_until_ready(port)
+            # Прогрев: первые запросы в каждом процессе заметно медленнее
+            client_process(port, args.path, args.connections, 1)
+            with multiprocessing.Pool(args.clients) as pool:
+                completed = sum(pool.starmap(
+                    client_process,
+                    [(port, args.path, args.connections, args.duration)] * args.clients,
+                ))
+        finally:
+            server.terminate()
+            server.wait()
+        rps = completed / args.duration
+        baseline = baseline or rps
+        print(f"{workers:>10}{rps:>14.0f}{rps / baseline:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Массовый импорт пользователей из CSV или NDJSON.
+
+CSV — с заголовком username,email,password, NDJSON — объект с теми же полями
+в каждой строке. Отчет по каждой строке печатается в stdout в формате NDJSON,
+последняя строка — итоги. Повторный запуск с тем же файлом безопасен: уже
+существующие пользователи попадут в отчет как дубликаты.
+
+Запуск:
+    python -m commands.import_users users.csv > report.ndjson
+    python -m commands.import_users - --format ndjson < users.ndjson
+"""
+import argparse
+import json
+import sys
+
+from sqlmodel import Session
+
+from src.core import config
+from src.db import get_engine
+from src.services.user_import import IMPORT_FORMATS, UserImportService, read_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="путь к файлу, - — читать stdin")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="формат файла, по умолчанию — по расширению")
+    parser.add_argument("--chunk-size", type=int, default=config.USER_IMPORT_CHUNK_SIZE,
+                        help="строк в одной вставке")
+    parser.add_argument("--hash-workers", type=int, default=config.USER_IMPORT_HASH_WORKERS,
+                        help="процессов для хеширования паролей, 1 — без пула")
+    args = parser.parse_args()
+
+    file_format = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    engine = get_engine()
+    # Движок логирует SQL в stdout и перемешал бы его с отчетом
+    engine.echo = False
+    stream = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8-sig", newline="")
+    with stream, Session(engine) as session:
+        service = UserImportService(session, chunk_size=args.chunk_size, hash_workers=args.hash_workers)
+        for report in service.import_rows(read_rows(stream, file_format)):
+            print(json.dumps(report, ensure_ascii=False))
+            if "summary" in report:
+                totals = report["summary"]
+                print(
+                    f"Создано: {totals['created']}, дубликатов: {totals['duplicate']}, "
+                    f"с ошибками: {totals['invalid']}",
+                    file=sys.stderr,
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Настройки gunicorn для продакшена: несколько процессов с uvicorn-воркерами.
+
+Запуск:
+    gunicorn -c gunicorn.conf.py main:app
+
+Приложение загружается в мастере до fork (preload_app), поэтому процессы
+стартуют быстро и делят память с мастером. Соединения с базами в мастере
+не открываются: движок SQLAlchemy и клиенты Redis создаются лениво в каждом
+процессе, а движок дополнительно сбрасывается после fork.
+
+Плавный перезапуск процессов: kill -HUP <pid мастера>.
+С preload_app HUP не перечитывает код, для выкладки новой версии без простоя:
+kill -USR2 <pid мастера>, затем kill -TERM <pid старого мастера>.
+"""
+import multiprocessing
+
+# Имя config занято настройкой gunicorn
+from src.core import config as app_config
+
+bind = f"{app_config.SERVER_HOST}:{app_config.SERVER_PORT}"
+workers = app_config.SERVER_WORKERS or multiprocessing.cpu_count()
+if app_config.CACHE_BACKEND == "memory":
+    # Кэш в памяти у каждого процесса свой: выход в одном процессе не заметили бы остальные
+    workers = 1
+# uvicorn сам выберет uvloop и httptools, если они установлены
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+graceful_timeout = app_config.SERVER_GRACEFUL_TIMEOUT_IN_SECONDS
+timeout = app_config.SERVER_GRACEFUL_TIMEOUT_IN_SECONDS * 2
+keepalive = 5
+max_requests = app_config.SERVER_MAX_REQUESTS
+max_requests_jitter = app_config.SERVER_MAX_REQUESTS // 10
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    """Каждый процесс открывает свой пул соединений с Postgres.
+
+    Движок создается лениво, но если мастер все же успел его создать,
+    унаследованные соединения закрывать нельзя: ими владеет мастер.
+    dispose(close=False) просто забывает их.
+    """
+    from src.db import dispose_engine
+
+    dispose_engine(close=False)
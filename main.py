@@ -1,10 +1,26 @@
-import redis
-import uvicorn
-from fastapi import FastAPI
+# Профиль запуска импортируется первым, чтобы замер начался как можно раньше
+from src.core.startup import startup_profile
 
-from src.api.v1.resources import posts, users
-from src.core import config
-from src.db import cache, redis_cache
+import logging
+import threading
+
+with startup_profile.stage("import:framework"):
+    import uvicorn
+    from fastapi import FastAPI, Request, status
+    from fastapi.responses import JSONResponse
+
+with startup_profile.stage("import:application"):
+    from src.api.v1.resources import admin, health, posts, users
+    from src.core import config
+    from src.core.compression import CompressionMiddleware
+    from src.core.periodic import PeriodicTask
+    from src.core.profiling import ProfilingMiddleware
+    from src.db import cache, dispose_engine, memory_cache, redis_cache, warm_up_pools
+    from src.services.outbox import PostOutboxWorker
+    from src.services.post_list_snapshot import post_list_materializer
+    from src.services.sessions import session_activity
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     # Конфигурируем название проекта. Оно будет отображаться в документации
@@ -23,51 +39,110 @@ def root():
     return {"service": config.PROJECT_NAME, "version": config.VERSION}
 
 
+@app.exception_handler(cache.CacheUnavailableError)
+def cache_unavailable_handler(request: Request, exc: cache.CacheUnavailableError):
+    # Без Redis нельзя выполнить операции с токенами; клиент может повторить запрос позже
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "service temporarily unavailable"},
+        headers={"Retry-After": str(int(config.REDIS_BREAKER_RECOVERY_TIMEOUT_IN_SECONDS))},
+    )
+
+
+def _warm_up():
+    try:
+        with startup_profile.stage("init:prewarm"):
+            warm_up_pools(config.STARTUP_PREWARM_CONNECTIONS)
+    except Exception:
+        # Недоступная база не должна навсегда держать сервер неготовым
+        logger.exception("Failed to pre-warm connection pools")
+    startup_profile.mark_ready()
+    logger.info("Startup profile: %s", startup_profile.as_dict())
+
+
 @app.on_event("startup")
 def startup():
-    """Подключаемся к базам при старте сервера"""
-    cache.posts_cache = redis_cache.PostCacheRedis(
-        cache_instance=redis.Redis(
-            host=config.REDIS_HOST,
-            port=config.REDIS_PORT,
-            db=0,
-            decode_responses=True,
-            max_connections=10,
-        )
-    )
+    """Подключаемся к базам при старте сервера.
 
-    cache.blocked_access_tokens_cache = redis_cache.AccessCacheRedis(
-        cache_instance=redis.Redis(
-            host=config.REDIS_HOST,
-            port=config.REDIS_PORT,
-            db=1,
-            decode_responses=True,
-            max_connections=10,
+    Движок и клиенты Redis создаются при первом обращении, здесь только
+    регистрируются фабрики. Соединения заранее открываются в фоне, если
+    задан STARTUP_PREWARM_CONNECTIONS.
+    """
+    with startup_profile.stage("init:caches"):
+        backend = memory_cache if config.CACHE_BACKEND == "memory" else redis_cache
+        cache.register_cache_factories(
+            posts=backend.create_posts_cache,
+            access=backend.create_access_cache,
+            refresh=backend.create_refresh_cache,
         )
-    )
 
-    cache.active_refresh_tokens_cache = redis_cache.RefreshCacheRedis(
-        cache_instance=redis.Redis(
-            host=config.REDIS_HOST,
-            port=config.REDIS_PORT,
-            db=2,
-            decode_responses=True,
-            max_connections=10,
+    # Прогрев кэша новыми постами в фоне, без работы с Redis в запросе на создание
+    app.state.post_outbox_worker = None
+    if config.POST_OUTBOX_WORKER_ENABLED:
+        app.state.post_outbox_worker = PostOutboxWorker()
+        app.state.post_outbox_worker.start()
+    else:
+        # События, оставшиеся в outbox с прошлых запусков, без воркера не будут разобраны
+        logger.warning("Post outbox worker is disabled: post caches are invalidated in requests")
+
+    # Готовый ответ списка постов в памяти процесса. Поток запустит первый запрос списка
+    app.state.post_list_materializer = None
+    if config.POST_LIST_SNAPSHOT_ENABLED:
+        app.state.post_list_materializer = post_list_materializer
+        post_list_materializer.enable()
+
+    # Локальная копия черного списка нужна только для проверки токенов без Redis
+    app.state.blocklist_sync = None
+    if config.AUTH_CACHE_FAILURE_POLICY == "open":
+        app.state.blocklist_sync = PeriodicTask(
+            name="access-blocklist-sync",
+            interval=config.AUTH_LOCAL_BLOCKLIST_SYNC_INTERVAL_IN_SECONDS,
+            func=lambda: cache.get_access_cache().sync_local_blocklist(),
         )
+        app.state.blocklist_sync.start()
+
+    # Время использования сессий пишется в Redis пачками, а не на каждый запрос
+    app.state.session_activity_flush = PeriodicTask(
+        name="session-activity-flush",
+        interval=config.SESSION_LAST_USED_FLUSH_INTERVAL_IN_SECONDS,
+        func=session_activity.flush,
     )
+    app.state.session_activity_flush.start()
+
+    if config.STARTUP_PREWARM_CONNECTIONS:
+        threading.Thread(target=_warm_up, name="pool-warm-up", daemon=True).start()
+    else:
+        startup_profile.mark_ready()
 
 
 @app.on_event("shutdown")
 def shutdown():
     """Отключаемся от баз при выключении сервера"""
-    cache.posts_cache.close()
-    cache.blocked_access_tokens_cache.close()
-    cache.active_refresh_tokens_cache.close()
+    if app.state.post_outbox_worker:
+        app.state.post_outbox_worker.stop()
+    if app.state.post_list_materializer:
+        app.state.post_list_materializer.stop()
+    if app.state.blocklist_sync:
+        app.state.blocklist_sync.stop()
+    app.state.session_activity_flush.stop()
+    try:
+        session_activity.flush()
+    except cache.CacheUnavailableError:
+        logger.warning("Session activity was not saved: cache is unavailable")
+    cache.close_caches()
+    dispose_engine()
+
 
+# Сжимаем ответы больше порога. Заранее сжатые ответы из кэша пропускаются как есть
+app.add_middleware(CompressionMiddleware, minimum_size=config.COMPRESSION_MINIMUM_SIZE)
+# Спаны запросов пишутся только во время профилирования, которое включает администратор
+app.add_middleware(ProfilingMiddleware)
 
 # Подключаем роутеры к серверу
+app.include_router(router=health.router, prefix="/health")
 app.include_router(router=posts.router, prefix="/api/v1/posts")
 app.include_router(router=users.router, prefix="/api/v1")
+app.include_router(router=admin.router, prefix="/api/v1/admin")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,87 @@
+import codecs
+import json
+from http import HTTPStatus
+from tempfile import SpooledTemporaryFile
+from typing import Iterator, Optional, Union
+
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+
+from src.api.v1.schemas import UserModel
+from src.core import config
+from src.core.profiling import ProfilingBusyError, run_profiling
+from src.db import get_engine
+from src.services import UserService, get_user_service
+from src.services.user_import import IMPORT_FORMATS, UserImportService, read_rows
+
+router = APIRouter()
+
+
+def get_superuser(
+        authorization: Union[str, None] = Header(default=None),
+        user_service: UserService = Depends(get_user_service)
+) -> UserModel:
+    user = user_service.get_user_by_access_token(authorization)
+    if not user:
+        raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail="Unauthorized user")
+    if not user.is_superuser:
+        raise HTTPException(status_code=HTTPStatus.FORBIDDEN, detail="Superuser required")
+    return user
+
+
+@router.post(
+    path="/profile",
+    tags=["admin"],
+    summary="Профилировать процесс",
+)
+def profile(
+        seconds: float = Query(5, gt=0, le=config.PROFILING_MAX_DURATION_IN_SECONDS),
+        interval_ms: float = Query(config.PROFILING_SAMPLE_INTERVAL_MS, ge=1, le=1000),
+        requests: int = Query(config.PROFILING_MAX_REQUESTS, ge=1, le=config.PROFILING_MAX_REQUESTS),
+        superuser: UserModel = Depends(get_superuser),
+):
+    """Снимает стеки потоков и спаны следующих запросов этого процесса.
+
+    Отвечает, когда пройдет seconds секунд или будет профилировано
+    requests запросов. stacks и request_stacks — строки в формате collapsed
+    stacks для flamegraph.pl или speedscope.
+    """
+    try:
+        return run_profiling(seconds=seconds, interval_ms=interval_ms, max_requests=requests)
+    except ProfilingBusyError:
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Profiling is already running")
+
+
+def _import_report(upload: SpooledTemporaryFile, file_format: str) -> Iterator[str]:
+    # Импорт идет, пока клиент читает отчет, поэтому сессия своя, а не из зависимости запроса
+    with upload, Session(get_engine()) as session:
+        # Строки декодируются по одной: TextIOWrapper не умеет оборачивать SpooledTemporaryFile до Python 3.11
+        lines = codecs.iterdecode(upload, "utf-8-sig")
+        for report in UserImportService(session).import_rows(read_rows(lines, file_format)):
+            yield json.dumps(report, ensure_ascii=False) + "\n"
+
+
+@router.post(
+    path="/users/import",
+    tags=["admin"],
+    summary="Массовый импорт пользователей",
+)
+async def import_users(
+        request: Request,
+        file_format: Optional[str] = Query(None, alias="format", regex=f"^({'|'.join(IMPORT_FORMATS)})$"),
+        superuser: UserModel = Depends(get_superuser),
+):
+    """Тело запроса — CSV с заголовком username,email,password или NDJSON.
+
+    Формат берется из параметра format, без него — из Content-Type. Ответ —
+    NDJSON с отчетом по каждой строке, последняя строка — итоги. Тело
+    сохраняется во временный файл, который после порога пишется на диск.
+    """
+    if file_format is None:
+        file_format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    upload = SpooledTemporaryFile(max_size=config.USER_IMPORT_SPOOL_MAX_SIZE)
+    async for data in request.stream():
+        upload.write(data)
+    upload.seek(0)
+    return StreamingResponse(_import_report(upload, file_format), media_type="application/x-ndjson")
@@ -0,0 +1,43 @@
+from http import HTTPStatus
+
+from fastapi import APIRouter, Depends, Response
+from fastapi.responses import PlainTextResponse
+
+from src.services.health import HealthService, get_health_service
+
+router = APIRouter()
+
+
+@router.get(
+    path="/live",
+    summary="Процесс жив",
+    tags=["health"],
+)
+def liveness():
+    # Зависимости здесь не проверяются: из-за недоступной базы процесс перезапускать не нужно
+    return {"status": "ok"}
+
+
+@router.get(
+    path="/ready",
+    summary="Готовность принимать трафик",
+    tags=["health"],
+)
+def readiness(
+    response: Response,
+    health_service: HealthService = Depends(get_health_service),
+):
+    result = health_service.check_readiness()
+    if not result["ready"]:
+        response.status_code = HTTPStatus.SERVICE_UNAVAILABLE
+    return result
+
+
+@router.get(
+    path="/metrics",
+    summary="Метрики для Prometheus",
+    tags=["health"],
+    response_class=PlainTextResponse,
+)
+def metrics(health_service: HealthService = Depends(get_health_service)):
+    return PlainTextResponse(health_service.render_metrics(), media_type="text/plain; version=0.0.4")
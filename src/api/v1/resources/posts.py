@@ -1,28 +1,135 @@
 from http import HTTPStatus
 from typing import Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response
 
-from src.api.v1.schemas import PostCreate, PostListResponse, PostModel
-from src.services import PostService, get_post_service, UserService, get_user_service
+from src.api.v1.schemas import PostCreate, PostModel, PostPageResponse, PostUpdate
+from src.core import config
+from src.core.compression import choose_encoding, compress
+from src.services import (
+    InvalidCursorError, PostService, get_post_service, UserService, get_user_service, make_post_etag
+)
+from src.services.post_list_snapshot import post_list_materializer, serialize_post_list
 
 router = APIRouter()
 
 
+def _matching_etag(if_none_match: Optional[str], etag: Optional[str]) -> Optional[str]:
+    """ETag из If-None-Match, совпавший с etag (слабое сравнение по RFC 7232), в том виде,
+    в каком он у клиента: слабый ETag сжатого ответа остается слабым. None — не совпал"""
+    if not if_none_match or not etag:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.removeprefix("W/") == etag:
+            return tag
+    return None
+
+
+def _if_match_version(if_match: str, post_id: int) -> Optional[int]:
+    """Версия поста из заголовка If-Match. None — "*", любая версия.
+
+    Принимаются и слабые ETag: сжатые ответы отдаются со слабым ETag той же версии.
+    """
+    if if_match.strip() == "*":
+        return None
+    prefix = f'"{post_id}-'
+    for tag in if_match.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if tag.startswith(prefix) and tag.endswith('"') and tag[len(prefix):-1].isdigit():
+            return int(tag[len(prefix):-1])
+    raise HTTPException(status_code=HTTPStatus.PRECONDITION_FAILED, detail="Post has been modified")
+
+
+def _cache_headers(etag: str, cache_control: str) -> dict:
+    # По тому же адресу отдаются и сжатые варианты: кэш CDN должен различать их по Accept-Encoding
+    return {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+
+def _not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=_cache_headers(etag, cache_control))
+
+
+def _encoded_response(body: bytes, encoding: str, etag: str, cache_control: str) -> Response:
+    """Ответ с заранее сжатым телом. Сжатое представление получает слабый ETag"""
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"Content-Encoding": encoding, **_cache_headers(f"W/{etag}", cache_control)},
+    )
+
+
 @router.get(
     path="/",
-    response_model=PostListResponse,
+    response_model=PostPageResponse,
     summary="Список постов",
     tags=["posts"],
 )
 def post_list(
+    limit: int = Query(
+        default=config.POST_LIST_SNAPSHOT_SIZE, ge=1, le=max(config.POST_LIST_SNAPSHOT_SIZE, config.POSTS_MAX_PAGE_SIZE)
+    ),
+    cursor: Optional[str] = None,
+    if_none_match: Union[str, None] = Header(default=None),
+    accept_encoding: Union[str, None] = Header(default=None),
     post_service: PostService = Depends(get_post_service),
-) -> PostListResponse:
-    posts: dict = post_service.get_post_list()
+) -> PostPageResponse:
+    """Последние limit постов, от старых к новым. next_cursor ведет к более старым постам"""
+    cache_control = f"public, max-age={config.POST_LIST_MAX_AGE_IN_SECONDS}"
+    is_default_page = cursor is None and limit == config.POST_LIST_SNAPSHOT_SIZE
+    # Готовый снимок отдается из памяти процесса: без Redis, базы и сериализации
+    if is_default_page and (snapshot := post_list_materializer.get_snapshot()) is not None:
+        if matched_etag := _matching_etag(if_none_match, snapshot.etag):
+            return _not_modified(matched_etag, cache_control)
+        encoding = choose_encoding(accept_encoding)
+        if encoding in snapshot.encoded:
+            return _encoded_response(snapshot.encoded[encoding], encoding, snapshot.etag, cache_control)
+        return Response(
+            content=snapshot.body,
+            media_type="application/json",
+            headers=_cache_headers(snapshot.etag, cache_control),
+        )
+
+    # Версию списка узнаем до чтения постов: если пост появится между запросами,
+    # клиент получит устаревший ETag и просто перечитает список в следующий раз
+    etag = post_service.get_list_etag(page=None if is_default_page else f"{limit}-{cursor or ''}")
+    if matched_etag := _matching_etag(if_none_match, etag):
+        return _not_modified(matched_etag, cache_control)
+
+    try:
+        posts: dict = post_service.get_post_list(limit=limit, cursor=cursor)
+    except InvalidCursorError:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="invalid cursor")
     if not posts:
         # Если посты не найдены, отдаём 404 статус
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="posts not found")
-    return PostListResponse(**posts)
+    # Сериализация та же, что у снимка: ETag списка всегда соответствует одним и тем же байтам
+    return Response(
+        content=serialize_post_list(posts),
+        media_type="application/json",
+        headers=_cache_headers(etag, cache_control),
+    )
+
+
+@router.get(
+    path="/search",
+    response_model=PostPageResponse,
+    summary="Поиск постов",
+    tags=["posts"],
+)
+def post_search(
+    q: str = Query(..., min_length=1, max_length=256),
+    limit: int = Query(default=config.POSTS_PAGE_SIZE, ge=1, le=config.POSTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    post_service: PostService = Depends(get_post_service),
+) -> PostPageResponse:
+    try:
+        posts: dict = post_service.search_posts(query=q, limit=limit, cursor=cursor)
+    except InvalidCursorError:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="invalid cursor")
+    return PostPageResponse(**posts)
 
 
 @router.get(
@@ -32,13 +139,42 @@ def post_list(
     tags=["posts"],
 )
 def post_detail(
-    post_id: int, post_service: PostService = Depends(get_post_service),
+    post_id: int,
+    response: Response,
+    if_none_match: Union[str, None] = Header(default=None),
+    accept_encoding: Union[str, None] = Header(default=None),
+    post_service: PostService = Depends(get_post_service),
 ) -> PostModel:
+    cache_control = f"public, max-age={config.POST_DETAIL_MAX_AGE_IN_SECONDS}"
+    # Проверяем ETag по короткому ключу в кэше, не трогая Postgres и не разбирая пост
+    if if_none_match:
+        etag = post_service.get_post_etag(item_id=post_id)
+        if matched_etag := _matching_etag(if_none_match, etag):
+            return _not_modified(matched_etag, cache_control)
+
+    encoding = choose_encoding(accept_encoding)
+    if encoding and (encoded := post_service.get_encoded_post_detail(item_id=post_id, encoding=encoding)):
+        etag, body = encoded
+        return _encoded_response(body, encoding, etag, cache_control)
+
     post: Optional[dict] = post_service.get_post_detail(item_id=post_id)
     if not post:
         # Если пост не найден, отдаём 404 статус
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="post not found")
-    return PostModel(**post)
+    post = PostModel(**post)
+    etag = make_post_etag(post.id, post.version)
+    if matched_etag := _matching_etag(if_none_match, etag):
+        return _not_modified(matched_etag, cache_control)
+
+    if encoding:
+        # Сериализуем так же, как JSONResponse, чтобы тело не зависело от кодировки
+        body = post.json(ensure_ascii=False, separators=(",", ":")).encode()
+        if len(body) >= config.COMPRESSION_MINIMUM_SIZE:
+            body = compress(body, encoding)
+            post_service.set_encoded_post_detail(item_id=post.id, encoding=encoding, etag=etag, body=body)
+            return _encoded_response(body, encoding, etag, cache_control)
+    response.headers.update(_cache_headers(etag, cache_control))
+    return post
 
 
 @router.post(
@@ -59,3 +195,67 @@ def post_create(
         return PostModel(**post)
     else:
         raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail="Unauthorized user")
+
+
+# Ошибки изменения поста из PostService
+_post_change_errors = {
+    "Post not found": HTTPStatus.NOT_FOUND,
+    "Permission denied": HTTPStatus.FORBIDDEN,
+    "Post has been modified": HTTPStatus.PRECONDITION_FAILED,
+}
+
+
+@router.patch(
+    path="/{post_id}",
+    response_model=PostModel,
+    summary="Изменить пост",
+    tags=["posts"],
+)
+def post_update(
+    post_id: int,
+    post: PostUpdate,
+    response: Response,
+    if_match: Union[str, None] = Header(default=None),
+    authorization: Union[str, None] = Header(default=None),
+    post_service: PostService = Depends(get_post_service),
+    user_service: UserService = Depends(get_user_service)
+) -> PostModel:
+    user = user_service.get_user_by_access_token(authorization)
+    if not user:
+        raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail="Unauthorized user")
+    # Без If-Match правки двух редакторов молча перезаписывали бы друг друга
+    if not if_match:
+        raise HTTPException(status_code=HTTPStatus.PRECONDITION_REQUIRED, detail="If-Match header is required")
+    result = post_service.update_post(
+        item_id=post_id, post_update=post, user=user, expected_version=_if_match_version(if_match, post_id)
+    )
+    if isinstance(result, str):
+        raise HTTPException(status_code=_post_change_errors[result], detail=result)
+    updated_post = PostModel(**result)
+    response.headers["ETag"] = make_post_etag(updated_post.id, updated_post.version)
+    return updated_post
+
+
+@router.delete(
+    path="/{post_id}",
+    summary="Удалить пост",
+    tags=["posts"],
+    status_code=HTTPStatus.NO_CONTENT,
+)
+def post_delete(
+    post_id: int,
+    if_match: Union[str, None] = Header(default=None),
+    authorization: Union[str, None] = Header(default=None),
+    post_service: PostService = Depends(get_post_service),
+    user_service: UserService = Depends(get_user_service)
+):
+    user = user_service.get_user_by_access_token(authorization)
+    if not user:
+        raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail="Unauthorized user")
+    # Удаление по устаревшей копии отменило бы правку, сделанную после нее. "*" — удалить без проверки
+    if not if_match:
+        raise HTTPException(status_code=HTTPStatus.PRECONDITION_REQUIRED, detail="If-Match header is required")
+    expected_version = _if_match_version(if_match, post_id)
+    if error := post_service.delete_post(item_id=post_id, user=user, expected_version=expected_version):
+        raise HTTPException(status_code=_post_change_errors[error], detail=error)
+    return Response(status_code=HTTPStatus.NO_CONTENT)
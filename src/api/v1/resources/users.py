@@ -1,10 +1,13 @@
 from http import HTTPStatus
-from typing import Union
+from typing import Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request
 
-from src.api.v1.schemas import UserCreate, UserModel, UserLogin, UserUpdate
-from src.services import UserService, get_user_service
+from src.api.v1.schemas import (
+    PostPageResponse, SessionListResponse, UserCreate, UserModel, UserLogin, UserUpdate
+)
+from src.core import config
+from src.services import InvalidCursorError, PostService, get_post_service, UserService, get_user_service
 
 router = APIRouter()
 
@@ -42,11 +45,16 @@ def register(
 )
 def login(
         user_login: UserLogin,
+        request: Request,
         user_service: UserService = Depends(get_user_service)
 ):
     user = user_service.get_user_by_credentials(user_login)
     if user:
-        refresh_token, refresh_token_uuid = user_service.generate_refresh_token(user)
+        refresh_token, refresh_token_uuid = user_service.generate_refresh_token(
+            user,
+            device=request.headers.get("user-agent"),
+            ip=request.client.host if request.client else None,
+        )
         access_token = user_service.generate_access_token(user, refresh_token_uuid)
         return {
             "access_token": access_token,
@@ -139,3 +147,77 @@ def update_user_info(
         }
     except TypeError:
         raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail="Unauthorized user")
+
+
+@router.get(
+    path="/me/sessions",
+    tags=["users"],
+    summary="Посмотреть активные сессии",
+    response_model=SessionListResponse,
+)
+def show_user_sessions(
+        authorization: Union[str, None] = Header(default=None),
+        user_service: UserService = Depends(get_user_service)
+):
+    sessions = user_service.get_sessions(authorization)
+    if sessions is None:
+        raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail="Unauthorized user")
+    return {"sessions": sessions}
+
+
+@router.delete(
+    path="/me/sessions/{session_id}",
+    tags=["users"],
+    summary="Завершить сессию",
+)
+def revoke_user_session(
+        session_id: str,
+        authorization: Union[str, None] = Header(default=None),
+        user_service: UserService = Depends(get_user_service)
+):
+    revoked = user_service.revoke_session(authorization, session_id)
+    if revoked is None:
+        raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail="Unauthorized user")
+    if not revoked:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Session not found")
+    return {"msg": "Session has been revoked."}
+
+
+@router.get(
+    path="/me/posts",
+    tags=["users"],
+    summary="Посмотреть свои посты",
+    response_model=PostPageResponse,
+)
+def show_user_posts(
+        limit: int = Query(default=config.POSTS_PAGE_SIZE, ge=1, le=config.POSTS_MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        authorization: Union[str, None] = Header(default=None),
+        user_service: UserService = Depends(get_user_service),
+        post_service: PostService = Depends(get_post_service)
+):
+    user = user_service.get_user_by_access_token(authorization)
+    if not user:
+        raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail="Unauthorized user")
+    try:
+        return post_service.get_author_posts(author_id=user.uuid, limit=limit, cursor=cursor)
+    except InvalidCursorError:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="invalid cursor")
+
+
+@router.get(
+    path="/users/{user_uuid}/posts",
+    tags=["users"],
+    summary="Посты пользователя",
+    response_model=PostPageResponse,
+)
+def author_posts(
+        user_uuid: str,
+        limit: int = Query(default=config.POSTS_PAGE_SIZE, ge=1, le=config.POSTS_MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        post_service: PostService = Depends(get_post_service)
+):
+    try:
+        return post_service.get_author_posts(author_id=user_uuid, limit=limit, cursor=cursor)
+    except InvalidCursorError:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="invalid cursor")
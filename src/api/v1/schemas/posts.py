@@ -1,12 +1,14 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel
 
 __all__ = (
     "PostModel",
     "PostCreate",
+    "PostUpdate",
     "PostListResponse",
+    "PostPageResponse",
 )
 
 
@@ -19,11 +21,22 @@ class PostCreate(PostBase):
     ...
 
 
+class PostUpdate(BaseModel):
+    title: Optional[str] = None
+    description: Optional[str] = None
+
+
 class PostModel(PostBase):
     id: int
     created_at: datetime
     author_id: str
+    version: int = 1
+    updated_at: Optional[datetime] = None
 
 
 class PostListResponse(BaseModel):
     posts: List[PostModel] = []
+
+
+class PostPageResponse(PostListResponse):
+    next_cursor: Optional[str] = None
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, EmailStr, Field
 
@@ -7,7 +7,9 @@ __all__ = (
     "UserModel",
     "UserCreate",
     "UserLogin",
-    "UserUpdate"
+    "UserUpdate",
+    "SessionModel",
+    "SessionListResponse",
 )
 
 
@@ -43,3 +45,16 @@ class UserUpdate(BaseModel):
     username: Optional[str] = None
     password: Optional[str] = None
     email: Optional[EmailStr] = None
+
+
+class SessionModel(BaseModel):
+    id: str
+    device: Optional[str] = None
+    ip: Optional[str] = None
+    created_at: datetime
+    last_used_at: Optional[datetime] = None
+    current: bool = False
+
+
+class SessionListResponse(BaseModel):
+    sessions: List[SessionModel] = []
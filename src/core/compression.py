@@ -0,0 +1,153 @@
+import zlib
+from typing import Callable, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core import config
+
+try:
+    import brotli
+except ImportError:  # brotli не обязателен, без него отдаем только gzip
+    brotli = None
+
+__all__ = ("CompressionMiddleware", "choose_encoding", "compress")
+
+# Сжимаем только текстовые ответы: картинки и архивы уже сжаты
+COMPRESSIBLE_CONTENT_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+)
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Выбор кодировки по заголовку Accept-Encoding. brotli предпочтительнее gzip"""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Сжатие тела ответа целиком"""
+    if encoding == "br":
+        return brotli.compress(body, quality=config.BROTLI_COMPRESSION_QUALITY)
+    compressor = zlib.compressobj(config.GZIP_COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+
+def _stream_compressor(encoding: str) -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    """Функции для сжатия ответа по частям: (сжать очередную часть, завершить поток)"""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=config.BROTLI_COMPRESSION_QUALITY)
+        # flush после каждой части, чтобы клиент получал данные по мере готовности
+        return lambda chunk: compressor.process(chunk) + compressor.flush(), compressor.finish
+    compressor = zlib.compressobj(config.GZIP_COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+class CompressionMiddleware:
+    """Сжатие ответов gzip или brotli, если тело не меньше minimum_size.
+
+    Ответы, у которых уже есть Content-Encoding (например, заранее сжатые
+    и взятые из кэша), пропускаются без изменений.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = config.COMPRESSION_MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http":
+            encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+            if encoding:
+                responder = _CompressionResponder(send, encoding, self.minimum_size)
+                await self.app(scope, receive, responder.send)
+                return
+        await self.app(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, send: Send, encoding: str, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+        self.compress_chunk: Optional[Callable[[bytes], bytes]] = None
+        self.finish: Optional[Callable[[], bytes]] = None
+
+    def _is_compressible(self, headers: MutableHeaders, body: bytes, more_body: bool) -> bool:
+        if "content-encoding" in headers:
+            return False
+        if not headers.get("content-type", "").startswith(COMPRESSIBLE_CONTENT_TYPES):
+            return False
+        return more_body or len(body) >= self.minimum_size
+
+    def _set_encoding_headers(self, headers: MutableHeaders):
+        headers["Content-Encoding"] = self.encoding
+        if "accept-encoding" not in headers.get("vary", "").lower():
+            headers.add_vary_header("Accept-Encoding")
+        # Сжатое представление отличается побайтно, поэтому сильный ETag становится слабым
+        if etag := headers.get("etag"):
+            if not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+
+    async def send(self, message: Message):
+        if self.passthrough:
+            await self._send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            # Заголовки отправим, когда увидим первую часть тела
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compress_chunk is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            if not self._is_compressible(headers, body, more_body):
+                self.passthrough = True
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+
+            self._set_encoding_headers(headers)
+            if not more_body:
+                body = compress(body, self.encoding)
+                headers["Content-Length"] = str(len(body))
+                await self._send(self.start_message)
+                await self._send({"type": "http.response.body", "body": body})
+                return
+
+            # Потоковый ответ сжимаем по частям, длина заранее неизвестна
+            del headers["Content-Length"]
+            self.compress_chunk, self.finish = _stream_compressor(self.encoding)
+            await self._send(self.start_message)
+
+        chunk = self.compress_chunk(body)
+        if not more_body:
+            chunk += self.finish()
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -11,10 +11,80 @@ REFRESH_TOKEN_EXPIRE_IN_DAYS: int = 30  # время жизни refresh token 30
 # Название проекта. Используется в Swagger-документации
 PROJECT_NAME: str = os.getenv("PROJECT_NAME", "ylab_hw_4")
 
+# Настройки сервера. 0 процессов — по одному на ядро
+SERVER_HOST: str = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT: int = int(os.getenv("SERVER_PORT", 8000))
+SERVER_WORKERS: int = int(os.getenv("WEB_CONCURRENCY", 0))
+SERVER_GRACEFUL_TIMEOUT_IN_SECONDS: int = int(os.getenv("SERVER_GRACEFUL_TIMEOUT_IN_SECONDS", 30))
+# Перезапуск процесса после N запросов страхует от утечек памяти, 0 — без перезапуска
+SERVER_MAX_REQUESTS: int = int(os.getenv("SERVER_MAX_REQUESTS", 0))
+
+# Сколько соединений с Postgres и каждой базой Redis открыть заранее при старте, 0 — не открывать
+STARTUP_PREWARM_CONNECTIONS: int = int(os.getenv("STARTUP_PREWARM_CONNECTIONS", 0))
+
 # Настройки Redis
+# Бэкенд кэшей: "redis" или "memory" — в памяти процесса, только для одного процесса
+CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "redis")
+MEMORY_CACHE_MAX_ENTRIES: int = int(os.getenv("MEMORY_CACHE_MAX_ENTRIES", 100_000))
+
 REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT: int = int(os.getenv("REDIS_PORT", 6379))
 CACHE_EXPIRE_IN_SECONDS: int = 60 * 5  # 5 минут
+# Без таймаутов зависший Redis подвешивает каждый запрос
+REDIS_SOCKET_TIMEOUT_IN_SECONDS: float = float(os.getenv("REDIS_SOCKET_TIMEOUT_IN_SECONDS", 0.5))
+REDIS_SOCKET_CONNECT_TIMEOUT_IN_SECONDS: float = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT_IN_SECONDS", 0.5))
+# Предохранитель: после стольких ошибок подряд Redis считается недоступным на время восстановления
+REDIS_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("REDIS_BREAKER_FAILURE_THRESHOLD", 5))
+REDIS_BREAKER_RECOVERY_TIMEOUT_IN_SECONDS: float = float(os.getenv("REDIS_BREAKER_RECOVERY_TIMEOUT_IN_SECONDS", 5))
+# Проверка access токенов без Redis: "closed" — отказать, "open" — пустить,
+# если токен не истек и его нет в локальной копии черного списка
+AUTH_CACHE_FAILURE_POLICY: str = os.getenv("AUTH_CACHE_FAILURE_POLICY", "closed")
+AUTH_LOCAL_BLOCKLIST_SYNC_INTERVAL_IN_SECONDS: float = float(
+    os.getenv("AUTH_LOCAL_BLOCKLIST_SYNC_INTERVAL_IN_SECONDS", 30)
+)
+# Запас при синхронизации на случай расхождения часов процессов
+AUTH_LOCAL_BLOCKLIST_SYNC_OVERLAP_IN_SECONDS: float = 5
+# Повтор обновления только что замененным refresh токеном в этот срок считается дублем запроса
+# и отклоняется без отзыва всей сессии
+REFRESH_TOKEN_REUSE_GRACE_IN_SECONDS: int = 10
+# Время последнего использования сессии: запоминается для доли запросов и пишется в Redis пачкой
+SESSION_LAST_USED_SAMPLE_RATE: float = 0.1
+SESSION_LAST_USED_FLUSH_INTERVAL_IN_SECONDS: float = 30
+SESSION_DEVICE_MAX_LENGTH: int = 200
+SEARCH_CACHE_EXPIRE_IN_SECONDS: int = 30  # результаты поиска живут в кэше 30 секунд
+
+# Канал Redis, в который публикуются изменения постов для локальных кэшей воркеров
+POSTS_INVALIDATION_CHANNEL: str = "posts:invalidations"
+
+# Outbox: фоновый прогрев кэша после создания поста
+POST_OUTBOX_WORKER_ENABLED: bool = os.getenv("POST_OUTBOX_WORKER_ENABLED", "true").lower() == "true"
+POST_OUTBOX_BATCH_SIZE: int = int(os.getenv("POST_OUTBOX_BATCH_SIZE", 100))
+POST_OUTBOX_POLL_INTERVAL_IN_SECONDS: float = float(os.getenv("POST_OUTBOX_POLL_INTERVAL_IN_SECONDS", 1))
+
+# Время, в течение которого CDN и браузеры могут отдавать посты без запроса к серверу
+POST_DETAIL_MAX_AGE_IN_SECONDS: int = int(os.getenv("POST_DETAIL_MAX_AGE_IN_SECONDS", 60))
+POST_LIST_MAX_AGE_IN_SECONDS: int = int(os.getenv("POST_LIST_MAX_AGE_IN_SECONDS", 5))
+
+# Первая страница списка постов — последние POST_LIST_SNAPSHOT_SIZE постов, дальше по курсору.
+# Каждый процесс держит готовое тело первой страницы в памяти и проверяет версию списка
+# каждые POST_LIST_SNAPSHOT_REFRESH_INTERVAL_IN_SECONDS
+POST_LIST_SNAPSHOT_ENABLED: bool = os.getenv("POST_LIST_SNAPSHOT_ENABLED", "true").lower() == "true"
+POST_LIST_SNAPSHOT_SIZE: int = int(os.getenv("POST_LIST_SNAPSHOT_SIZE", 500))
+POST_LIST_SNAPSHOT_REFRESH_INTERVAL_IN_SECONDS: float = float(
+    os.getenv("POST_LIST_SNAPSHOT_REFRESH_INTERVAL_IN_SECONDS", 1)
+)
+
+# Пагинация
+POSTS_PAGE_SIZE: int = 20
+POSTS_MAX_PAGE_SIZE: int = 100
+
+# Полнотекстовый поиск. Конфигурация должна совпадать с той, что указана в миграции
+SEARCH_TS_CONFIG: str = "russian"
+
+# Сжатие ответов. Ответы меньше порога сжимать невыгодно
+COMPRESSION_MINIMUM_SIZE: int = int(os.getenv("COMPRESSION_MINIMUM_SIZE", 500))
+GZIP_COMPRESSION_LEVEL: int = int(os.getenv("GZIP_COMPRESSION_LEVEL", 6))
+BROTLI_COMPRESSION_QUALITY: int = int(os.getenv("BROTLI_COMPRESSION_QUALITY", 4))
 
 # Настройки Postgres
 POSTGRES_HOST: str = os.getenv("POSTGRES_HOST", "localhost")
@@ -25,5 +95,27 @@ POSTGRES_PASSWORD: str = os.getenv("POSTGRES_PASSWORD", "qwerty")
 
 DATABASE_URL: str = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 
+# Проверки здоровья. Результат кэшируется, чтобы частые проверки балансировщика не нагружали базы
+HEALTH_CHECK_TIMEOUT_IN_SECONDS: float = float(os.getenv("HEALTH_CHECK_TIMEOUT_IN_SECONDS", 1))
+HEALTH_CHECK_CACHE_TTL_IN_SECONDS: float = float(os.getenv("HEALTH_CHECK_CACHE_TTL_IN_SECONDS", 2))
+# Инстанс считается неготовым, если p99 обращений к базе выше порога, 0 — не проверять
+HEALTH_MAX_P99_LATENCY_MS: float = float(os.getenv("HEALTH_MAX_P99_LATENCY_MS", 500))
+# Окно, по которому считается задержка обращений к базам
+LATENCY_WINDOW_IN_SECONDS: float = 60
+LATENCY_WINDOW_MAX_SAMPLES: int = 2048
+
 # Корень проекта
 BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Профилирование по запросу администратора
+PROFILING_SAMPLE_INTERVAL_MS: float = 5
+PROFILING_MAX_DURATION_IN_SECONDS: float = 30
+PROFILING_MAX_REQUESTS: int = 1000
+
+# Массовый импорт пользователей. В одной вставке не больше 65535 параметров: 8 колонок на строку
+USER_IMPORT_CHUNK_SIZE: int = int(os.getenv("USER_IMPORT_CHUNK_SIZE", 1000))
+# Процессы для хеширования паролей, 1 — хешировать в текущем процессе. sha256 быстрее запуска
+# интерпретаторов пула, поэтому пул включается только явно — для медленного хеша или огромного файла
+USER_IMPORT_HASH_WORKERS: int = int(os.getenv("USER_IMPORT_HASH_WORKERS", 1))
+# Загруженный через API файл держится в памяти до этого размера, дальше пишется на диск
+USER_IMPORT_SPOOL_MAX_SIZE: int = 8 * 1024 * 1024
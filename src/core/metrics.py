@@ -0,0 +1,71 @@
+"""Скользящие замеры задержки обращений к Postgres и Redis."""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Optional, Tuple
+
+from src.core import config
+
+__all__ = ("LatencyTracker", "get_latency_tracker", "latency_snapshot", "measure_latency")
+
+
+class LatencyTracker:
+    """Задержки за последние window_seconds, но не больше max_samples замеров"""
+
+    def __init__(
+        self,
+        window_seconds: float = config.LATENCY_WINDOW_IN_SECONDS,
+        max_samples: int = config.LATENCY_WINDOW_MAX_SAMPLES,
+    ):
+        self.window_seconds = window_seconds
+        self._samples: Deque[Tuple[float, float]] = deque(maxlen=max_samples)
+
+    def record(self, duration_ms: float):
+        # append у deque потокобезопасен, блокировка на горячем пути не нужна
+        self._samples.append((time.monotonic(), duration_ms))
+
+    def _recent(self) -> list:
+        border = time.monotonic() - self.window_seconds
+        return sorted(duration for recorded_at, duration in list(self._samples) if recorded_at >= border)
+
+    def snapshot(self) -> dict:
+        durations = self._recent()
+        return {
+            "count": len(durations),
+            "p50_ms": _percentile(durations, 50),
+            "p99_ms": _percentile(durations, 99),
+        }
+
+
+def _percentile(sorted_durations: list, percent: float) -> Optional[float]:
+    if not sorted_durations:
+        return None
+    index = min(len(sorted_durations) - 1, int(len(sorted_durations) * percent / 100))
+    return round(sorted_durations[index], 2)
+
+
+_trackers: Dict[str, LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def get_latency_tracker(name: str) -> LatencyTracker:
+    tracker = _trackers.get(name)
+    if tracker is None:
+        with _trackers_lock:
+            tracker = _trackers.setdefault(name, LatencyTracker())
+    return tracker
+
+
+def latency_snapshot() -> Dict[str, dict]:
+    return {name: tracker.snapshot() for name, tracker in sorted(_trackers.items())}
+
+
+@contextmanager
+def measure_latency(name: str):
+    tracker = get_latency_tracker(name)
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        tracker.record((time.perf_counter() - started_at) * 1000)
@@ -0,0 +1,35 @@
+import logging
+import threading
+from typing import Callable, Optional
+
+__all__ = ("PeriodicTask",)
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Фоновый поток, который вызывает func каждые interval секунд до остановки"""
+
+    def __init__(self, name: str, interval: float, func: Callable[[], None]):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.func()
+            except Exception:
+                logger.exception("Periodic task %s failed", self.name)
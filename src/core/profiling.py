@@ -0,0 +1,209 @@
+"""Профилирование работающего процесса по запросу.
+
+Пока идет сессия профилирования, поток запроса на профилирование снимает
+стеки всех остальных потоков процесса, а первые max_requests запросов записывают спаны: разбор JWT,
+каждое обращение к Redis и каждый SQL-запрос. Отчет отдается в формате
+collapsed stacks, который понимают flamegraph.pl и speedscope.
+"""
+import functools
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.core import config
+
+__all__ = (
+    "ProfilingBusyError",
+    "ProfilingMiddleware",
+    "ProfilingSession",
+    "profiled",
+    "record_span",
+    "run_profiling",
+    "span",
+)
+
+# Стеки, которые заканчиваются в этих модулях, — простаивающие потоки: пул ждет задач, цикл событий ждет сокетов
+IDLE_MODULES = ("threading", "queue", "selectors", "concurrent.futures.thread")
+
+_NUMERIC_PATH_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+class ProfilingBusyError(Exception):
+    """Сессия профилирования уже идет"""
+
+
+class RequestSpans:
+    """Спаны одного запроса: (имя, длительность в мс)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+
+
+_request_spans: ContextVar[Optional[RequestSpans]] = ContextVar("request_spans", default=None)
+
+
+def record_span(name: str, duration_ms: float):
+    """Записать уже замеренный спан, если текущий запрос профилируется"""
+    request_spans = _request_spans.get()
+    if request_spans is not None:
+        request_spans.spans.append((name, duration_ms))
+
+
+@contextmanager
+def span(name: str):
+    if _request_spans.get() is None:
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, (time.perf_counter() - started_at) * 1000)
+
+
+def profiled(name: str):
+    """Декоратор: весь вызов функции — один спан"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+class ProfilingSession:
+    def __init__(self, max_requests: int):
+        self.requests_left = max_requests
+        self.requests_claimed = 0
+        self.requests_profiled = 0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        # имя спана -> [количество, суммарно мс, максимум мс]
+        self.spans: Dict[str, list] = {}
+        # Строки collapsed stacks по запросам, вес в микросекундах
+        self.request_stacks: Counter = Counter()
+        self.requests_done = threading.Event()
+        self._lock = threading.Lock()
+
+    def claim_request(self) -> bool:
+        with self._lock:
+            if self.requests_left <= 0:
+                return False
+            self.requests_left -= 1
+            self.requests_claimed += 1
+            return True
+
+    def add_request(self, request_spans: RequestSpans):
+        total_ms = (time.perf_counter() - request_spans.started_at) * 1000
+        with self._lock:
+            spent_in_spans = 0.0
+            for name, duration_ms in request_spans.spans:
+                stats = self.spans.setdefault(name, [0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += duration_ms
+                stats[2] = max(stats[2], duration_ms)
+                self.request_stacks[f"{request_spans.name};{name}"] += int(duration_ms * 1000)
+                spent_in_spans += duration_ms
+            self.request_stacks[request_spans.name] += int(max(0.0, total_ms - spent_in_spans) * 1000)
+            self.requests_profiled += 1
+            if self.requests_left <= 0 and self.requests_profiled >= self.requests_claimed:
+                self.requests_done.set()
+
+    def sample(self, skip_thread_ids: Tuple[int, ...]):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id in skip_thread_ids:
+                continue
+            if frame.f_globals.get("__name__") in IDLE_MODULES:
+                continue
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+        self.samples += 1
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "samples": self.samples,
+                "requests_profiled": self.requests_profiled,
+                "spans": {
+                    name: {
+                        "count": count,
+                        "total_ms": round(total_ms, 3),
+                        "max_ms": round(max_ms, 3),
+                    }
+                    for name, (count, total_ms, max_ms) in sorted(self.spans.items(), key=lambda item: -item[1][1])
+                },
+                "stacks": [f"{stack} {count}" for stack, count in self.stacks.most_common()],
+                "request_stacks": [f"{stack} {weight}" for stack, weight in self.request_stacks.most_common()],
+            }
+
+
+_active_session: Optional[ProfilingSession] = None
+_session_lock = threading.Lock()
+
+
+def run_profiling(
+    seconds: float,
+    interval_ms: float = config.PROFILING_SAMPLE_INTERVAL_MS,
+    max_requests: int = config.PROFILING_MAX_REQUESTS,
+) -> dict:
+    """Профилировать процесс seconds секунд или до max_requests запросов.
+
+    Блокирует вызывающий поток до конца сессии. Одновременно идет только
+    одна сессия. В каждом процессе gunicorn своя сессия: профилируется тот
+    воркер, который принял запрос на профилирование.
+    """
+    global _active_session
+    seconds = min(seconds, config.PROFILING_MAX_DURATION_IN_SECONDS)
+    max_requests = min(max_requests, config.PROFILING_MAX_REQUESTS)
+    if not _session_lock.acquire(blocking=False):
+        raise ProfilingBusyError("profiling is already running")
+    try:
+        session = ProfilingSession(max_requests=max_requests)
+        _active_session = session
+        skip_thread_ids = (threading.get_ident(),)
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline and not session.requests_done.is_set():
+            session.sample(skip_thread_ids)
+            time.sleep(interval_ms / 1000)
+        return session.report()
+    finally:
+        _active_session = None
+        _session_lock.release()
+
+
+class ProfilingMiddleware:
+    """Включает запись спанов для запросов, попавших в сессию профилирования"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        session = _active_session
+        if scope["type"] != "http" or session is None or not session.claim_request():
+            await self.app(scope, receive, send)
+            return
+        # Идентификаторы в пути заменяются, чтобы запросы к разным постам сложились в один стек
+        request_spans = RequestSpans(f'{scope["method"]} {_NUMERIC_PATH_SEGMENT.sub("/{id}", scope["path"])}')
+        token = _request_spans.set(request_spans)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_spans.reset(token)
+            session.add_request(request_spans)
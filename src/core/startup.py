@@ -0,0 +1,42 @@
+"""Профиль запуска сервера: сколько заняли импорты и инициализация.
+
+Модуль импортируется в main.py первым, поэтому отсчет идет почти от начала
+загрузки приложения. Подробную разбивку импортов по модулям дает
+`python -X importtime main.py`.
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+__all__ = ("StartupProfile", "startup_profile")
+
+
+class StartupProfile:
+    def __init__(self):
+        self.started_at: float = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.ready_at: Optional[float] = None
+
+    @contextmanager
+    def stage(self, name: str):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = (time.perf_counter() - started_at) * 1000
+
+    def mark_ready(self):
+        self.ready_at = time.perf_counter()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.ready_at is not None
+
+    def as_dict(self) -> dict:
+        return {
+            "stages_ms": {name: round(duration, 2) for name, duration in self.stages.items()},
+            "ready_ms": round((self.ready_at - self.started_at) * 1000, 2) if self.is_ready else None,
+        }
+
+
+startup_profile = StartupProfile()
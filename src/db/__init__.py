@@ -1,3 +1,6 @@
 from .cache import *
+from .circuit_breaker import *
 from .db import *
+from .redis_batch import *
 from .redis_cache import *
+from .warmup import *
@@ -1,18 +1,45 @@
+import functools
+import threading
 from abc import ABC, abstractmethod
-from typing import Optional, Union
+from typing import Callable, Dict, Optional, Tuple, Union
 
 __all__ = (
+    "CacheUnavailableError",
+    "skip_when_unavailable",
     "PostAbstractCache",
     "AccessAbstractCache",
     "RefreshAbstractCache",
     "get_posts_cache",
     "get_access_cache",
-    "get_refresh_cache"
+    "get_refresh_cache",
+    "register_cache_factories",
+    "get_created_caches",
+    "close_caches",
 )
 
 from src.core import config
 
 
+class CacheUnavailableError(Exception):
+    """Кэш не отвечает или отключен предохранителем"""
+
+
+def skip_when_unavailable(default=None):
+    """Для кэша, без которого можно обойтись: при недоступности вернуть default.
+
+    Так чтение постов при проблемах с Redis идет сразу в базу.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            except CacheUnavailableError:
+                return default
+        return wrapper
+    return decorator
+
+
 class PostAbstractCache(ABC):
     def __init__(self, cache_instance):
         self.cache = cache_instance
@@ -21,15 +48,66 @@ class PostAbstractCache(ABC):
     def get(self, key: str):
         pass
 
+    @abstractmethod
+    def get_etag(self, key: str):
+        pass
+
     @abstractmethod
     def set(
         self,
         key: str,
         value: Union[bytes, str],
-        expire: int = config.CACHE_EXPIRE_IN_SECONDS,
+        expire: Optional[int] = config.CACHE_EXPIRE_IN_SECONDS,
+        etag: Optional[str] = None,
+    ):
+        pass
+
+    @abstractmethod
+    def set_many(
+        self,
+        values: Dict[str, str],
+        etags: Optional[Dict[str, str]] = None,
+        expire: Optional[int] = config.CACHE_EXPIRE_IN_SECONDS,
+    ):
+        pass
+
+    @abstractmethod
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set_bytes(
+        self,
+        key: str,
+        value: bytes,
+        expire: Optional[int] = config.CACHE_EXPIRE_IN_SECONDS,
     ):
         pass
 
+    @abstractmethod
+    def incr(self, key: str) -> int:
+        pass
+
+    @abstractmethod
+    def delete(self, *keys: str):
+        pass
+
+    @abstractmethod
+    def publish(self, channel: str, message: str):
+        pass
+
+    @abstractmethod
+    def subscribe(self, channel: str, callback: Callable[[Optional[str]], None]):
+        """Вызывать callback с каждым сообщением канала, в том числе из других процессов.
+
+        None вместо сообщения — сообщения могли потеряться, например, пока не было соединения.
+        """
+        pass
+
+    @abstractmethod
+    def ping(self) -> bool:
+        pass
+
     @abstractmethod
     def close(self):
         pass
@@ -69,6 +147,56 @@ class RefreshAbstractCache(ABC):
     ):
         pass
 
+    @abstractmethod
+    def add_session(
+        self,
+        key: str,
+        value: str,
+        family: str,
+        info: str,
+        expire: int,
+    ):
+        """Сохранить refresh токен новой сессии вместе с ее описанием"""
+        pass
+
+    @abstractmethod
+    def get_sessions(self, key: str) -> Dict[str, str]:
+        """Описания действующих сессий пользователя, время их последнего использования
+        по полям "<сессия>:u" и срок по полям "<сессия>:e". Истекшие сессии удаляются"""
+        pass
+
+    @abstractmethod
+    def revoke_session(self, key: str, family: str, value: Optional[str] = None) -> bool:
+        """Отозвать сессию. Возвращает False, если такой сессии не было"""
+        pass
+
+    @abstractmethod
+    def touch_sessions(self, last_used: Dict[Tuple[str, str], int]):
+        """Записать время последнего использования сессий: (ключ, сессия) -> timestamp"""
+        pass
+
+    @abstractmethod
+    def rotate(
+        self,
+        key: str,
+        old_value: str,
+        new_value: str,
+        family: str,
+        expire: int,
+    ) -> bool:
+        """Атомарно заменить old_value на new_value.
+
+        Если old_value уже нет среди активных, токен использован повторно:
+        отзывается последний выданный токен семейства и возвращается False.
+        Исключение — токен, замененный только что: это параллельный дубль
+        запроса, он просто отклоняется.
+        """
+        pass
+
+    @abstractmethod
+    def ping(self) -> bool:
+        pass
+
     @abstractmethod
     def close(self):
         pass
@@ -82,6 +210,15 @@ class AccessAbstractCache(ABC):
     def get(self, key: str):
         pass
 
+    @abstractmethod
+    def is_blocked_locally(self, key: str) -> bool:
+        """Проверка по локальной копии черного списка, когда сам кэш недоступен"""
+        pass
+
+    @abstractmethod
+    def sync_local_blocklist(self):
+        pass
+
     @abstractmethod
     def set(
         self,
@@ -90,6 +227,10 @@ class AccessAbstractCache(ABC):
     ):
         pass
 
+    @abstractmethod
+    def ping(self) -> bool:
+        pass
+
     @abstractmethod
     def close(self):
         pass
@@ -99,15 +240,54 @@ posts_cache: Optional[PostAbstractCache] = None
 blocked_access_tokens_cache: Optional[AccessAbstractCache] = None
 active_refresh_tokens_cache: Optional[RefreshAbstractCache] = None
 
+# Фабрики регистрируются при старте сервера, а сами кэши создаются при первом обращении
+_cache_factories: Dict[str, Callable[[], object]] = {}
+_cache_lock = threading.Lock()
+
+
+def register_cache_factories(
+    posts: Callable[[], PostAbstractCache],
+    access: Callable[[], AccessAbstractCache],
+    refresh: Callable[[], RefreshAbstractCache],
+):
+    _cache_factories.update(
+        posts_cache=posts,
+        blocked_access_tokens_cache=access,
+        active_refresh_tokens_cache=refresh,
+    )
+
+
+def _get_or_create(name: str):
+    instance = globals()[name]
+    if instance is None:
+        # Зависимости вызываются из пула потоков, кэш должен создаться один раз
+        with _cache_lock:
+            instance = globals()[name]
+            if instance is None:
+                instance = globals()[name] = _cache_factories[name]()
+    return instance
+
+
+def get_created_caches() -> list:
+    """Кэши, которые уже были созданы"""
+    return [globals()[name] for name in _cache_factories if globals()[name] is not None]
+
+
+def close_caches():
+    global posts_cache, blocked_access_tokens_cache, active_refresh_tokens_cache
+    for instance in get_created_caches():
+        instance.close()
+    posts_cache = blocked_access_tokens_cache = active_refresh_tokens_cache = None
+
 
 # Функции понадобится при внедрении зависимостей
 def get_posts_cache() -> PostAbstractCache:
-    return posts_cache
+    return _get_or_create("posts_cache")
 
 
 def get_access_cache() -> AccessAbstractCache:
-    return blocked_access_tokens_cache
+    return _get_or_create("blocked_access_tokens_cache")
 
 
 def get_refresh_cache() -> RefreshAbstractCache:
-    return active_refresh_tokens_cache
+    return _get_or_create("active_refresh_tokens_cache")
@@ -0,0 +1,100 @@
+import threading
+import time
+from typing import Dict
+
+from src.core import config
+from src.db.cache import CacheUnavailableError
+
+__all__ = ("CircuitBreaker", "get_circuit_breaker", "circuit_breakers")
+
+
+class CircuitBreaker:
+    """Предохранитель для обращений к кэшу.
+
+    После failure_threshold ошибок подряд размыкается, и на recovery_timeout
+    секунд все обращения сразу завершаются CacheUnavailableError, не дожидаясь
+    таймаута сокета. Затем пропускает одно пробное обращение: успех замыкает
+    предохранитель, ошибка снова размыкает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = config.REDIS_BREAKER_FAILURE_THRESHOLD,
+        recovery_timeout: float = config.REDIS_BREAKER_RECOVERY_TIMEOUT_IN_SECONDS,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.failures_total = 0
+        self.rejected_total = 0
+        self.opened_total = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Пропустить обращение или сразу отказать, если предохранитель разомкнут."""
+        if self.state == self.CLOSED:
+            return
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            if self.state != self.CLOSED:
+                self.rejected_total += 1
+                raise CacheUnavailableError(f"circuit breaker {self.name} is {self.state}")
+
+    def on_success(self):
+        if self.state == self.CLOSED and not self.consecutive_failures:
+            return
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Обращение прервалось не из-за сервера: следующее снова может стать пробным"""
+        if self._probe_in_flight:
+            with self._lock:
+                self._probe_in_flight = False
+
+    def on_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.failures_total += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened_total += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "failures_total": self.failures_total,
+            "rejected_total": self.rejected_total,
+            "opened_total": self.opened_total,
+        }
+
+
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Один предохранитель на сервер: если Redis недоступен, недоступны все его базы"""
+    breaker = circuit_breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = circuit_breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
@@ -1,13 +1,59 @@
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from sqlmodel import Session, create_engine
 
 from src.core import config
+from src.core.metrics import get_latency_tracker
+from src.core.profiling import record_span
+
+__all__ = ("get_engine", "dispose_engine", "get_session")
+
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """Движок создается при первом обращении, а не при импорте модуля"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(config.DATABASE_URL, echo=True)
+                _instrument(_engine)
+    return _engine
+
+
+def _instrument(engine: Engine):
+    """Замер задержки каждого SQL-запроса и спан для профилирования"""
+    tracker = get_latency_tracker("postgres")
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started_at"] = time.perf_counter()
 
-__all__ = ("get_session",)
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Упавшие запросы сюда не доходят, поэтому значение перезаписывается, а не копится
+        started_at = conn.info.pop("query_started_at", None)
+        if started_at is not None:
+            duration_ms = (time.perf_counter() - started_at) * 1000
+            tracker.record(duration_ms)
+            record_span(f"sql:{statement.split(None, 1)[0].upper()}", duration_ms)
 
 
-engine = create_engine(config.DATABASE_URL, echo=True)
+def dispose_engine(close: bool = True):
+    """Сбросить пул соединений. close=False — после fork, соединения принадлежат родителю"""
+    global _engine
+    if _engine is not None:
+        _engine.dispose(close=close)
+        _engine = None
 
 
 def get_session():
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         yield session
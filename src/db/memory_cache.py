@@ -0,0 +1,399 @@
+"""Кэш в памяти процесса.
+
+Подходит для тестов, бенчмарков и развертывания в один процесс: обращения
+не идут по сети. Процессы не видят данных друг друга, поэтому с несколькими
+воркерами gunicorn этот бэкенд использовать нельзя — черный список токенов
+у каждого процесса был бы свой.
+"""
+import heapq
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, List, NoReturn, Optional, Set, Tuple, Union
+
+from src.core import config
+from src.db.cache import AccessAbstractCache, PostAbstractCache, RefreshAbstractCache
+
+__all__ = (
+    "MemoryStore",
+    "PostCacheMemory",
+    "AccessCacheMemory",
+    "RefreshCacheMemory",
+    "create_posts_cache",
+    "create_access_cache",
+    "create_refresh_cache",
+)
+
+
+# Сколько устаревших записей куча сроков терпит сверх удвоенного числа ключей со сроком
+EXPIRY_HEAP_SLACK = 64
+
+
+class MemoryStore:
+    """Словарь со сроком жизни ключей и ограничением размера.
+
+    Сроки лежат в куче, истекшие ключи удаляются при обращениях: на каждой
+    операции снимается вершина кучи, пока она в прошлом. Продление срока не
+    добавляет запись в кучу — ее переставляют, когда подойдет старый срок, а
+    устаревшие записи выбрасываются перестройкой кучи, поэтому куча растет с
+    числом живых ключей, а не с числом операций. При переполнении вытесняются
+    давно не использованные ключи. Значения хранятся как есть:
+    строки и байты, множества для set-команд, словари для hash-команд.
+    """
+
+    def __init__(self, max_entries: Optional[int] = config.MEMORY_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # Порядок ключей — порядок использования, первым вытесняется самый старый
+        self._data: "OrderedDict[str, object]" = OrderedDict()
+        self._expires_at: Dict[str, float] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        # Операции, которые в Redis выполняются скриптами, берут блокировку целиком
+        self.lock = threading.RLock()
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            current = self._expires_at.get(key)
+            if current == expires_at:
+                del self._expires_at[key]
+                self._data.pop(key, None)
+            elif current is not None and current > expires_at:
+                # Срок продлили без записи в куче — переставляем ключ на новый срок
+                heapq.heappush(heap, (current, key))
+            # Иначе запись устарела: ключ удалили или срок сократили отдельной записью
+
+    def _lookup(self, key: str, default=None):
+        self._purge_expired()
+        value = self._data.get(key, default)
+        if key in self._data:
+            self._data.move_to_end(key)
+        return value
+
+    def _store(self, key: str, value, expire: Optional[float] = None, keep_ttl: bool = False):
+        self._purge_expired()
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if expire is not None:
+            self._set_expiry(key, expire)
+        elif not keep_ttl:
+            self._drop_expiry(key)
+        while self.max_entries is not None and len(self._data) > self.max_entries:
+            evicted, _ = self._data.popitem(last=False)
+            self._drop_expiry(evicted)
+
+    def _set_expiry(self, key: str, expire: float):
+        expires_at = time.monotonic() + expire
+        current = self._expires_at.get(key)
+        self._expires_at[key] = expires_at
+        # В куче уже есть запись не позже нового срока: дойдя до нее, _purge_expired переставит ключ
+        if current is None or expires_at < current:
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+            self._compact_expiry_heap()
+
+    def _drop_expiry(self, key: str):
+        if self._expires_at.pop(key, None) is not None:
+            self._compact_expiry_heap()
+
+    def _compact_expiry_heap(self):
+        # Устаревшие записи иначе копились бы до своего срока — у refresh токенов это недели
+        if len(self._expiry_heap) > 2 * len(self._expires_at) + EXPIRY_HEAP_SLACK:
+            self._expiry_heap = [(expires_at, key) for key, expires_at in self._expires_at.items()]
+            heapq.heapify(self._expiry_heap)
+
+    def get(self, key: str):
+        with self.lock:
+            return self._lookup(key)
+
+    def set(self, key: str, value, expire: Optional[float] = None):
+        with self.lock:
+            self._store(key, value, expire)
+
+    def delete(self, *keys: str) -> int:
+        with self.lock:
+            self._purge_expired()
+            deleted = 0
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    deleted += 1
+                self._drop_expiry(key)
+            return deleted
+
+    def expire(self, key: str, expire: float):
+        with self.lock:
+            if self._lookup(key) is not None:
+                self._set_expiry(key, expire)
+
+    def incr(self, key: str) -> int:
+        with self.lock:
+            value = int(self._lookup(key, 0)) + 1
+            self._store(key, str(value), keep_ttl=True)
+            return value
+
+    def keys(self) -> List[str]:
+        with self.lock:
+            self._purge_expired()
+            return list(self._data)
+
+    def sadd(self, key: str, *members: str) -> int:
+        with self.lock:
+            current: Set[str] = self._lookup(key) or set()
+            added = len(set(members) - current)
+            current.update(members)
+            self._store(key, current, keep_ttl=True)
+            return added
+
+    def srem(self, key: str, *members: str) -> int:
+        with self.lock:
+            current: Optional[Set[str]] = self._lookup(key)
+            if not current:
+                return 0
+            removed = len(current.intersection(members))
+            current.difference_update(members)
+            if not current:
+                self.delete(key)
+            return removed
+
+    def smembers(self, key: str) -> Set[str]:
+        with self.lock:
+            return set(self._lookup(key) or ())
+
+    def hset(self, key: str, field: str, value: str):
+        with self.lock:
+            current: Dict[str, str] = self._lookup(key) or {}
+            current[field] = value
+            self._store(key, current, keep_ttl=True)
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        with self.lock:
+            return dict(self._lookup(key) or {})
+
+    def hdel(self, key: str, *fields: str) -> int:
+        with self.lock:
+            current: Optional[Dict[str, str]] = self._lookup(key)
+            if not current:
+                return 0
+            removed = sum(current.pop(field, None) is not None for field in fields)
+            if not current:
+                self.delete(key)
+            return removed
+
+    def clear(self):
+        with self.lock:
+            self._data.clear()
+            self._expires_at.clear()
+            self._expiry_heap.clear()
+
+
+class PostCacheMemory(PostAbstractCache):
+    def __init__(self, cache_instance: MemoryStore):
+        super().__init__(cache_instance)
+        self._subscribers: Dict[str, List[Callable[[str], None]]] = defaultdict(list)
+
+    def get(self, key: str) -> Optional[str]:
+        return self.cache.get(key)
+
+    def get_etag(self, key: str) -> Optional[str]:
+        return self.cache.get(f"{key}:etag")
+
+    def set(
+        self,
+        key: str,
+        value: Union[bytes, str],
+        expire: Optional[int] = config.CACHE_EXPIRE_IN_SECONDS,
+        etag: Optional[str] = None,
+    ):
+        with self.cache.lock:
+            self.cache.set(key, value, expire)
+            if etag is not None:
+                self.cache.set(f"{key}:etag", etag, expire)
+
+    def set_many(
+        self,
+        values: Dict[str, str],
+        etags: Optional[Dict[str, str]] = None,
+        expire: Optional[int] = config.CACHE_EXPIRE_IN_SECONDS,
+    ):
+        etags = etags or {}
+        with self.cache.lock:
+            for key, value in values.items():
+                self.set(key, value, expire, etags.get(key))
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        return self.cache.get(key)
+
+    def set_bytes(
+        self,
+        key: str,
+        value: bytes,
+        expire: Optional[int] = config.CACHE_EXPIRE_IN_SECONDS,
+    ):
+        self.cache.set(key, value, expire)
+
+    def incr(self, key: str) -> int:
+        return self.cache.incr(key)
+
+    def delete(self, *keys: str):
+        self.cache.delete(*keys)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        """Подписка на сообщения канала в этом процессе"""
+        self._subscribers[channel].append(callback)
+
+    def publish(self, channel: str, message: str):
+        for callback in list(self._subscribers[channel]):
+            callback(message)
+
+    def ping(self) -> bool:
+        return True
+
+    def close(self) -> NoReturn:
+        self.cache.clear()
+
+
+class AccessCacheMemory(AccessAbstractCache):
+    def get(self, key: str) -> Optional[str]:
+        return self.cache.get(key)
+
+    def set(
+        self,
+        key: str,
+        value: Union[bytes, str],
+    ):
+        self.cache.set(key, value, config.ACCESS_TOKEN_EXPIRE_IN_SECONDS)
+
+    def is_blocked_locally(self, key: str) -> bool:
+        # Кэш и так в памяти процесса, отдельная копия не нужна
+        return self.cache.get(key) is not None
+
+    def sync_local_blocklist(self):
+        pass
+
+    def ping(self) -> bool:
+        return True
+
+    def close(self) -> NoReturn:
+        self.cache.clear()
+
+
+class RefreshCacheMemory(RefreshAbstractCache):
+    """То же устройство ключей, что у RefreshCacheRedis; скрипты заменены блокировкой хранилища"""
+
+    def add(
+        self,
+        key: str,
+        value: str
+    ):
+        self.cache.sadd(key, value)
+
+    def remove(
+        self,
+        key: str,
+        value: str
+    ):
+        self.cache.srem(key, value)
+
+    def get_all(
+        self,
+        key: str
+    ):
+        return self.cache.smembers(key)
+
+    def clear(
+        self,
+        key: str
+    ):
+        self.cache.delete(key, f"sessions:{key}")
+
+    def add_session(
+        self,
+        key: str,
+        value: str,
+        family: str,
+        info: str,
+        expire: int,
+    ):
+        with self.cache.lock:
+            self.cache.sadd(key, value)
+            self.cache.set(f"family:{family}", value, expire)
+            self.cache.hset(f"sessions:{key}", family, info)
+            self.cache.hset(f"sessions:{key}", f"{family}:e", str(int(time.time()) + expire))
+            self.cache.expire(f"sessions:{key}", expire)
+
+    def get_sessions(self, key: str) -> Dict[str, str]:
+        with self.cache.lock:
+            fields = self.cache.hgetall(f"sessions:{key}")
+            now = int(time.time())
+            for name, value in fields.items():
+                if name.endswith(":e") and int(value) <= now:
+                    session = name[:-2]
+                    self.cache.hdel(f"sessions:{key}", session, f"{session}:u", name)
+            return self.cache.hgetall(f"sessions:{key}")
+
+    def revoke_session(self, key: str, family: str, value: Optional[str] = None) -> bool:
+        with self.cache.lock:
+            removed = 0
+            # Чужую сессию по ее id не отозвать: ключ семейства трогаем, только если сессия этого пользователя
+            if family in self.cache.hgetall(f"sessions:{key}"):
+                current = self.cache.get(f"family:{family}")
+                if current:
+                    removed += self.cache.srem(key, current)
+                self.cache.delete(f"family:{family}")
+            if value:
+                removed += self.cache.srem(key, value)
+            return removed + self.cache.hdel(f"sessions:{key}", family, f"{family}:u", f"{family}:e") > 0
+
+    def touch_sessions(self, last_used: Dict[Tuple[str, str], int]):
+        with self.cache.lock:
+            for (key, family), timestamp in last_used.items():
+                if family in (self.cache.get(f"sessions:{key}") or {}):
+                    self.cache.hset(f"sessions:{key}", f"{family}:u", str(timestamp))
+
+    def rotate(
+        self,
+        key: str,
+        old_value: str,
+        new_value: str,
+        family: str,
+        expire: int,
+    ) -> bool:
+        with self.cache.lock:
+            if self.cache.srem(key, old_value):
+                self.cache.sadd(key, new_value)
+                self.cache.set(f"family:{family}", new_value, expire)
+                self.cache.set(f"family:{family}:rotated", old_value, config.REFRESH_TOKEN_REUSE_GRACE_IN_SECONDS)
+                if family in self.cache.hgetall(f"sessions:{key}"):
+                    self.cache.hset(f"sessions:{key}", f"{family}:e", str(int(time.time()) + expire))
+                self.cache.expire(f"sessions:{key}", expire)
+                return True
+            if self.cache.get(f"family:{family}:rotated") == old_value:
+                return False
+            # Повторное использование токена: отзываем сессию целиком
+            if current := self.cache.get(f"family:{family}"):
+                self.cache.srem(key, current)
+                self.cache.delete(f"family:{family}")
+            self.cache.hdel(f"sessions:{key}", family, f"{family}:u", f"{family}:e")
+            return False
+
+    def ping(self) -> bool:
+        return True
+
+    def close(self) -> NoReturn:
+        self.cache.clear()
+
+
+def create_posts_cache() -> PostCacheMemory:
+    return PostCacheMemory(cache_instance=MemoryStore())
+
+
+def create_access_cache() -> AccessCacheMemory:
+    # Вытеснение из черного списка снова сделало бы токен действительным.
+    # Размер и так ограничен: записи живут не дольше access токена
+    return AccessCacheMemory(cache_instance=MemoryStore(max_entries=None))
+
+
+def create_refresh_cache() -> RefreshCacheMemory:
+    # Это состояние входа, а не кэш: вытеснение набора токенов разлогинило бы пользователя,
+    # а вытеснение family: отключило бы обнаружение повторного использования. Записи живут не дольше refresh токена
+    return RefreshCacheMemory(cache_instance=MemoryStore(max_entries=None))
@@ -0,0 +1,150 @@
+"""Объединение команд Redis одного вызова сервиса в один пайплайн."""
+import functools
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Callable, List, Optional, Tuple
+
+__all__ = ("RedisBatch", "batched", "current_batch", "resolve")
+
+# Команды, результат которых сервисам не нужен: их можно отложить до конца вызова
+DEFERRABLE_COMMANDS = frozenset(
+    ("SET", "SETEX", "SADD", "SREM", "DEL", "EXPIRE", "HSET", "HDEL", "ZADD", "ZREMRANGEBYSCORE")
+)
+
+_current_batch: ContextVar[Optional["RedisBatch"]] = ContextVar("redis_batch", default=None)
+
+
+def current_batch() -> Optional["RedisBatch"]:
+    return _current_batch.get()
+
+
+class RedisBatch:
+    """Очередь команд Redis на время одного вызова сервиса.
+
+    Записи откладываются и уходят одним пайплайном вместе со следующим
+    чтением или в конце вызова. Чтение всегда выполняется после всех
+    отложенных записей, поэтому видит их результат. Команды к разным базам
+    одного сервера идут в одном пайплайне через SELECT.
+    """
+
+    def __init__(self):
+        # (клиент, аргументы команды, опции)
+        self._queue: List[Tuple[object, tuple, dict]] = []
+        self._recording = False
+        self._replay: Optional[List[Tuple[tuple, object]]] = None
+
+    def execute(self, client, args: tuple, options: dict):
+        if self._replay is not None:
+            # Ответ другой команды молча вернул бы чужой результат
+            recorded_args, result = self._replay.pop(0) if self._replay else (None, None)
+            if recorded_args != args:
+                raise RuntimeError(f"resolve() replayed {args} instead of {recorded_args}")
+            return result
+        self._queue.append((client, args, options))
+        if self._recording or str(args[0]).upper() in DEFERRABLE_COMMANDS:
+            return None
+        return self.flush()[-1]
+
+    def flush(self) -> list:
+        """Выполнить все накопленные команды и вернуть их результаты по порядку."""
+        queue, self._queue = self._queue, []
+        if not queue:
+            return []
+
+        # Для каждого сервера свой пайплайн; порядок команд внутри сервера сохраняется
+        by_server = OrderedDict()
+        for index, (client, args, options) in enumerate(queue):
+            by_server.setdefault(client.breaker.name, []).append((index, client, args, options))
+
+        results = [None] * len(queue)
+        for commands in by_server.values():
+            for index, result in zip((command[0] for command in commands), self._execute_on_server(commands)):
+                results[index] = result
+        return results
+
+    @staticmethod
+    def _execute_on_server(commands: list) -> list:
+        first_client = commands[0][1]
+        home_db = first_client.connection_pool.connection_kwargs.get("db", 0)
+        selected_db = home_db
+        is_select = []
+        with first_client.pipeline(transaction=False) as pipe:
+            for _, client, args, options in commands:
+                db = client.connection_pool.connection_kwargs.get("db", 0)
+                if db != selected_db:
+                    pipe.execute_command("SELECT", db)
+                    is_select.append(True)
+                    selected_db = db
+                pipe.execute_command(*args, **options)
+                is_select.append(False)
+            # Соединение возвращается в пул, поэтому база должна быть прежней
+            if selected_db != home_db:
+                pipe.execute_command("SELECT", home_db)
+                is_select.append(True)
+            results = pipe.execute()
+        return [result for result, select in zip(results, is_select) if not select]
+
+    def resolve(self, *calls: Callable[[], object]) -> list:
+        """Выполнить независимые обращения к кэшу за один запрос к Redis.
+
+        Вызовы, отправившие команды в пайплайн, выполняются дважды: сначала
+        команды только записываются, затем, после одного пайплайна, вызовы
+        повторяются с готовыми ответами. Такой вызов должен отправлять одни и
+        те же команды независимо от ответов. Вызов, который ничего не отправил
+        в пайплайн (кэш в памяти, клиент без объединения команд), уже
+        выполнен по-настоящему и не повторяется: INCR или ротация токена не
+        должны сработать дважды.
+        """
+        start = len(self._queue)
+        results: List[object] = [None] * len(calls)
+        replayed_calls: List[int] = []
+        self._recording = True
+        try:
+            for index, call in enumerate(calls):
+                queued = len(self._queue)
+                results[index] = call()
+                if len(self._queue) > queued:
+                    replayed_calls.append(index)
+        finally:
+            self._recording = False
+        recorded = [args for _, args, _ in self._queue[start:]]
+        responses = self.flush()[start:]
+        if not replayed_calls:
+            return results
+
+        self._replay = list(zip(recorded, responses))
+        try:
+            for index in replayed_calls:
+                results[index] = calls[index]()
+            if self._replay:
+                raise RuntimeError(f"resolve() did not replay {[args for args, _ in self._replay]}")
+            return results
+        finally:
+            self._replay = None
+
+def resolve(*calls: Callable[[], object]) -> list:
+    """RedisBatch.resolve в текущем вызове или обычные последовательные вызовы вне его"""
+    batch = current_batch()
+    if batch is None:
+        return [call() for call in calls]
+    return batch.resolve(*calls)
+
+
+def batched(method):
+    """Выполнить метод сервиса в одном RedisBatch и отправить отложенные записи в конце.
+
+    Если метод завершился исключением, отложенные записи отбрасываются.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if current_batch() is not None:
+            return method(*args, **kwargs)
+        batch = RedisBatch()
+        token = _current_batch.set(batch)
+        try:
+            result = method(*args, **kwargs)
+            batch.flush()
+            return result
+        finally:
+            _current_batch.reset(token)
+    return wrapper
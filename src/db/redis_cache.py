@@ -1,42 +1,413 @@
-from typing import NoReturn, Optional, Union
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, Iterable, List, NoReturn, Optional, Tuple, Union
+
+import redis
+from redis.client import Pipeline
 
 from src.core import config
-from src.db import PostAbstractCache, AccessAbstractCache, RefreshAbstractCache
+from src.core.metrics import measure_latency
+from src.core.profiling import span
+from src.db.cache import (
+    AccessAbstractCache, CacheUnavailableError, PostAbstractCache, RefreshAbstractCache, skip_when_unavailable
+)
+from src.db.circuit_breaker import CircuitBreaker, get_circuit_breaker
+from src.db.redis_batch import current_batch
+
+__all__ = (
+    "PostCacheRedis",
+    "RefreshCacheRedis",
+    "AccessCacheRedis",
+    "create_posts_cache",
+    "create_access_cache",
+    "create_refresh_cache",
+    "InstrumentedRedis",
+    "LocalBlocklist",
+)
+
+logger = logging.getLogger(__name__)
+
+# Заблокированные access токены, упорядоченные по сроку: из него процессы синхронизируют локальные копии
+BLOCKLIST_LOG_KEY = "blocklist:log"
+
+# Сколько поток подписки ждет сообщения, прежде чем проверить новые каналы и закрытие кэша
+LISTEN_POLL_TIMEOUT_IN_SECONDS = 1.0
+
+
+def _guarded_call(breaker: CircuitBreaker, latency_name: str, span_name: str, func, *args, **kwargs):
+    """Выполнить обращение к Redis через предохранитель, замерив задержку.
+
+    Сетевые ошибки и таймауты превращаются в CacheUnavailableError, чтобы
+    сервисы не зависели от исключений конкретного клиента. Остальные ошибки
+    Redis (WRONGTYPE, READONLY, OOM) означают, что сервер отвечает, и
+    предохранитель их не считает. При любом исходе пробное обращение
+    освобождается, иначе предохранитель навсегда остался бы полуоткрытым.
+    """
+    breaker.before_call()
+    try:
+        with measure_latency(latency_name), span(span_name):
+            result = func(*args, **kwargs)
+    except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as error:
+        breaker.on_failure()
+        raise CacheUnavailableError(str(error)) from error
+    except redis.exceptions.RedisError:
+        breaker.on_success()
+        raise
+    except BaseException:
+        breaker.release_probe()
+        raise
+    breaker.on_success()
+    return result
+
+
+class InstrumentedPipeline(Pipeline):
+    latency_name: str
+    breaker: CircuitBreaker
+
+    def execute(self, raise_on_error=True):
+        return _guarded_call(
+            self.breaker,
+            self.latency_name,
+            f"redis:pipeline[{len(self.command_stack)}]",
+            super().execute,
+            raise_on_error,
+        )
+
+
+class InstrumentedRedis(redis.Redis):
+    """Клиент Redis, который замеряет задержку каждой команды и пайплайна
+    и не обращается к серверу, пока разомкнут предохранитель"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        connection_kwargs = self.connection_pool.connection_kwargs
+        self.latency_name = f"redis_db{connection_kwargs.get('db', 0)}"
+        self.breaker = get_circuit_breaker(
+            f"redis://{connection_kwargs.get('host', 'localhost')}:{connection_kwargs.get('port', 6379)}"
+        )
+        # В одном пайплайне ответы декодируются одинаково, поэтому объединяются только текстовые клиенты
+        self.batchable = bool(connection_kwargs.get("decode_responses"))
+
+    def execute_command(self, *args, **options):
+        batch = current_batch() if self.batchable else None
+        if batch is not None:
+            return batch.execute(self, args, options)
+        return _guarded_call(
+            self.breaker, self.latency_name, f"redis:{args[0]}", super().execute_command, *args, **options
+        )
+
+    def pipeline(self, transaction=True, shard_hint=None) -> InstrumentedPipeline:
+        pipe = InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipe.latency_name = self.latency_name
+        pipe.breaker = self.breaker
+        return pipe
+
+
+class LocalBlocklist:
+    """Копия черного списка access токенов в памяти процесса.
+
+    Токен хранится до того же срока, что и в Redis: после него токен
+    отклоняется и без черного списка. Записи не вытесняются, иначе отозванный
+    токен снова прошел бы проверку, пока Redis недоступен. Размер ограничен
+    числом токенов, отозванных за срок жизни access токена.
+    """
 
-__all__ = ("PostCacheRedis", "RefreshCacheRedis", "AccessCacheRedis",)
+    def __init__(self, ttl: float = config.ACCESS_TOKEN_EXPIRE_IN_SECONDS):
+        self.ttl = ttl
+        # Порядок добавления почти совпадает с порядком сроков: истекшие записи снимаются с начала
+        self._expires_at: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, key: str, expires_at: Optional[float] = None):
+        """Добавить токен. Без срока — на время жизни access токена, известный срок не продлевается"""
+        with self._lock:
+            if expires_at is not None or key not in self._expires_at:
+                self._expires_at[key] = expires_at if expires_at is not None else time.time() + self.ttl
+            self._purge_expired()
+
+    def update(self, entries: Iterable[Tuple[str, float]]):
+        """Добавить токены с их сроками, unix time"""
+        with self._lock:
+            for key, expires_at in entries:
+                self._expires_at[key] = expires_at
+            self._purge_expired()
+
+    def _purge_expired(self):
+        now = time.time()
+        while self._expires_at:
+            key, expires_at = next(iter(self._expires_at.items()))
+            if expires_at > now:
+                break
+            del self._expires_at[key]
+
+    def __contains__(self, key: str) -> bool:
+        expires_at = self._expires_at.get(key)
+        return expires_at is not None and expires_at > time.time()
+
+    def __len__(self) -> int:
+        return len(self._expires_at)
 
 
 class PostCacheRedis(PostAbstractCache):
+    """Кэш постов.
+
+    Чтение и запись из запросов пропускаются, если Redis недоступен: посты
+    тогда читаются из базы. Методы, которые вызывает воркер outbox, ошибку
+    пробрасывают, чтобы событие было обработано повторно.
+    """
+
+    def __init__(self, cache_instance, binary_cache_instance):
+        super().__init__(cache_instance)
+        # Сжатые ответы хранятся как байты, для них нужен клиент без decode_responses
+        self.binary_cache = binary_cache_instance
+        self._subscribers: Dict[str, List[Callable[[Optional[str]], None]]] = defaultdict(list)
+        self._subscribers_lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    @skip_when_unavailable()
     def get(self, key: str) -> Optional[dict]:
         return self.cache.get(name=key)
 
+    @skip_when_unavailable()
+    def get_etag(self, key: str) -> Optional[str]:
+        return self.cache.get(name=f"{key}:etag")
+
+    @skip_when_unavailable()
     def set(
         self,
         key: str,
         value: Union[bytes, str],
-        expire: int = config.CACHE_EXPIRE_IN_SECONDS,
+        expire: Optional[int] = config.CACHE_EXPIRE_IN_SECONDS,
+        etag: Optional[str] = None,
     ):
-        self.cache.set(name=key, value=value, ex=expire)
+        if etag is None:
+            self.cache.set(name=key, value=value, ex=expire)
+            return
+        # ETag лежит рядом с данными, чтобы проверка If-None-Match стоила одного короткого GET
+        with self.cache.pipeline(transaction=False) as pipe:
+            pipe.set(name=key, value=value, ex=expire)
+            pipe.set(name=f"{key}:etag", value=etag, ex=expire)
+            pipe.execute()
+
+    def set_many(
+        self,
+        values: Dict[str, str],
+        etags: Optional[Dict[str, str]] = None,
+        expire: Optional[int] = config.CACHE_EXPIRE_IN_SECONDS,
+    ):
+        etags = etags or {}
+        with self.cache.pipeline(transaction=False) as pipe:
+            for key, value in values.items():
+                pipe.set(name=key, value=value, ex=expire)
+                if key in etags:
+                    pipe.set(name=f"{key}:etag", value=etags[key], ex=expire)
+            pipe.execute()
+
+    @skip_when_unavailable()
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        return self.binary_cache.get(name=key)
+
+    @skip_when_unavailable()
+    def set_bytes(
+        self,
+        key: str,
+        value: bytes,
+        expire: Optional[int] = config.CACHE_EXPIRE_IN_SECONDS,
+    ):
+        self.binary_cache.set(name=key, value=value, ex=expire)
+
+    def incr(self, key: str) -> int:
+        return self.cache.incr(name=key)
+
+    def delete(self, *keys: str):
+        self.cache.delete(*keys)
+
+    def publish(self, channel: str, message: str):
+        self.cache.publish(channel, message)
+
+    def subscribe(self, channel: str, callback: Callable[[Optional[str]], None]):
+        """Сообщения читает отдельный поток со своим соединением, его запускает первая подписка"""
+        with self._subscribers_lock:
+            self._subscribers[channel].append(callback)
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="posts-cache-listener", daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        reconnecting = False
+        while not self._closed.is_set():
+            pubsub = self.cache.pubsub(ignore_subscribe_messages=True)
+            try:
+                channels = set()
+                while not self._closed.is_set():
+                    with self._subscribers_lock:
+                        new_channels = set(self._subscribers) - channels
+                    if new_channels:
+                        pubsub.subscribe(*new_channels)
+                        channels |= new_channels
+                    if reconnecting:
+                        # Пока соединения не было, сообщения терялись
+                        reconnecting = False
+                        for channel in channels:
+                            self._deliver(channel, None)
+                    message = pubsub.get_message(timeout=LISTEN_POLL_TIMEOUT_IN_SECONDS)
+                    if message is not None:
+                        self._deliver(message["channel"], message["data"])
+            except redis.exceptions.RedisError:
+                logger.warning("Lost subscription to posts cache channels, reconnecting", exc_info=True)
+                reconnecting = True
+            finally:
+                pubsub.close()
+            self._closed.wait(config.REDIS_BREAKER_RECOVERY_TIMEOUT_IN_SECONDS)
+
+    def _deliver(self, channel: str, message: Optional[str]):
+        with self._subscribers_lock:
+            callbacks = list(self._subscribers[channel])
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception:
+                logger.exception("Posts cache subscriber failed on channel %s", channel)
+
+    def ping(self) -> bool:
+        return self.cache.ping()
 
     def close(self) -> NoReturn:
+        self._closed.set()
         self.cache.close()
+        self.binary_cache.close()
 
 
 class AccessCacheRedis(AccessAbstractCache):
+    """Черный список access токенов.
+
+    Кроме ключа токена, set пишет токен в сортированное множество со сроком
+    в качестве веса. Синхронизация локальной копии читает из него только
+    записи новее прошлой синхронизации, а не весь черный список.
+    """
+
+    def __init__(self, cache_instance):
+        super().__init__(cache_instance)
+        self.local_blocklist = LocalBlocklist()
+        # Самый поздний срок среди полученных записей
+        self._synced_until = 0.0
+
     def get(self, key: str) -> Optional[dict]:
-        return self.cache.get(name=key)
+        value = self.cache.get(name=key)
+        if value is not None:
+            self.local_blocklist.add(key)
+        return value
 
     def set(
         self,
         key: str,
         value: Union[bytes, str],
     ):
-        self.cache.set(name=key, value=value)
+        # Сначала запоминаем локально: этот процесс не примет токен, даже если запись в Redis не пройдет
+        expires_at = time.time() + config.ACCESS_TOKEN_EXPIRE_IN_SECONDS
+        self.local_blocklist.add(key, expires_at)
+        # Истекший токен отклоняется и так, хранить его в черном списке дольше незачем
+        self.cache.set(name=key, value=value, ex=config.ACCESS_TOKEN_EXPIRE_IN_SECONDS)
+        self.cache.zadd(BLOCKLIST_LOG_KEY, {key: expires_at})
+        self.cache.zremrangebyscore(BLOCKLIST_LOG_KEY, "-inf", time.time())
+
+    def is_blocked_locally(self, key: str) -> bool:
+        return key in self.local_blocklist
+
+    def sync_local_blocklist(self):
+        """Подтянуть токены, заблокированные другими процессами после прошлой синхронизации.
+
+        Часы процессов могут расходиться, поэтому записи читаются с запасом
+        AUTH_LOCAL_BLOCKLIST_SYNC_OVERLAP_IN_SECONDS: повторно полученные
+        записи ничего не меняют.
+        """
+        since = max(time.time(), self._synced_until - config.AUTH_LOCAL_BLOCKLIST_SYNC_OVERLAP_IN_SECONDS)
+        entries = self.cache.zrangebyscore(BLOCKLIST_LOG_KEY, f"({since}", "+inf", withscores=True)
+        if entries:
+            self.local_blocklist.update(entries)
+            self._synced_until = max(self._synced_until, entries[-1][1])
+
+    def ping(self) -> bool:
+        return self.cache.ping()
 
     def close(self) -> NoReturn:
         self.cache.close()
 
 
+# KEYS[1] — активные refresh токены пользователя, KEYS[2] — последний выданный токен семейства,
+# KEYS[3] — только что замененный токен семейства, KEYS[4] — сессии пользователя
+# ARGV[1] — предъявленный токен, ARGV[2] — новый токен, ARGV[3] — время жизни семейства в секундах,
+# ARGV[4] — сколько секунд замененный токен считается параллельным дублем, а не повторным использованием,
+# ARGV[5] — семейство (оно же id сессии), ARGV[6] — новый срок сессии, unix time
+ROTATE_REFRESH_TOKEN_SCRIPT = """
+if redis.call("SREM", KEYS[1], ARGV[1]) == 1 then
+    redis.call("SADD", KEYS[1], ARGV[2])
+    redis.call("SET", KEYS[2], ARGV[2], "EX", ARGV[3])
+    redis.call("SET", KEYS[3], ARGV[1], "EX", ARGV[4])
+    if redis.call("HEXISTS", KEYS[4], ARGV[5]) == 1 then
+        redis.call("HSET", KEYS[4], ARGV[5] .. ":e", ARGV[6])
+    end
+    redis.call("EXPIRE", KEYS[4], ARGV[3])
+    return 1
+end
+if redis.call("GET", KEYS[3]) == ARGV[1] then
+    return 0
+end
+local current = redis.call("GET", KEYS[2])
+if current then
+    redis.call("SREM", KEYS[1], current)
+    redis.call("DEL", KEYS[2])
+end
+redis.call("HDEL", KEYS[4], ARGV[5], ARGV[5] .. ":u", ARGV[5] .. ":e")
+return 0
+"""
+
+# KEYS[1] — активные refresh токены пользователя, KEYS[2] — последний выданный токен семейства,
+# KEYS[3] — сессии пользователя
+# ARGV[1] — семейство (id сессии), ARGV[2] — известный токен сессии или пустая строка.
+# Ключ семейства не привязан к пользователю, поэтому он удаляется, только если сессия
+# есть среди сессий этого пользователя: иначе по чужому id можно было бы завершить чужую сессию
+REVOKE_SESSION_SCRIPT = """
+local removed = 0
+if redis.call("HEXISTS", KEYS[3], ARGV[1]) == 1 then
+    local current = redis.call("GET", KEYS[2])
+    if current then
+        removed = removed + redis.call("SREM", KEYS[1], current)
+    end
+    redis.call("DEL", KEYS[2])
+end
+if ARGV[2] ~= "" then
+    removed = removed + redis.call("SREM", KEYS[1], ARGV[2])
+end
+return removed + redis.call("HDEL", KEYS[3], ARGV[1], ARGV[1] .. ":u", ARGV[1] .. ":e")
+"""
+
+# Срок жизни ключа сессий продлевает каждый вход, поэтому истекшие сессии удаляются по полям "<сессия>:e".
+# KEYS[1] — сессии пользователя, ARGV[1] — текущее время, unix time. Возвращает оставшиеся поля
+PRUNE_SESSIONS_SCRIPT = """
+local fields = redis.call("HGETALL", KEYS[1])
+for i = 1, #fields, 2 do
+    local name = fields[i]
+    if string.sub(name, -2) == ":e" and tonumber(fields[i + 1]) <= tonumber(ARGV[1]) then
+        local session = string.sub(name, 1, -3)
+        redis.call("HDEL", KEYS[1], session, session .. ":u", name)
+    end
+end
+return redis.call("HGETALL", KEYS[1])
+"""
+
+# Время использования пишется только для существующей сессии, иначе запись
+# после выхода снова создала бы ключ сессий, уже без срока жизни
+TOUCH_SESSION_SCRIPT = """
+if redis.call("HEXISTS", KEYS[1], ARGV[1]) == 1 then
+    redis.call("HSET", KEYS[1], ARGV[1] .. ":u", ARGV[2])
+end
+"""
+
+
 class RefreshCacheRedis(RefreshAbstractCache):
     def add(
         self,
@@ -62,7 +433,92 @@ class RefreshCacheRedis(RefreshAbstractCache):
         self,
         key: str
     ):
-        self.cache.delete(key)
+        self.cache.delete(key, f"sessions:{key}")
+
+    def add_session(
+        self,
+        key: str,
+        value: str,
+        family: str,
+        info: str,
+        expire: int,
+    ):
+        with self.cache.pipeline(transaction=False) as pipe:
+            pipe.sadd(key, value)
+            pipe.set(f"family:{family}", value, ex=expire)
+            pipe.hset(f"sessions:{key}", mapping={family: info, f"{family}:e": int(time.time()) + expire})
+            pipe.expire(f"sessions:{key}", expire)
+            pipe.execute()
+
+    def get_sessions(self, key: str) -> Dict[str, str]:
+        fields = self.cache.eval(PRUNE_SESSIONS_SCRIPT, 1, f"sessions:{key}", int(time.time()))
+        return dict(zip(fields[::2], fields[1::2]))
+
+    def revoke_session(self, key: str, family: str, value: Optional[str] = None) -> bool:
+        return self.cache.eval(
+            REVOKE_SESSION_SCRIPT, 3, key, f"family:{family}", f"sessions:{key}", family, value or ""
+        ) > 0
+
+    def touch_sessions(self, last_used: Dict[Tuple[str, str], int]):
+        with self.cache.pipeline(transaction=False) as pipe:
+            for (key, family), timestamp in last_used.items():
+                pipe.eval(TOUCH_SESSION_SCRIPT, 1, f"sessions:{key}", family, timestamp)
+            pipe.execute()
+
+    def rotate(
+        self,
+        key: str,
+        old_value: str,
+        new_value: str,
+        family: str,
+        expire: int,
+    ) -> bool:
+        # EVAL, а не EVALSHA: скрипт короткий, и после перезапуска Redis не нужен повторный SCRIPT LOAD
+        return self.cache.eval(
+            ROTATE_REFRESH_TOKEN_SCRIPT,
+            4,
+            key,
+            f"family:{family}",
+            f"family:{family}:rotated",
+            f"sessions:{key}",
+            old_value,
+            new_value,
+            expire,
+            config.REFRESH_TOKEN_REUSE_GRACE_IN_SECONDS,
+            family,
+            int(time.time()) + expire,
+        ) == 1
+
+    def ping(self) -> bool:
+        return self.cache.ping()
 
     def close(self) -> NoReturn:
         self.cache.close()
+
+
+def _create_client(db: int, decode_responses: bool = True) -> InstrumentedRedis:
+    # Соединение открывается не здесь, а при первой команде
+    return InstrumentedRedis(
+        host=config.REDIS_HOST,
+        port=config.REDIS_PORT,
+        db=db,
+        decode_responses=decode_responses,
+        max_connections=10,
+        socket_timeout=config.REDIS_SOCKET_TIMEOUT_IN_SECONDS,
+        socket_connect_timeout=config.REDIS_SOCKET_CONNECT_TIMEOUT_IN_SECONDS,
+    )
+
+
+def create_posts_cache() -> PostCacheRedis:
+    return PostCacheRedis(
+        cache_instance=_create_client(db=0),
+        binary_cache_instance=_create_client(db=0, decode_responses=False),
+    )
+
+
+def create_access_cache() -> AccessCacheRedis:
+    return AccessCacheRedis(cache_instance=_create_client(db=1))
+
+
+def create_refresh_cache() -> RefreshCacheRedis:
+    return RefreshCacheRedis(cache_instance=_create_client(db=2))
@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, List, Tuple
+
+from sqlalchemy.pool import QueuePool
+
+from src.db.cache import get_access_cache, get_posts_cache, get_refresh_cache
+from src.db.db import get_engine
+
+__all__ = ("warm_up_pools",)
+
+
+def _warm_up_engine(connections: int) -> Tuple[List[Callable[[], None]], Callable[[], None]]:
+    engine = get_engine()
+    # Соединения сверх размера пула при возврате закрываются, открывать их бессмысленно.
+    # Пулы без постоянных соединений (NullPool и т.п.) не прогреваются
+    count = min(connections, engine.pool.size()) if isinstance(engine.pool, QueuePool) else 0
+    opened = []
+
+    def open_connection():
+        opened.append(engine.connect())
+
+    def release():
+        for connection in opened:
+            connection.close()
+
+    return [open_connection] * count, release
+
+
+def _warm_up_redis(client, connections: int) -> Tuple[List[Callable[[], None]], Callable[[], None]]:
+    pool = client.connection_pool
+    opened = []
+
+    def open_connection():
+        # get_connection сразу подключается к Redis
+        opened.append(pool.get_connection("PING"))
+
+    def release():
+        for connection in opened:
+            pool.release(connection)
+
+    return [open_connection] * connections, release
+
+
+def warm_up_pools(connections: int):
+    """Открыть по connections соединений с Postgres и каждой базой Redis параллельно.
+
+    Соединения открываются одновременно и держатся до конца прогрева, иначе
+    пул просто отдавал бы одно и то же соединение.
+    """
+    tasks, releases = [], []
+    open_tasks, release = _warm_up_engine(connections)
+    tasks += open_tasks
+    releases.append(release)
+    for cache_instance in (get_posts_cache(), get_access_cache(), get_refresh_cache()):
+        for client in vars(cache_instance).values():
+            # У не-Redis бэкендов кэша пула соединений нет
+            if hasattr(client, "connection_pool"):
+                open_tasks, release = _warm_up_redis(client, connections)
+                tasks += open_tasks
+                releases.append(release)
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(tasks) or 1) as executor:
+            futures = [executor.submit(task) for task in tasks]
+            wait(futures)
+        for future in futures:
+            future.result()
+    finally:
+        for release in releases:
+            release()
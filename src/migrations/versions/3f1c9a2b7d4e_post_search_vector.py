@@ -0,0 +1,38 @@
+"""post full-text search
+
+Revision ID: 3f1c9a2b7d4e
+Revises: d0932090ee8f
+Create Date: 2026-10-19 10:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a2b7d4e'
+down_revision = 'd0932090ee8f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Заголовок весит больше текста поста при ранжировании.
+    # Конфигурация 'russian' должна совпадать с SEARCH_TS_CONFIG
+    op.add_column('post', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+    op.create_index('ix_post_search_vector', 'post', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_post_search_vector', table_name='post')
+    op.drop_column('post', 'search_vector')
@@ -0,0 +1,29 @@
+"""post author feed index
+
+Revision ID: 8b5e0d6f41a9
+Revises: 3f1c9a2b7d4e
+Create Date: 2026-10-19 11:40:08.615390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b5e0d6f41a9'
+down_revision = '3f1c9a2b7d4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_post_author_id_created_at_id',
+        'post',
+        ['author_id', sa.text('created_at DESC'), 'id'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_post_author_id_created_at_id', table_name='post')
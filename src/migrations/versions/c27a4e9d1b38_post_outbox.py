@@ -0,0 +1,31 @@
+"""post outbox
+
+Revision ID: c27a4e9d1b38
+Revises: 8b5e0d6f41a9
+Create Date: 2026-10-19 14:02:55.781204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = 'c27a4e9d1b38'
+down_revision = '8b5e0d6f41a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('post_outbox',
+    sa.Column('id', sa.Integer(), nullable=True),
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('event', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('post_outbox')
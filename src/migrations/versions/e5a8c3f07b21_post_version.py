@@ -0,0 +1,30 @@
+"""post version
+
+Revision ID: e5a8c3f07b21
+Revises: c27a4e9d1b38
+Create Date: 2026-10-19 16:20:41.318527
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a8c3f07b21'
+down_revision = 'c27a4e9d1b38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # server_default заполняет существующие строки без перезаписи таблицы
+    op.add_column('post', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('post', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.add_column('post_outbox', sa.Column('author_id', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('post_outbox', 'author_id')
+    op.drop_column('post', 'updated_at')
+    op.drop_column('post', 'version')
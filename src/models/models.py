@@ -3,9 +3,9 @@ from datetime import datetime
 from typing import Optional, List
 
 from sqlmodel import Field, SQLModel, Relationship
-from sqlalchemy import Column, String
+from sqlalchemy import Column, Index, String, text
 
-__all__ = ("Post", "User",)
+__all__ = ("Post", "PostOutbox", "User",)
 
 
 class User(SQLModel, table=True):
@@ -21,10 +21,30 @@ class User(SQLModel, table=True):
 
 
 class Post(SQLModel, table=True):
+    __table_args__ = (
+        # Покрывает ленту автора: фильтр по автору и сортировку по дате без отдельной сортировки
+        Index("ix_post_author_id_created_at_id", "author_id", text("created_at DESC"), "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str = Field(nullable=False)
     description: str = Field(nullable=False)
     views: int = Field(default=0)
-    created_at: datetime = Field(default=datetime.utcnow(), nullable=False)
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    # Растет с каждым изменением, по нему проверяется If-Match и строится ETag
+    version: int = Field(default=1, nullable=False, sa_column_kwargs={"server_default": "1"})
+    updated_at: Optional[datetime] = Field(default=None)
     author_id: Optional[str] = Field(foreign_key="user.uuid", nullable=False)
     user: Optional[User] = Relationship(back_populates="posts")
+
+
+class PostOutbox(SQLModel, table=True):
+    """События по постам, которые фоновый воркер переносит в кэш"""
+    __tablename__ = "post_outbox"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    post_id: int = Field(nullable=False)
+    event: str = Field(nullable=False)
+    # Удаленного поста в базе уже нет, а ленту автора нужно сбросить
+    author_id: Optional[str] = Field(default=None)
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
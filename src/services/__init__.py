@@ -1,3 +1,4 @@
 from .mixins import *
+from .pagination import *
 from .post import *
 from .user import *
@@ -0,0 +1,142 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from functools import lru_cache
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import text
+
+from src.core.config import (
+    HEALTH_CHECK_CACHE_TTL_IN_SECONDS, HEALTH_CHECK_TIMEOUT_IN_SECONDS, HEALTH_MAX_P99_LATENCY_MS
+)
+from src.core.metrics import latency_snapshot
+from src.core.startup import startup_profile
+from src.db import circuit_breakers, get_access_cache, get_engine, get_posts_cache, get_refresh_cache
+
+__all__ = ("HealthService", "get_health_service")
+
+
+BREAKER_STATE_CODES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def _ping_postgres():
+    with get_engine().connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+class HealthService:
+    """Проверка зависимостей для балансировщика.
+
+    Каждая проверка ограничена по времени, а результат кэшируется на
+    cache_ttl секунд, так что частые запросы проверок не нагружают базы.
+    Зависшая проверка не запускается повторно, пока не завершится.
+    """
+
+    def __init__(
+        self,
+        timeout: float = HEALTH_CHECK_TIMEOUT_IN_SECONDS,
+        cache_ttl: float = HEALTH_CHECK_CACHE_TTL_IN_SECONDS,
+        max_p99_latency_ms: float = HEALTH_MAX_P99_LATENCY_MS,
+    ):
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.max_p99_latency_ms = max_p99_latency_ms
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="health-check")
+        self._running: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._result: Optional[dict] = None
+        self._checked_at: float = 0
+
+    @staticmethod
+    def _dependencies() -> Dict[str, Callable[[], object]]:
+        return {
+            "postgres": _ping_postgres,
+            "posts_cache": get_posts_cache().ping,
+            "access_cache": get_access_cache().ping,
+            "refresh_cache": get_refresh_cache().ping,
+        }
+
+    @staticmethod
+    def _timed(check: Callable[[], object]) -> float:
+        started_at = time.perf_counter()
+        check()
+        return (time.perf_counter() - started_at) * 1000
+
+    def _check_dependencies(self) -> Dict[str, dict]:
+        futures = {}
+        for name, check in self._dependencies().items():
+            future = self._running.get(name)
+            if future is None or future.done():
+                future = self._running[name] = self._executor.submit(self._timed, check)
+            futures[name] = future
+
+        deadline = time.monotonic() + self.timeout
+        results = {}
+        for name, future in futures.items():
+            try:
+                latency_ms = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                results[name] = {"status": "ok", "latency_ms": round(latency_ms, 2)}
+            except TimeoutError:
+                results[name] = {"status": "timeout"}
+            except Exception as error:
+                results[name] = {"status": "error", "error": type(error).__name__}
+        return results
+
+    def _slow_dependencies(self, latency: Dict[str, dict]) -> list:
+        if not self.max_p99_latency_ms:
+            return []
+        return [
+            name for name, stats in latency.items()
+            if stats["p99_ms"] is not None and stats["p99_ms"] > self.max_p99_latency_ms
+        ]
+
+    def check_readiness(self) -> dict:
+        """Проверить зависимости или вернуть недавний результат."""
+        with self._lock:
+            if self._result and time.monotonic() - self._checked_at < self.cache_ttl:
+                return self._result
+
+            dependencies = self._check_dependencies()
+            latency = latency_snapshot()
+            slow = self._slow_dependencies(latency)
+            self._result = {
+                "ready": (
+                    startup_profile.is_ready
+                    and all(result["status"] == "ok" for result in dependencies.values())
+                    and not slow
+                ),
+                "dependencies": dependencies,
+                "latency": latency,
+                "slow": slow,
+                "circuit_breakers": {name: breaker.snapshot() for name, breaker in circuit_breakers.items()},
+                "startup": startup_profile.as_dict(),
+            }
+            self._checked_at = time.monotonic()
+            return self._result
+
+    @staticmethod
+    def render_metrics() -> str:
+        """Состояние предохранителей и задержки в текстовом формате Prometheus"""
+        lines = [
+            "# HELP cache_circuit_breaker_state 0 - closed, 1 - half open, 2 - open",
+            "# TYPE cache_circuit_breaker_state gauge",
+        ]
+        breakers = {name: breaker.snapshot() for name, breaker in sorted(circuit_breakers.items())}
+        for name, snapshot in breakers.items():
+            lines.append(f'cache_circuit_breaker_state{{breaker="{name}"}} {BREAKER_STATE_CODES[snapshot["state"]]}')
+        for metric in ("failures_total", "rejected_total", "opened_total"):
+            lines.append(f"# TYPE cache_circuit_breaker_{metric} counter")
+            for name, snapshot in breakers.items():
+                lines.append(f'cache_circuit_breaker_{metric}{{breaker="{name}"}} {snapshot[metric]}')
+
+        lines.append("# TYPE dependency_latency_p99_ms gauge")
+        for name, stats in latency_snapshot().items():
+            if stats["p99_ms"] is not None:
+                lines.append(f'dependency_latency_p99_ms{{dependency="{name}"}} {stats["p99_ms"]}')
+        return "\n".join(lines) + "\n"
+
+
+# get_health_service — это провайдер HealthService. Синглтон
+@lru_cache()
+def get_health_service() -> HealthService:
+    return HealthService()
@@ -0,0 +1,93 @@
+import logging
+import threading
+from typing import Optional
+
+from sqlmodel import Session
+
+from src.core.config import POST_OUTBOX_BATCH_SIZE, POST_OUTBOX_POLL_INTERVAL_IN_SECONDS
+from src.db import get_engine, get_posts_cache
+from src.models import Post, PostOutbox
+from src.services.post import PostService
+
+__all__ = ("PostOutboxWorker",)
+
+logger = logging.getLogger(__name__)
+
+
+class PostOutboxWorker:
+    """Фоновый поток, который разбирает outbox постов пачками: прогревает кэш
+    новыми постами и сбрасывает измененные и удаленные.
+
+    Строки выбираются через FOR UPDATE SKIP LOCKED, поэтому несколько
+    процессов сервера могут разбирать outbox одновременно. Строка удаляется
+    только после успешной записи в кэш, иначе событие будет обработано повторно.
+
+    Движок и клиенты Redis поток получает в первой пачке, через poll_interval
+    после старта. Так задумано: события, оставшиеся с прошлых запусков, нужно
+    разобрать и без запросов, но старт процесса их создание не задерживает.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = POST_OUTBOX_BATCH_SIZE,
+        poll_interval: float = POST_OUTBOX_POLL_INTERVAL_IN_SECONDS,
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self.run, name="post-outbox-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_interval * 5)
+
+    def run(self):
+        # Первая пачка разбирается через poll_interval после старта, а не сразу: движок и клиенты
+        # Redis создаются при первом обращении и не отнимают время у первого ответа процесса
+        processed = 0
+        # Если пачка заполнена целиком, в outbox наверняка есть еще события
+        while not self._stopped.wait(self.poll_interval if processed < self.batch_size else 0):
+            try:
+                processed = self.process_batch()
+            except Exception:
+                logger.exception("Failed to process post outbox batch")
+                processed = 0
+
+    def process_batch(self) -> int:
+        """Обработать одну пачку событий, вернуть количество обработанных."""
+        with Session(get_engine()) as session:
+            events = (
+                session.query(PostOutbox)
+                .order_by(PostOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            if not events:
+                return 0
+
+            post_service = PostService(posts_cache=get_posts_cache(), session=session)
+            # Измененные и удаленные посты сбрасываются до прогрева: если пост создан
+            # и изменен в одной пачке, в кэш попадет уже последняя версия
+            for event_name in ("updated", "deleted"):
+                authors = {event.post_id: event.author_id for event in events if event.event == event_name}
+                if authors:
+                    post_service.invalidate_posts(authors, event=event_name)
+
+            # Пост мог быть удален после создания события, такие просто пропускаем
+            created_ids = {event.post_id for event in events if event.event == "created"}
+            if created_ids:
+                posts = session.query(Post).filter(Post.id.in_(created_ids)).all()
+                if posts:
+                    post_service.warm_created_posts(posts)
+
+            for event in events:
+                session.delete(event)
+            session.commit()
+            return len(events)
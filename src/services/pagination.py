@@ -0,0 +1,37 @@
+import base64
+import json
+from typing import Any, Callable, List
+
+__all__ = ("InvalidCursorError", "encode_cursor", "decode_cursor", "cursor_id")
+
+# Наибольшее значение колонки integer в Postgres
+MAX_ID = 2 ** 31 - 1
+
+
+class InvalidCursorError(ValueError):
+    """Курсор пагинации поврежден или подделан"""
+
+
+def encode_cursor(*values: Any) -> str:
+    """Упаковка значений ключа последней записи страницы в непрозрачный курсор"""
+    raw = json.dumps(values, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *converters: Callable[[Any], Any]) -> List[Any]:
+    """Распаковка курсора в значения ключа, каждое значение приводится своим конвертером"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(converters):
+            raise InvalidCursorError(cursor)
+        return [convert(value) for convert, value in zip(converters, values)]
+    except (ValueError, TypeError):
+        raise InvalidCursorError(cursor)
+
+
+def cursor_id(value: Any) -> int:
+    """Конвертер id записи для decode_cursor: курсор с id, которого не может быть в базе, подделан"""
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 < value <= MAX_ID:
+        raise InvalidCursorError(value)
+    return value
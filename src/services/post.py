@@ -1,23 +1,82 @@
+import hashlib
 import json
+import time
+from datetime import datetime
 from functools import lru_cache
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 from fastapi import Depends
+from sqlalchemy import and_, cast, column, func, or_, tuple_
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION, TSVECTOR
 from sqlmodel import Session
 
-from src.api.v1.schemas import PostCreate, PostModel
-from src.db import PostAbstractCache, get_posts_cache, get_session
-from src.models import Post
-from src.services import PostServiceMixin
+from src.api.v1.schemas import PostCreate, PostModel, PostPageResponse, PostUpdate, UserModel
+from src.core.config import (
+    POST_OUTBOX_WORKER_ENABLED, POSTS_INVALIDATION_CHANNEL, POSTS_PAGE_SIZE, SEARCH_CACHE_EXPIRE_IN_SECONDS,
+    SEARCH_TS_CONFIG
+)
+from src.db import CacheUnavailableError, PostAbstractCache, get_posts_cache, get_session
+from src.models import Post, PostOutbox
+from src.services import PostServiceMixin, cursor_id, decode_cursor, encode_cursor
 
-__all__ = ("PostService", "get_post_service")
+__all__ = ("PostService", "get_post_service", "make_post_etag")
+
+# Версия списка постов, увеличивается при каждом изменении. Из нее строится ETag списка
+LIST_VERSION_KEY = "posts:version"
+# Готовые тела ответа списка, общие для всех процессов: posts:snapshot:<кодировка>
+LIST_SNAPSHOT_KEY = "posts:snapshot"
+
+# Генерируемая колонка post.search_vector создается миграцией и не описана в модели
+search_vector = column("search_vector", TSVECTOR)
+
+
+def make_post_etag(post_id: int, version: int) -> str:
+    """Сильный ETag поста: версия растет с каждым изменением"""
+    return f'"{post_id}-{version}"'
+
+
+def _post_cache_keys(post_id: int) -> List[str]:
+    """Все ключи кэша с телом поста: JSON, ETag и заранее сжатые ответы"""
+    return [f"{post_id}", f"{post_id}:etag", f"{post_id}:gzip", f"{post_id}:br"]
 
 
 class PostService(PostServiceMixin):
-    def get_post_list(self) -> dict:
-        """Получить список постов."""
-        posts = self.session.query(Post).order_by(Post.created_at).all()
-        return {"posts": [PostModel(**post.dict()) for post in posts]}
+    # Без воркера outbox кэш сбрасывается и прогревается прямо в запросе после коммита
+    outbox_enabled: bool = POST_OUTBOX_WORKER_ENABLED
+    # Готовые списки в памяти процесса узнают об изменении сразу после коммита,
+    # даже если сообщение в канал не ушло из-за недоступного Redis
+    list_change_listeners: List[Callable[[], None]] = []
+
+    def get_post_list(self, limit: int, cursor: Optional[str] = None) -> dict:
+        """Получить страницу списка постов: limit постов старше курсора, от старых к новым.
+
+        Без курсора — последние limit постов. next_cursor ведет к более старым постам.
+        """
+        statement = self.session.query(Post)
+        if cursor:
+            last_created_at, last_id = decode_cursor(cursor, datetime.fromisoformat, cursor_id)
+            statement = statement.filter(tuple_(Post.created_at, Post.id) < tuple_(last_created_at, last_id))
+        # Запрашиваем на одну запись больше, чтобы понять, есть ли следующая страница
+        posts = statement.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(posts) > limit:
+            oldest_post = posts[limit - 1]
+            next_cursor = encode_cursor(oldest_post.created_at.isoformat(), oldest_post.id)
+        return {
+            "posts": [PostModel(**post.dict()) for post in reversed(posts[:limit])],
+            "next_cursor": next_cursor,
+        }
+
+    def get_encoded_post_list(self, encoding: str) -> Optional[Tuple[str, bytes]]:
+        """Получить из кэша готовое тело ответа списка и его ETag. encoding "identity" — без сжатия."""
+        if cached := self.posts_cache.get_bytes(key=f"{LIST_SNAPSHOT_KEY}:{encoding}"):
+            etag, body = cached.split(b"\n", 1)
+            return etag.decode(), body
+
+    def set_encoded_post_list(self, encoding: str, etag: str, body: bytes):
+        """Сохранить готовое тело ответа списка для остальных процессов."""
+        self.posts_cache.set_bytes(key=f"{LIST_SNAPSHOT_KEY}:{encoding}", value=etag.encode() + b"\n" + body)
 
     def get_post_detail(self, item_id: int) -> Optional[dict]:
         """Получить детальную информацию поста."""
@@ -26,9 +85,117 @@ class PostService(PostServiceMixin):
 
         post = self.session.query(Post).filter(Post.id == item_id).first()
         if post:
-            self.posts_cache.set(key=f"{post.id}", value=post.json())
+            self.posts_cache.set(
+                key=f"{post.id}",
+                value=post.json(),
+                etag=make_post_etag(post.id, post.version),
+            )
         return post.dict() if post else None
 
+    def get_encoded_post_detail(self, item_id: int, encoding: str) -> Optional[Tuple[str, bytes]]:
+        """Получить из кэша готовое сжатое тело ответа поста и его ETag."""
+        if cached := self.posts_cache.get_bytes(key=f"{item_id}:{encoding}"):
+            etag, body = cached.split(b"\n", 1)
+            return etag.decode(), body
+
+    def set_encoded_post_detail(self, item_id: int, encoding: str, etag: str, body: bytes):
+        """Сохранить сжатое тело ответа поста, чтобы не сжимать его на каждый запрос."""
+        # ETag кладем в то же значение, чтобы попадание в кэш стоило одного GET
+        self.posts_cache.set_bytes(key=f"{item_id}:{encoding}", value=etag.encode() + b"\n" + body)
+
+    def get_post_etag(self, item_id: int) -> Optional[str]:
+        """Получить ETag поста из кэша, не читая сам пост."""
+        return self.posts_cache.get_etag(key=f"{item_id}")
+
+    def get_list_etag(self, page: Optional[str] = None) -> str:
+        """Получить ETag списка постов по его текущей версии. page — страница, кроме первой по умолчанию."""
+        if page is None:
+            return f'"posts-{self._get_list_version()}"'
+        return f'"posts-{self._get_list_version()}-{page}"'
+
+    def _get_list_version(self) -> str:
+        version = self.posts_cache.get(key=LIST_VERSION_KEY)
+        if version is None:
+            version = self._reset_list_version()
+        return version
+
+    def _bump_list_version(self):
+        """Сменить версию списка постов после изменения."""
+        if self.posts_cache.incr(key=LIST_VERSION_KEY) == 1:
+            # Счетчика не было в кэше, начинаем заново
+            self._reset_list_version()
+
+    def _reset_list_version(self) -> int:
+        """Начать отсчет версий с текущего времени.
+
+        Если счетчик пропал из кэша (например, после перезапуска Redis), новые ETag
+        не должны совпасть с выданными клиентам раньше.
+        """
+        version = time.time_ns() // 1_000_000
+        self.posts_cache.set(key=LIST_VERSION_KEY, value=str(version), expire=None)
+        return version
+
+    def search_posts(self, query: str, limit: int, cursor: Optional[str] = None) -> dict:
+        """Полнотекстовый поиск постов с сортировкой по релевантности."""
+        normalized_query = " ".join(query.lower().split())
+        query_hash = hashlib.sha1(normalized_query.encode()).hexdigest()
+        # Версия списка в ключе: после любого изменения постов поиск не отдаст старую выдачу
+        cache_key = f"search:{self._get_list_version()}:{query_hash}:{limit}:{cursor or ''}"
+        if cached_page := self.posts_cache.get(key=cache_key):
+            return json.loads(cached_page)
+
+        ts_query = func.websearch_to_tsquery(SEARCH_TS_CONFIG, normalized_query)
+        # ts_rank_cd возвращает real, а курсор — float8: без приведения граница страницы не совпала бы
+        # с рангом в базе (real 0.1 после расширения больше 0.1), и записи на ней терялись бы или повторялись
+        rank = cast(func.ts_rank_cd(search_vector, ts_query), DOUBLE_PRECISION)
+        statement = self.session.query(Post, rank).filter(search_vector.op("@@")(ts_query))
+        if cursor:
+            last_rank, last_id = decode_cursor(cursor, float, cursor_id)
+            statement = statement.filter(tuple_(rank, Post.id) < tuple_(last_rank, last_id))
+        # Запрашиваем на одну запись больше, чтобы понять, есть ли следующая страница
+        rows = statement.order_by(rank.desc(), Post.id.desc()).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            last_post, last_rank = rows[limit - 1]
+            next_cursor = encode_cursor(last_rank, last_post.id)
+        page = PostPageResponse(
+            posts=[PostModel(**post.dict()) for post, _ in rows[:limit]],
+            next_cursor=next_cursor,
+        )
+        self.posts_cache.set(key=cache_key, value=page.json(), expire=SEARCH_CACHE_EXPIRE_IN_SECONDS)
+        return page.dict()
+
+    def get_author_posts(self, author_id: str, limit: int, cursor: Optional[str] = None) -> dict:
+        """Получить ленту постов автора, новые сначала."""
+        # Кэшируем только первую страницу стандартного размера, ее сбрасывает любое изменение постов автора
+        is_cached_page = cursor is None and limit == POSTS_PAGE_SIZE
+        cache_key = f"author:{author_id}"
+        if is_cached_page and (cached_page := self.posts_cache.get(key=cache_key)):
+            return json.loads(cached_page)
+
+        statement = self.session.query(Post).filter(Post.author_id == author_id)
+        if cursor:
+            last_created_at, last_id = decode_cursor(cursor, datetime.fromisoformat, cursor_id)
+            statement = statement.filter(or_(
+                Post.created_at < last_created_at,
+                and_(Post.created_at == last_created_at, Post.id > last_id),
+            ))
+        # Порядок совпадает с индексом ix_post_author_id_created_at_id
+        posts = statement.order_by(Post.created_at.desc(), Post.id).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(posts) > limit:
+            last_post = posts[limit - 1]
+            next_cursor = encode_cursor(last_post.created_at.isoformat(), last_post.id)
+        page = PostPageResponse(
+            posts=[PostModel(**post.dict()) for post in posts[:limit]],
+            next_cursor=next_cursor,
+        )
+        if is_cached_page:
+            self.posts_cache.set(key=cache_key, value=page.json())
+        return page.dict()
+
     def create_post(self, post: PostCreate, author_id: str) -> dict:
         """Создать пост."""
         new_post = Post(
@@ -37,10 +204,131 @@ class PostService(PostServiceMixin):
             author_id=author_id
         )
         self.session.add(new_post)
+        self.session.flush()
+        # Кэш обновит фоновый воркер: событие пишется в той же транзакции, что и пост
+        self._add_outbox_event(new_post.id, "created", author_id)
         self.session.commit()
         self.session.refresh(new_post)
+        if not self.outbox_enabled:
+            self._warm_after_commit([new_post])
         return new_post.dict()
 
+    def _add_outbox_event(self, post_id: int, event: str, author_id: str):
+        # Без воркера события никто не разберет, и таблица только росла бы
+        if self.outbox_enabled:
+            self.session.add(PostOutbox(post_id=post_id, event=event, author_id=author_id))
+
+    def _warm_after_commit(self, posts: List[Post]):
+        """Прогреть кэш в запросе, когда воркер outbox выключен"""
+        try:
+            self.warm_created_posts(posts)
+        except CacheUnavailableError:
+            pass
+        self._notify_list_changed()
+
+    def _get_editable_post(self, item_id: int, user: UserModel) -> Union[Post, str]:
+        post = self.session.query(Post).filter(Post.id == item_id).one_or_none()
+        if post is None:
+            return "Post not found"
+        if post.author_id != user.uuid and not user.is_superuser:
+            return "Permission denied"
+        return post
+
+    def update_post(
+        self,
+        item_id: int,
+        post_update: PostUpdate,
+        user: UserModel,
+        expected_version: Optional[int] = None,
+    ) -> Union[dict, str]:
+        """Изменить пост автора. expected_version — версия из If-Match, None — без проверки."""
+        post = self._get_editable_post(item_id, user)
+        if isinstance(post, str):
+            return post
+        statement = self.session.query(Post).filter(Post.id == item_id)
+        if expected_version is not None:
+            statement = statement.filter(Post.version == expected_version)
+        # Проверка версии и изменение — один UPDATE, параллельная правка между ними не вклинится
+        updated = statement.update(
+            {
+                **post_update.dict(exclude_unset=True, exclude_none=True),
+                "version": Post.version + 1,
+                "updated_at": datetime.utcnow(),
+            },
+            synchronize_session=False,
+        )
+        if not updated:
+            self.session.rollback()
+            return "Post has been modified"
+        self._add_outbox_event(item_id, "updated", post.author_id)
+        self.session.commit()
+        self.session.refresh(post)
+        self._invalidate_after_commit({post.id: post.author_id}, event="updated")
+        return post.dict()
+
+    def delete_post(self, item_id: int, user: UserModel, expected_version: Optional[int] = None) -> Optional[str]:
+        """Удалить пост автора. Возвращает текст ошибки или None."""
+        post = self._get_editable_post(item_id, user)
+        if isinstance(post, str):
+            return post
+        statement = self.session.query(Post).filter(Post.id == item_id)
+        if expected_version is not None:
+            statement = statement.filter(Post.version == expected_version)
+        # После коммита удаленный объект уже не прочитать
+        author_id = post.author_id
+        if not statement.delete(synchronize_session=False):
+            self.session.rollback()
+            return "Post has been modified"
+        self._add_outbox_event(item_id, "deleted", author_id)
+        self.session.commit()
+        self._invalidate_after_commit({item_id: author_id}, event="deleted")
+
+    def _invalidate_after_commit(self, authors: Dict[int, str], event: str):
+        """Сбросить кэш сразу, не дожидаясь воркера outbox.
+
+        Воркер все равно повторит сброс по событию из outbox: это исправит кэш,
+        если Redis был недоступен или параллельный запрос успел положить туда
+        прочитанную до коммита версию.
+        """
+        try:
+            self.invalidate_posts(authors, event=event)
+        except CacheUnavailableError:
+            pass
+        self._notify_list_changed()
+
+    def _notify_list_changed(self):
+        for listener in list(self.list_change_listeners):
+            listener()
+
+    def invalidate_posts(self, authors: Dict[int, str], event: str):
+        """Удалить из кэша измененные посты и зависящие от них списки.
+
+        authors — id поста -> id автора. Детальные ключи удаляются, версия
+        списка (а с ней и ключи поиска) меняется, первая страница ленты
+        автора удаляется, локальные кэши получают сообщение в канал.
+        """
+        keys = {key for post_id in authors for key in _post_cache_keys(post_id)}
+        keys.update(f"author:{author_id}" for author_id in authors.values() if author_id)
+        self.posts_cache.delete(*keys)
+        self._bump_list_version()
+        self.posts_cache.publish(
+            channel=POSTS_INVALIDATION_CHANNEL,
+            message=json.dumps({"event": event, "post_ids": sorted(authors)}),
+        )
+
+    def warm_created_posts(self, posts: List[Post]):
+        """Положить новые посты в кэш и сбросить зависящие от них списки."""
+        self.posts_cache.set_many(
+            values={f"{post.id}": post.json() for post in posts},
+            etags={f"{post.id}": make_post_etag(post.id, post.version) for post in posts},
+        )
+        self.posts_cache.delete(*{f"author:{post.author_id}" for post in posts})
+        self._bump_list_version()
+        self.posts_cache.publish(
+            channel=POSTS_INVALIDATION_CHANNEL,
+            message=json.dumps({"event": "created", "post_ids": [post.id for post in posts]}),
+        )
+
 
 # get_post_service — это провайдер PostService. Синглтон
 @lru_cache()
@@ -0,0 +1,171 @@
+import logging
+import threading
+from typing import Dict, Optional
+
+from sqlmodel import Session
+
+from src.api.v1.schemas import PostPageResponse
+from src.core.compression import choose_encoding, compress
+from src.core.config import (
+    COMPRESSION_MINIMUM_SIZE, POST_LIST_SNAPSHOT_REFRESH_INTERVAL_IN_SECONDS, POST_LIST_SNAPSHOT_SIZE,
+    POSTS_INVALIDATION_CHANNEL
+)
+from src.db import get_engine, get_posts_cache
+from src.services.post import PostService
+
+__all__ = ("PostListSnapshot", "PostListMaterializer", "post_list_materializer", "serialize_post_list")
+
+logger = logging.getLogger(__name__)
+
+# Кодировки, для которых хватает установленных библиотек: br только с brotli
+SNAPSHOT_ENCODINGS = tuple(encoding for encoding in ("br", "gzip") if choose_encoding(encoding) == encoding)
+
+
+def serialize_post_list(posts: dict) -> bytes:
+    """Тело ответа списка. Так же сериализует JSONResponse: один ETag — одни и те же байты"""
+    return PostPageResponse(**posts).json(ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class PostListSnapshot:
+    """Готовый ответ списка постов: ETag, JSON и сжатые варианты JSON"""
+
+    def __init__(self, etag: str, body: bytes, encoded: Dict[str, bytes]):
+        self.etag = etag
+        self.body = body
+        self.encoded = encoded
+
+
+class PostListMaterializer:
+    """Фоновый поток, который держит в памяти процесса готовый ответ списка постов.
+
+    Раз в interval секунд (или сразу после wake) поток читает версию списка.
+    Если она сменилась, снимок берется из Redis, где его уже мог собрать
+    другой процесс, а иначе собирается из базы, сериализуется и сжимается
+    один раз и кладется в Redis для остальных. Запрос списка только отдает
+    байты из памяти: без обращений к базе и без сериализации.
+
+    Об изменении постов снимок узнает из канала инвалидации, а в процессе,
+    который изменил пост, — сразу после коммита. Устаревший снимок
+    сбрасывается до того, как собран новый: пока нового нет, список читается
+    из базы. Интервал проверки страхует от потерянных сообщений.
+
+    Поток запускается первым запросом списка, а не при старте сервера:
+    движок и клиенты Redis по-прежнему создаются при первом обращении.
+    """
+
+    def __init__(
+        self,
+        size: int = POST_LIST_SNAPSHOT_SIZE,
+        interval: float = POST_LIST_SNAPSHOT_REFRESH_INTERVAL_IN_SECONDS,
+    ):
+        self.size = size
+        self.interval = interval
+        self.snapshot: Optional[PostListSnapshot] = None
+        self._stopped = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._enabled = False
+        self._subscribed = False
+        self._start_lock = threading.Lock()
+        # Растет при каждом сбросе: снимок, собранный до сброса, не заменит сброшенный
+        self._generation = 0
+        self._snapshot_lock = threading.Lock()
+
+    def enable(self):
+        """Разрешить запуск потока первым запросом списка"""
+        self._enabled = True
+        if self.invalidate not in PostService.list_change_listeners:
+            PostService.list_change_listeners.append(self.invalidate)
+
+    def get_snapshot(self) -> Optional[PostListSnapshot]:
+        """Текущий снимок. Пока он не собран — None, и список читается из базы"""
+        if self._enabled and self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self.start()
+        return self.snapshot
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self.run, name="post-list-materializer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._enabled = False
+        if self.invalidate in PostService.list_change_listeners:
+            PostService.list_change_listeners.remove(self.invalidate)
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval * 5)
+        # Остановленный поток снимок больше не обновит, запросы пойдут в базу
+        self.snapshot = None
+
+    def wake(self, message: Optional[str] = None):
+        """Проверить версию списка сейчас, не дожидаясь интервала"""
+        self._wakeup.set()
+
+    def invalidate(self, message: Optional[str] = None):
+        """Список изменился: сбросить снимок и сразу собрать новый"""
+        with self._snapshot_lock:
+            self._generation += 1
+            self.snapshot = None
+        self._wakeup.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            try:
+                self.refresh()
+            except Exception:
+                # Без проверки версии снимок мог устареть, пока проверка не пройдет, список читается из базы
+                logger.exception("Failed to refresh post list snapshot")
+                self.snapshot = None
+            self._wakeup.wait(self.interval)
+
+    def refresh(self) -> bool:
+        """Обновить снимок, если версия списка сменилась. Вернуть True, если снимок обновлен."""
+        generation = self._generation
+        with Session(get_engine()) as session:
+            posts_cache = get_posts_cache()
+            if not self._subscribed:
+                posts_cache.subscribe(POSTS_INVALIDATION_CHANNEL, self.invalidate)
+                self._subscribed = True
+            post_service = PostService(posts_cache=posts_cache, session=session)
+            etag = post_service.get_list_etag()
+            if self.snapshot is not None and self.snapshot.etag == etag:
+                return False
+            snapshot = self._load_shared(post_service, etag) or self._build(post_service, etag)
+        with self._snapshot_lock:
+            # Список изменился, пока собирался снимок: его соберет следующая проверка
+            if generation != self._generation:
+                return False
+            self.snapshot = snapshot
+        return True
+
+    @staticmethod
+    def _load_shared(post_service: PostService, etag: str) -> Optional[PostListSnapshot]:
+        shared = post_service.get_encoded_post_list(encoding="identity")
+        if shared is None or shared[0] != etag:
+            return None
+        body = shared[1]
+        encoded = {}
+        for encoding in SNAPSHOT_ENCODINGS if len(body) >= COMPRESSION_MINIMUM_SIZE else ():
+            cached = post_service.get_encoded_post_list(encoding=encoding)
+            # Сжатый вариант мог остаться от прошлой версии, тогда сжимаем сами
+            encoded[encoding] = cached[1] if cached and cached[0] == etag else compress(body, encoding)
+        return PostListSnapshot(etag=etag, body=body, encoded=encoded)
+
+    def _build(self, post_service: PostService, etag: str) -> PostListSnapshot:
+        # Версия прочитана до постов: если пост появится между ними, следующая проверка соберет снимок заново
+        body = serialize_post_list(post_service.get_post_list(limit=self.size))
+        encoded = {}
+        if len(body) >= COMPRESSION_MINIMUM_SIZE:
+            encoded = {encoding: compress(body, encoding) for encoding in SNAPSHOT_ENCODINGS}
+        post_service.set_encoded_post_list(encoding="identity", etag=etag, body=body)
+        for encoding, encoded_body in encoded.items():
+            post_service.set_encoded_post_list(encoding=encoding, etag=etag, body=encoded_body)
+        return PostListSnapshot(etag=etag, body=body, encoded=encoded)
+
+
+post_list_materializer = PostListMaterializer()
@@ -0,0 +1,39 @@
+import random
+import threading
+import time
+from typing import Dict, Tuple
+
+from src.core.config import SESSION_LAST_USED_SAMPLE_RATE
+from src.db import get_refresh_cache
+
+__all__ = ("SessionActivityBuffer", "session_activity")
+
+
+class SessionActivityBuffer:
+    """Время последнего использования сессий, накопленное в памяти.
+
+    Запоминается только доля запросов sample_rate, повторы одной сессии
+    схлопываются, а в Redis все пишется одним пайплайном при flush. Так
+    проверка токена не делает лишней записи, а время использования
+    получается приблизительным.
+    """
+
+    def __init__(self, sample_rate: float = SESSION_LAST_USED_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self._pending: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, user_uuid: str, session_id: str):
+        if random.random() >= self.sample_rate:
+            return
+        with self._lock:
+            self._pending[(user_uuid, session_id)] = int(time.time())
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if pending:
+            get_refresh_cache().touch_sessions(pending)
+
+
+session_activity = SessionActivityBuffer()
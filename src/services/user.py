@@ -1,6 +1,8 @@
 from functools import lru_cache
 import hashlib
-from typing import Tuple, Optional, Union
+import json
+import time
+from typing import List, Tuple, Optional, Union
 from uuid import uuid4
 import datetime
 
@@ -9,17 +11,32 @@ from sqlalchemy.exc import ProgrammingError, IntegrityError
 from sqlmodel import Session
 import jwt
 
-from src.api.v1.schemas import UserCreate, UserModel, UserLogin, UserUpdate
-from src.db import AccessAbstractCache, RefreshAbstractCache, get_refresh_cache, get_access_cache, get_session
+from src.api.v1.schemas import SessionModel, UserCreate, UserModel, UserLogin, UserUpdate
+from src.db import (
+    AccessAbstractCache, CacheUnavailableError, RefreshAbstractCache, batched, get_refresh_cache, get_access_cache,
+    get_session, resolve
+)
 from src.models import User
 from src.services import UserServiceMixin
-from src.core.config import JWT_SECRET_KEY, ACCESS_TOKEN_EXPIRE_IN_SECONDS, REFRESH_TOKEN_EXPIRE_IN_DAYS
+from src.services.sessions import session_activity
+from src.core.profiling import profiled
+from src.core.config import (
+    JWT_SECRET_KEY, ACCESS_TOKEN_EXPIRE_IN_SECONDS, AUTH_CACHE_FAILURE_POLICY, REFRESH_TOKEN_EXPIRE_IN_DAYS,
+    SESSION_DEVICE_MAX_LENGTH
+)
+
+REFRESH_TOKEN_EXPIRE_IN_SECONDS = REFRESH_TOKEN_EXPIRE_IN_DAYS * 24 * 60 * 60
 
 __all__ = ("UserService", "get_user_service")
 
 
+def hash_password(password: str) -> str:
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
 class UserService(UserServiceMixin):
     @staticmethod
+    @profiled("jwt:decode")
     def _get_jwt_payload(auth_header: str) -> Optional[dict]:
         """Получение payload из токена"""
         try:
@@ -39,24 +56,37 @@ class UserService(UserServiceMixin):
                 and refresh_token_uuid
                 and exp_time
                 and user_uuid):
-            if self.blocked_access_tokens_cache.get(access_token_uuid) is None:
-                if not self._is_token_expires(exp_time):
-                    # Проверяем, не был ли сделан выход со всех устройств
-                    if refresh_tokens := self.active_refresh_tokens_cache.get_all(user_uuid):
-                        for token_id in refresh_tokens:
-                            if token_id == refresh_token_uuid:
-                                return True
-                    self.blocked_access_tokens_cache.set(access_token_uuid, "")
-
-    def _is_refresh_token_valid(self, payload: dict) -> bool:
-        """Проверка валидности refresh токена по данным из payload"""
-        user_uuid = payload.get("user_uuid")
-        refresh_token_uuid = payload.get("jti")
-        exp_time = payload.get("exp")
-        if not self._is_token_expires(exp_time):
-            for token_id in self.active_refresh_tokens_cache.get_all(user_uuid):
-                if token_id == refresh_token_uuid:
-                    return True
+            try:
+                # Оба значения запрашиваются сразу, чтобы проверка стоила одного обращения к Redis
+                blocked, refresh_tokens = resolve(
+                    lambda: self.blocked_access_tokens_cache.get(access_token_uuid),
+                    lambda: self.active_refresh_tokens_cache.get_all(user_uuid),
+                )
+                if blocked is None:
+                    if not self._is_token_expires(exp_time):
+                        # Проверяем, не был ли сделан выход со всех устройств
+                        if refresh_tokens:
+                            for token_id in refresh_tokens:
+                                if token_id == refresh_token_uuid:
+                                    session_activity.record(user_uuid, payload.get("family") or refresh_token_uuid)
+                                    return True
+                        self.blocked_access_tokens_cache.set(access_token_uuid, "")
+            except CacheUnavailableError:
+                return self._is_access_token_valid_without_cache(access_token_uuid, exp_time)
+
+    def _is_access_token_valid_without_cache(self, access_token_uuid: str, exp_time: int) -> bool:
+        """Проверка access токена, когда Redis недоступен.
+
+        При политике "closed" токен отклоняется. При "open" принимается, если
+        не истек и не попал в локальную копию черного списка: выход со всех
+        устройств в другом процессе в это время может быть не учтен.
+        """
+        if AUTH_CACHE_FAILURE_POLICY != "open":
+            return False
+        return (
+            not self._is_token_expires(exp_time)
+            and not self.blocked_access_tokens_cache.is_blocked_locally(access_token_uuid)
+        )
 
     @staticmethod
     def _is_token_expires(exp_time: int) -> bool:
@@ -76,7 +106,7 @@ class UserService(UserServiceMixin):
 
     def register(self, user: UserCreate) -> Union[UserModel, str]:
         """Регистрация пользователя"""
-        hashed_password = hashlib.sha256(user.password.encode()).hexdigest()
+        hashed_password = hash_password(user.password)
         new_user = User(
             uuid=str(uuid4()),
             username=user.username,
@@ -97,11 +127,15 @@ class UserService(UserServiceMixin):
         """Получение пользователя по имени-паролю"""
         user = self.session.query(User).filter(User.username == user_login.username).one_or_none()
         if user:
-            if user.hashed_password == hashlib.sha256(user_login.password.encode()).hexdigest():
+            if user.hashed_password == hash_password(user_login.password):
                 return UserModel(**user.dict())
 
-    def generate_refresh_token(self, user: UserModel) -> tuple:
-        """Генерация refresh токена и добавление его uuid в редис"""
+    def _create_refresh_token(self, user: UserModel, family: Optional[str] = None) -> tuple:
+        """Генерация refresh токена без сохранения в редис.
+
+        family — семейство токенов одного входа: все токены, полученные
+        обновлением, наследуют его от первого.
+        """
         refresh_token_uuid = str(uuid4())
         exp_refresh_token = int(datetime.datetime.timestamp(
             datetime.datetime.now() + datetime.timedelta(days=REFRESH_TOKEN_EXPIRE_IN_DAYS)
@@ -112,15 +146,47 @@ class UserService(UserServiceMixin):
                 "user_uuid": user.uuid,
                 "exp": exp_refresh_token,
                 "jti": refresh_token_uuid,
+                "family": family or refresh_token_uuid,
                 "type": "refresh"
             },
             JWT_SECRET_KEY,
             algorithm="HS256"
         )
-        self.active_refresh_tokens_cache.add(user.uuid, refresh_token_uuid)
         return refresh_token, refresh_token_uuid
 
-    def generate_access_token(self, user: UserModel, refresh_token_uuid: str) -> str:
+    def generate_refresh_token(
+            self,
+            user: UserModel,
+            device: Optional[str] = None,
+            ip: Optional[str] = None,
+    ) -> tuple:
+        """Генерация refresh токена новой сессии и добавление его uuid в редис"""
+        refresh_token, refresh_token_uuid = self._create_refresh_token(user)
+        # Короткие ключи: описание хранится для каждой сессии каждого пользователя
+        info = {"d": device[:SESSION_DEVICE_MAX_LENGTH] if device else None, "ip": ip, "c": int(time.time())}
+        self.active_refresh_tokens_cache.add_session(
+            user.uuid,
+            refresh_token_uuid,
+            family=refresh_token_uuid,
+            info=json.dumps(info, separators=(",", ":")),
+            expire=REFRESH_TOKEN_EXPIRE_IN_SECONDS,
+        )
+        return refresh_token, refresh_token_uuid
+
+    def _rotate_refresh_token(self, user: UserModel, refresh_token_uuid: str, family: str) -> Optional[tuple]:
+        """Замена refresh токена на новый одной атомарной операцией в редис.
+
+        Из параллельных обновлений одним токеном проходит только одно.
+        Повторное использование токена отзывает все семейство.
+        """
+        refresh_token, new_refresh_token_uuid = self._create_refresh_token(user, family)
+        if self.active_refresh_tokens_cache.rotate(
+            user.uuid, refresh_token_uuid, new_refresh_token_uuid, family, REFRESH_TOKEN_EXPIRE_IN_SECONDS
+        ):
+            access_token = self.generate_access_token(user, new_refresh_token_uuid, family)
+            return refresh_token, access_token
+
+    def generate_access_token(self, user: UserModel, refresh_token_uuid: str, family: Optional[str] = None) -> str:
         """Генерация access токена"""
         access_token_uuid = str(uuid4())
         exp_access_token = int(datetime.datetime.timestamp(
@@ -134,6 +200,7 @@ class UserService(UserServiceMixin):
                 "user_uuid": user.uuid,
                 "jti": access_token_uuid,
                 "refresh_uuid": refresh_token_uuid,
+                "family": family or refresh_token_uuid,
                 "exp": exp_access_token,
                 "type": "access",
                 "created_at": user.created_at.strftime("%a %b %d %H:%M:%S %Y")
@@ -143,6 +210,7 @@ class UserService(UserServiceMixin):
         )
         return access_token
 
+    @batched
     def get_user_by_access_token(self, auth_header: str) -> Optional[UserModel]:
         """Получение пользователя по access токену"""
         data = self._get_jwt_payload(auth_header)
@@ -152,6 +220,7 @@ class UserService(UserServiceMixin):
                 user = self.session.query(User).filter(User.uuid == user_uuid).one_or_none()
                 return UserModel(**user.dict())
 
+    @batched
     def refresh_tokens_by_access_token(self, auth_header: str) -> Optional[Tuple[str, str]]:
         """Обновление access и refresh токенов по access токену"""
         data = self._get_jwt_payload(auth_header)
@@ -160,26 +229,27 @@ class UserService(UserServiceMixin):
                 user_uuid = data.get("user_uuid")
                 access_token_uuid = data.get("jti")
                 refresh_token_uuid = data.get("refresh_uuid")
-                self.active_refresh_tokens_cache.remove(user_uuid, refresh_token_uuid)
                 self._block_access_token(access_token_uuid)
                 user = self._get_user_by_uuid(user_uuid)
-                refresh_token, refresh_token_uuid = self.generate_refresh_token(user)
-                access_token = self.generate_access_token(user, refresh_token_uuid)
-                return refresh_token, access_token
+                # В токенах, выданных до появления семейств, его роль играет uuid refresh токена
+                return self._rotate_refresh_token(user, refresh_token_uuid, data.get("family") or refresh_token_uuid)
 
+    @batched
     def refresh_tokens_by_refresh_token(self, auth_header: str) -> Optional[Tuple[str, str]]:
         """Обновление access и refresh токенов по refresh токену"""
         data = self._get_jwt_payload(auth_header)
         if data:
-            if self._is_refresh_token_valid(data):
-                user_uuid = data.get("user_uuid")
-                refresh_token_uuid = data.get("jti")
-                self.active_refresh_tokens_cache.remove(user_uuid, refresh_token_uuid)
-                user = self._get_user_by_uuid(user_uuid)
-                refresh_token, refresh_token_uuid = self.generate_refresh_token(user)
-                access_token = self.generate_access_token(user, refresh_token_uuid)
-                return refresh_token, access_token
+            # Access токен несет то же семейство, но его jti нет среди refresh токенов:
+            # без проверки типа он сошел бы за повторное использование и отозвал чужую сессию
+            if data.get("type") != "refresh":
+                return
+            if data.get("jti") and data.get("exp") and not self._is_token_expires(data["exp"]):
+                user = self._get_user_by_uuid(data.get("user_uuid"))
+                if user:
+                    family = data.get("family") or data["jti"]
+                    return self._rotate_refresh_token(user, data["jti"], family)
 
+    @batched
     def update_user_info(self, user_update: UserUpdate, auth_header: str) -> Optional[tuple]:
         """Изменение данных пользователя"""
         data = self._get_jwt_payload(auth_header)
@@ -191,13 +261,14 @@ class UserService(UserServiceMixin):
                 if user_update.username:
                     user.username = user_update.username
                 if user_update.password:
-                    user.hashed_password = hashlib.sha256(user_update.password.encode()).hexdigest()
+                    user.hashed_password = hash_password(user_update.password)
                 self.session.commit()
                 self.session.refresh(user)
                 self._block_access_token(data.get("jti"))
-                access_token = self.generate_access_token(user, data.get("refresh_uuid"))
+                access_token = self.generate_access_token(user, data.get("refresh_uuid"), data.get("family"))
                 return UserModel(**user.dict()), access_token
 
+    @batched
     def logout(self, auth_header: str) -> Optional[dict]:
         """Выход с текущего устройства"""
         data = self._get_jwt_payload(auth_header)
@@ -207,9 +278,12 @@ class UserService(UserServiceMixin):
                 refresh_jwt_uuid = data.get("refresh_uuid")
                 user_uuid = data.get("user_uuid")
                 self._block_access_token(access_jwt_uuid)
-                self.active_refresh_tokens_cache.remove(user_uuid, refresh_jwt_uuid)
+                self.active_refresh_tokens_cache.revoke_session(
+                    user_uuid, data.get("family") or refresh_jwt_uuid, refresh_jwt_uuid
+                )
                 return {"msg": "You have been logged out."}
 
+    @batched
     def logout_all(self, auth_header: str) -> Optional[dict]:
         """Выход со всех устройств"""
         data = self._get_jwt_payload(auth_header)
@@ -221,6 +295,39 @@ class UserService(UserServiceMixin):
                 self.active_refresh_tokens_cache.clear(user_uuid)
                 return {"msg": "You have been logged out from all devices."}
 
+    @batched
+    def get_sessions(self, auth_header: str) -> Optional[List[SessionModel]]:
+        """Список сессий пользователя, недавно использованные первыми"""
+        data = self._get_jwt_payload(auth_header)
+        if data:
+            if self._is_access_token_valid(data):
+                current_session = data.get("family") or data.get("refresh_uuid")
+                fields = self.active_refresh_tokens_cache.get_sessions(data.get("user_uuid"))
+                sessions = []
+                for session_id, raw_info in fields.items():
+                    # Служебные поля: время последнего использования и срок сессии
+                    if session_id.endswith((":u", ":e")):
+                        continue
+                    info = json.loads(raw_info)
+                    last_used = fields.get(f"{session_id}:u")
+                    sessions.append(SessionModel(
+                        id=session_id,
+                        device=info.get("d"),
+                        ip=info.get("ip"),
+                        created_at=datetime.datetime.utcfromtimestamp(info["c"]),
+                        last_used_at=datetime.datetime.utcfromtimestamp(int(last_used)) if last_used else None,
+                        current=session_id == current_session,
+                    ))
+                return sorted(sessions, key=lambda item: item.last_used_at or item.created_at, reverse=True)
+
+    @batched
+    def revoke_session(self, auth_header: str, session_id: str) -> Optional[bool]:
+        """Выход из одной сессии пользователя. False, если такой сессии нет"""
+        data = self._get_jwt_payload(auth_header)
+        if data:
+            if self._is_access_token_valid(data):
+                return self.active_refresh_tokens_cache.revoke_session(data.get("user_uuid"), session_id)
+
 
 # get_post_service — это провайдер UserService. Синглтон
 @lru_cache()
@@ -0,0 +1,151 @@
+"""Массовый импорт пользователей из CSV или NDJSON.
+
+Файл читается потоком и обрабатывается пачками по chunk_size строк, поэтому
+память не растет с размером файла. Пароли пачки хешируются в пуле процессов,
+пачка вставляется одним INSERT ... ON CONFLICT DO NOTHING RETURNING: строки,
+которых нет в RETURNING, — дубликаты по имени пользователя. По каждой строке
+отдается отчет, последней строкой — итоги.
+"""
+import csv
+import json
+import math
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+from uuid import uuid4
+
+from pydantic import ValidationError
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session
+
+from src.api.v1.schemas import UserCreate
+from src.core import config
+from src.models import User
+from src.services.user import hash_password
+
+__all__ = ("IMPORT_FORMATS", "UserImportService", "read_rows")
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+# Каждая строка вставки — 8 параметров, а Postgres принимает не больше 65535 на запрос
+MAX_CHUNK_SIZE = 65535 // 8
+
+# Номер строки файла и разобранная запись либо текст ошибки разбора
+Row = Tuple[int, Union[dict, str]]
+
+
+def read_rows(lines: Iterable[str], file_format: str) -> Iterator[Row]:
+    """Записи файла по одной. CSV — с заголовком username,email,password"""
+    if file_format == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # Лишние значения строки DictReader складывает под ключ None
+            yield reader.line_num, {key: value for key, value in row.items() if key is not None}
+        return
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, "Invalid JSON"
+            continue
+        yield line_number, row if isinstance(row, dict) else "Expected JSON object"
+
+
+def _hash_passwords(passwords: List[str]) -> List[str]:
+    return [hash_password(password) for password in passwords]
+
+
+def _validation_error(error: ValidationError) -> str:
+    return "; ".join(f'{".".join(map(str, item["loc"]))}: {item["msg"]}' for item in error.errors())
+
+
+class UserImportService:
+    def __init__(
+        self,
+        session: Session,
+        chunk_size: int = config.USER_IMPORT_CHUNK_SIZE,
+        hash_workers: int = config.USER_IMPORT_HASH_WORKERS,
+    ):
+        self.session = session
+        self.chunk_size = max(1, min(chunk_size, MAX_CHUNK_SIZE))
+        self.hash_workers = max(1, hash_workers)
+
+    def import_rows(self, rows: Iterable[Row]) -> Iterator[dict]:
+        """Отчеты по строкам в порядке файла, последним — итоги импорта.
+
+        Каждая пачка коммитится отдельно: при обрыве уже вставленные
+        пользователи остаются, и повторный запуск с тем же файлом отметит
+        их как дубликаты.
+        """
+        totals = {"created": 0, "duplicate": 0, "invalid": 0}
+        rows = iter(rows)
+        # Процессы запускаются один раз на импорт, а не на каждую пачку. Не fork: в многопоточном
+        # процессе сервера дочерний процесс унаследовал бы блокировки, захваченные другими потоками
+        pool = nullcontext()
+        if self.hash_workers > 1:
+            pool = ProcessPoolExecutor(self.hash_workers, mp_context=multiprocessing.get_context("spawn"))
+        with pool as executor:
+            while chunk := list(islice(rows, self.chunk_size)):
+                for report in self._import_chunk(chunk, executor):
+                    totals[report["status"]] += 1
+                    yield report
+        yield {"summary": totals}
+
+    def _hash(self, passwords: List[str], executor: Optional[Executor]) -> List[str]:
+        if executor is None or len(passwords) < 2:
+            return _hash_passwords(passwords)
+        # Пачка делится на столько частей, сколько процессов: одна передача данных на процесс
+        step = math.ceil(len(passwords) / self.hash_workers)
+        parts = [passwords[start:start + step] for start in range(0, len(passwords), step)]
+        return [hashed for part in executor.map(_hash_passwords, parts) for hashed in part]
+
+    def _import_chunk(self, chunk: List[Row], executor: Optional[Executor]) -> Iterator[dict]:
+        reports: List[dict] = []
+        users: List[Tuple[dict, UserCreate]] = []
+        for line_number, row in chunk:
+            report = {"line": line_number}
+            reports.append(report)
+            if isinstance(row, str):
+                report.update(status="invalid", error=row)
+                continue
+            report["username"] = row.get("username")
+            try:
+                users.append((report, UserCreate(**row)))
+            except ValidationError as error:
+                report.update(status="invalid", error=_validation_error(error))
+
+        if users:
+            created_at = datetime.utcnow()
+            hashed_passwords = self._hash([user.password for _, user in users], executor)
+            values: List[dict] = []
+            for (report, user), hashed_password in zip(users, hashed_passwords):
+                user_uuid = str(uuid4())
+                report["uuid"] = user_uuid
+                values.append({
+                    "uuid": user_uuid,
+                    "username": user.username,
+                    "email": user.email,
+                    "hashed_password": hashed_password,
+                    "created_at": created_at,
+                    "is_superuser": False,
+                    "is_totp_enabled": False,
+                    "is_active": True,
+                })
+            table = User.__table__
+            statement = insert(table).values(values).on_conflict_do_nothing().returning(table.c.uuid)
+            # uuid у каждой строки свой, поэтому повтор имени внутри пачки тоже виден как дубликат
+            inserted = set(self.session.execute(statement).scalars())
+            self.session.commit()
+            for report, _ in users:
+                if report["uuid"] in inserted:
+                    report["status"] = "created"
+                else:
+                    report["status"] = "duplicate"
+                    report["error"] = "User with such name already exists"
+                    del report["uuid"]
+        yield from reports
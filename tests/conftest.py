@@ -0,0 +1,127 @@
+import os
+from pathlib import Path
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+import src.models  # noqa: F401 — таблицы регистрируются в метаданных при импорте моделей
+
+
+@pytest.fixture
+def make_redis():
+    """Фабрика клиентов InstrumentedRedis поверх одного fakeredis-сервера. Скрипты Lua требуют lupa"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from src.db.redis_cache import InstrumentedRedis
+
+    class FakeInstrumentedRedis(InstrumentedRedis, fakeredis.FakeRedis):
+        pass
+
+    server = fakeredis.FakeServer()
+
+    def make(db: int = 0, decode_responses: bool = True):
+        # Один адрес у всех клиентов, как у клиентов одного сервера: общий предохранитель и пайплайн
+        return FakeInstrumentedRedis(server=server, host="localhost", db=db, decode_responses=decode_responses)
+
+    return make
+
+
+@pytest.fixture
+def engine():
+    # Одно соединение на все потоки: база SQLite в памяти живет, пока оно открыто
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def session_factory(engine):
+    return lambda: Session(engine)
+
+
+@pytest.fixture
+def pg_engine():
+    """Postgres со схемой из миграций: полнотекстового поиска в SQLite нет. Адрес — TEST_DATABASE_URL"""
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    from alembic import command
+    from alembic.config import Config
+
+    root = Path(__file__).resolve().parent.parent
+    alembic_config = Config(str(root / "alembic.ini"))
+    alembic_config.set_main_option("script_location", str(root / "src" / "migrations"))
+    alembic_config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(alembic_config, "head")
+    engine = create_engine(url)
+    yield engine
+    engine.dispose()
+    command.downgrade(alembic_config, "base")
+
+
+@pytest.fixture
+def posts_cache():
+    from src.db import memory_cache
+
+    return memory_cache.create_posts_cache()
+
+
+@pytest.fixture
+def user_caches():
+    from src.db import memory_cache
+
+    return memory_cache.create_access_cache(), memory_cache.create_refresh_cache()
+
+
+@pytest.fixture
+def client(engine, posts_cache, user_caches):
+    """Клиент API постов и пользователей поверх SQLite и кэшей из фикстур"""
+    pytest.importorskip("requests")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from src.api.v1.resources import posts, users
+    from src.core.compression import CompressionMiddleware
+    from src.db import get_access_cache, get_posts_cache, get_refresh_cache, get_session
+
+    def override_session():
+        with Session(engine) as session:
+            yield session
+
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+    app.include_router(router=posts.router, prefix="/api/v1/posts")
+    app.include_router(router=users.router, prefix="/api/v1")
+    access_cache, refresh_cache = user_caches
+    app.dependency_overrides = {
+        get_session: override_session,
+        get_posts_cache: lambda: posts_cache,
+        get_access_cache: lambda: access_cache,
+        get_refresh_cache: lambda: refresh_cache,
+    }
+    return TestClient(app)
+
+
+@pytest.fixture
+def make_auth_header(session_factory, user_caches):
+    """Создать пользователя и вернуть его uuid и заголовок Authorization с access токеном"""
+    from src.models import User
+    from src.services.user import UserService
+
+    def make(username: str, is_superuser: bool = False):
+        access_cache, refresh_cache = user_caches
+        with session_factory() as session:
+            session.add(User(
+                uuid=username, username=username, email=f"{username}@example.com", hashed_password="x",
+                is_superuser=is_superuser,
+            ))
+            session.commit()
+            user_service = UserService(
+                access_tokens_cache=access_cache, refresh_tokens_cache=refresh_cache, session=session
+            )
+            user = user_service._get_user_by_uuid(username)
+            _, refresh_uuid = user_service.generate_refresh_token(user)
+            return username, {"Authorization": f"Bearer {user_service.generate_access_token(user, refresh_uuid)}"}
+
+    return make
@@ -0,0 +1,50 @@
+import time
+
+from src.core import config
+from src.db.redis_cache import BLOCKLIST_LOG_KEY, AccessCacheRedis, LocalBlocklist
+
+
+def test_sync_fetches_only_new_entries_with_their_expiry(make_redis, monkeypatch):
+    writer, reader = AccessCacheRedis(make_redis(1)), AccessCacheRedis(make_redis(1))
+    writer.set("old", "")
+    reader.sync_local_blocklist()
+    assert reader.is_blocked_locally("old")
+
+    fetched = []
+    zrangebyscore = reader.cache.zrangebyscore
+
+    def recording_zrangebyscore(*args, **kwargs):
+        fetched.extend(zrangebyscore(*args, **kwargs))
+        return fetched
+
+    monkeypatch.setattr(reader.cache, "zrangebyscore", recording_zrangebyscore)
+    monkeypatch.setattr(config, "AUTH_LOCAL_BLOCKLIST_SYNC_OVERLAP_IN_SECONDS", 0)
+    time.sleep(0.01)
+    writer.set("new", "")
+    reader.sync_local_blocklist()
+
+    assert [key for key, _ in fetched] == ["new"]
+    assert reader.is_blocked_locally("new")
+    # Срок записи — срок ключа в Redis, а не время синхронизации
+    assert reader.local_blocklist._expires_at["new"] == writer.local_blocklist._expires_at["new"]
+
+
+def test_expired_entries_are_pruned_from_log(make_redis):
+    cache = AccessCacheRedis(make_redis(1))
+    cache.cache.zadd(BLOCKLIST_LOG_KEY, {"expired": time.time() - 1})
+    cache.set("token", "")
+    assert cache.cache.zrange(BLOCKLIST_LOG_KEY, 0, -1) == ["token"]
+
+
+def test_local_blocklist_keeps_entries_until_they_expire():
+    blocklist = LocalBlocklist(ttl=60)
+    blocklist.add("expired", time.time() + 0.05)
+    blocklist.update((f"token{number}", time.time() + 60) for number in range(1000))
+    # Известный срок не продлевается повторным добавлением
+    blocklist.add("expired")
+    time.sleep(0.1)
+    blocklist.add("token0")
+
+    assert all(f"token{number}" in blocklist for number in range(1000))
+    assert "expired" not in blocklist
+    assert len(blocklist) == 1000
@@ -0,0 +1,68 @@
+import pytest
+import redis
+
+from src.db.cache import CacheUnavailableError
+from src.db.circuit_breaker import CircuitBreaker
+from src.db.redis_cache import _guarded_call
+
+
+def _call(breaker: CircuitBreaker, func):
+    return _guarded_call(breaker, "redis_test", "redis:TEST", func)
+
+
+def _raise(error: BaseException):
+    def func():
+        raise error
+    return func
+
+
+def _open_breaker() -> CircuitBreaker:
+    # Нулевой recovery_timeout: следующее обращение после размыкания сразу пробное
+    breaker = CircuitBreaker("redis://test", failure_threshold=1, recovery_timeout=0)
+    with pytest.raises(CacheUnavailableError):
+        _call(breaker, _raise(redis.exceptions.ConnectionError("down")))
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+
+def test_connection_errors_open_breaker_and_reject_calls():
+    breaker = CircuitBreaker("redis://test", failure_threshold=2, recovery_timeout=60)
+    for _ in range(2):
+        with pytest.raises(CacheUnavailableError):
+            _call(breaker, _raise(redis.exceptions.TimeoutError("timeout")))
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CacheUnavailableError):
+        _call(breaker, lambda: "not called")
+    assert breaker.rejected_total == 1
+
+
+@pytest.mark.parametrize("error", [
+    redis.exceptions.ResponseError("WRONGTYPE Operation against a key holding the wrong kind of value"),
+    redis.exceptions.ReadOnlyError("READONLY You can't write against a read only replica."),
+    redis.exceptions.ResponseError("OOM command not allowed when used memory > 'maxmemory'."),
+])
+def test_server_error_on_probe_closes_breaker(error):
+    breaker = _open_breaker()
+    with pytest.raises(type(error)):
+        _call(breaker, _raise(error))
+    # Сервер ответил, значит доступен
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert _call(breaker, lambda: "ok") == "ok"
+
+
+def test_unexpected_error_on_probe_releases_it():
+    breaker = _open_breaker()
+    with pytest.raises(ValueError):
+        _call(breaker, _raise(ValueError("bug")))
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Следующее обращение снова пробное, а не отказ
+    assert _call(breaker, lambda: "ok") == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = _open_breaker()
+    with pytest.raises(CacheUnavailableError):
+        _call(breaker, _raise(redis.exceptions.ConnectionError("still down")))
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened_total == 2
@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+
+from src.core import metrics
+from src.core.startup import startup_profile
+from src.db.circuit_breaker import CircuitBreaker
+from src.services.health import HealthService
+
+
+@pytest.fixture(autouse=True)
+def started(monkeypatch):
+    monkeypatch.setattr(startup_profile, "ready_at", time.perf_counter())
+    # Замеры других тестов не должны влиять на порог p99
+    monkeypatch.setattr(metrics, "_trackers", {})
+
+
+def _service(checks: dict, **kwargs) -> HealthService:
+    service = HealthService(**{"timeout": 1, "cache_ttl": 0, "max_p99_latency_ms": 500, **kwargs})
+    service._dependencies = lambda: checks
+    return service
+
+
+def _counted(calls: list, name: str):
+    def check():
+        calls.append(name)
+        return True
+    return check
+
+
+def test_ready_when_every_dependency_answers():
+    result = _service({"postgres": lambda: None, "posts_cache": lambda: True}).check_readiness()
+
+    assert result["ready"]
+    assert {name: dependency["status"] for name, dependency in result["dependencies"].items()} == {
+        "postgres": "ok", "posts_cache": "ok",
+    }
+    assert result["slow"] == []
+
+
+def test_not_ready_until_startup_finished(monkeypatch):
+    monkeypatch.setattr(startup_profile, "ready_at", None)
+    assert not _service({"postgres": lambda: None}).check_readiness()["ready"]
+
+
+def test_hung_check_times_out_and_is_not_restarted():
+    release = threading.Event()
+    calls = []
+
+    def hang():
+        calls.append("postgres")
+        release.wait(5)
+
+    service = _service({"postgres": hang, "posts_cache": lambda: True}, timeout=0.05)
+    try:
+        started_at = time.monotonic()
+        result = service.check_readiness()
+        assert time.monotonic() - started_at < 1
+        assert not result["ready"]
+        assert result["dependencies"]["postgres"] == {"status": "timeout"}
+        assert result["dependencies"]["posts_cache"]["status"] == "ok"
+
+        assert service.check_readiness()["dependencies"]["postgres"] == {"status": "timeout"}
+        assert calls == ["postgres"]
+    finally:
+        release.set()
+
+
+def test_failed_check_reports_error():
+    def fail():
+        raise ConnectionError("refused")
+
+    result = _service({"postgres": fail}).check_readiness()
+
+    assert not result["ready"]
+    assert result["dependencies"]["postgres"] == {"status": "error", "error": "ConnectionError"}
+
+
+def test_open_redis_breaker_makes_instance_not_ready(make_redis, monkeypatch):
+    client = make_redis()
+    monkeypatch.setattr(client.breaker, "state", CircuitBreaker.OPEN)
+    monkeypatch.setattr(client.breaker, "_opened_at", time.monotonic())
+
+    result = _service({"postgres": lambda: None, "posts_cache": client.ping}).check_readiness()
+
+    assert not result["ready"]
+    assert result["dependencies"]["posts_cache"] == {"status": "error", "error": "CacheUnavailableError"}
+    assert result["circuit_breakers"][client.breaker.name]["state"] == "open"
+
+
+def test_not_ready_when_p99_latency_exceeds_threshold():
+    tracker = metrics.get_latency_tracker("postgres")
+    for _ in range(99):
+        tracker.record(1)
+    tracker.record(800)
+
+    assert not _service({"postgres": lambda: None}, max_p99_latency_ms=500).check_readiness()["ready"]
+    result = _service({"postgres": lambda: None}, max_p99_latency_ms=1000).check_readiness()
+    assert result["ready"]
+    assert result["latency"]["postgres"]["p99_ms"] == 800
+    # 0 отключает проверку задержки
+    assert _service({"postgres": lambda: None}, max_p99_latency_ms=0).check_readiness()["ready"]
+
+
+def test_result_is_reused_within_ttl(monkeypatch):
+    calls = []
+    service = _service({"postgres": _counted(calls, "postgres")}, cache_ttl=60)
+
+    first = service.check_readiness()
+    assert service.check_readiness() is first
+    assert calls == ["postgres"]
+
+    monkeypatch.setattr(service, "_checked_at", time.monotonic() - 61)
+    assert service.check_readiness() is not first
+    assert calls == ["postgres", "postgres"]
+
+
+@pytest.mark.parametrize("ready, status_code", [(True, 200), (False, 503)])
+def test_readiness_endpoint_status(ready, status_code):
+    pytest.importorskip("requests")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from src.api.v1.resources import health
+    from src.services.health import get_health_service
+
+    def check():
+        if not ready:
+            raise ConnectionError("refused")
+
+    app = FastAPI()
+    app.include_router(router=health.router)
+    app.dependency_overrides = {get_health_service: lambda: _service({"postgres": check})}
+
+    response = TestClient(app).get("/ready")
+
+    assert response.status_code == status_code
+    assert response.json()["ready"] is ready
@@ -0,0 +1,75 @@
+import time
+from functools import partial
+
+from src.db import memory_cache
+from src.db.memory_cache import MemoryStore
+
+
+def test_store_evicts_least_recently_used():
+    store = MemoryStore(max_entries=2)
+    store.set("a", "1")
+    store.set("b", "2")
+    store.get("a")
+    store.set("c", "3")
+    assert store.keys() == ["a", "c"]
+
+
+def test_store_expires_keys():
+    store = MemoryStore()
+    store.set("short", "1", expire=0.01)
+    store.set("long", "1", expire=60)
+    time.sleep(0.02)
+    assert store.get("short") is None
+    assert store.get("long") == "1"
+
+
+def test_refresh_state_survives_past_entry_limit(monkeypatch):
+    # Хранилища по умолчанию держат не больше трех ключей
+    monkeypatch.setattr(memory_cache, "MemoryStore", partial(MemoryStore, max_entries=3))
+    refresh_cache = memory_cache.create_refresh_cache()
+    refresh_cache.add_session("alice", "token-1", family="family-1", info="{}", expire=60)
+
+    for number in range(10):
+        refresh_cache.add_session(f"user-{number}", f"token-{number}", family=f"f-{number}", info="{}", expire=60)
+
+    assert refresh_cache.get_all("alice") == {"token-1"}
+    assert "family-1" in refresh_cache.get_sessions("alice")
+    assert refresh_cache.rotate("alice", "token-1", "token-2", family="family-1", expire=60)
+    # Повтор старого токена после окна дублей по-прежнему отзывает сессию
+    refresh_cache.cache.delete("family:family-1:rotated")
+    assert not refresh_cache.rotate("alice", "token-1", "token-3", family="family-1", expire=60)
+    assert refresh_cache.get_all("alice") == set()
+
+
+def test_store_moves_key_to_extended_or_shortened_expiry():
+    store = MemoryStore()
+    store.set("extended", "1", expire=0.01)
+    store.expire("extended", 60)
+    store.set("shortened", "1", expire=60)
+    store.expire("shortened", 0.01)
+    time.sleep(0.02)
+    assert store.get("extended") == "1"
+    assert store.get("shortened") is None
+
+
+def test_expiry_heap_stays_bounded_across_rotations():
+    refresh_cache = memory_cache.create_refresh_cache()
+    refresh_cache.add_session("alice", "token-0", family="family-1", info="{}", expire=60)
+
+    for number in range(10_000):
+        assert refresh_cache.rotate("alice", f"token-{number}", f"token-{number + 1}", family="family-1", expire=60)
+
+    store = refresh_cache.cache
+    assert len(store.keys()) == 4
+    assert len(store._expiry_heap) <= 2 * len(store._expires_at) + memory_cache.EXPIRY_HEAP_SLACK
+
+
+def test_expiry_heap_drops_deleted_and_evicted_keys():
+    store = MemoryStore(max_entries=10)
+    for number in range(1000):
+        store.set(f"evicted-{number}", "1", expire=60)
+        store.set(f"deleted-{number}", "1", expire=60)
+        store.delete(f"deleted-{number}")
+
+    assert len(store._expires_at) <= 10
+    assert len(store._expiry_heap) <= 2 * len(store._expires_at) + memory_cache.EXPIRY_HEAP_SLACK
@@ -0,0 +1,90 @@
+import pytest
+
+from src.services.post import LIST_VERSION_KEY
+
+
+@pytest.fixture
+def author(make_auth_header):
+    return make_auth_header("author")
+
+
+@pytest.fixture
+def post(client, author):
+    _, headers = author
+    return client.post("/api/v1/posts/", json={"title": "Заголовок", "description": "Текст"}, headers=headers).json()
+
+
+def _patch(client, post_id: int, headers: dict, if_match=None):
+    if if_match is not None:
+        headers = {**headers, "If-Match": if_match}
+    return client.patch(f"/api/v1/posts/{post_id}", json={"title": "Новый заголовок"}, headers=headers)
+
+
+def _delete(client, post_id: int, headers: dict, if_match=None):
+    if if_match is not None:
+        headers = {**headers, "If-Match": if_match}
+    return client.delete(f"/api/v1/posts/{post_id}", headers=headers)
+
+
+@pytest.mark.parametrize("change", [_patch, _delete])
+def test_change_without_if_match_is_rejected(client, author, post, change):
+    assert change(client, post["id"], author[1]).status_code == 428
+    assert client.get(f"/api/v1/posts/{post['id']}").json()["title"] == "Заголовок"
+
+
+@pytest.mark.parametrize("change", [_patch, _delete])
+def test_change_of_stale_version_is_rejected(client, author, post, change):
+    assert _patch(client, post["id"], author[1], if_match=f'"{post["id"]}-1"').status_code == 200
+
+    assert change(client, post["id"], author[1], if_match=f'"{post["id"]}-1"').status_code == 412
+    assert client.get(f"/api/v1/posts/{post['id']}").json()["version"] == 2
+
+
+@pytest.mark.parametrize("if_match", ['W/"{id}-1"', "*", '"other", "{id}-1"'])
+def test_patch_accepts_weak_and_any_tags(client, author, post, if_match):
+    response = _patch(client, post["id"], author[1], if_match=if_match.format(id=post["id"]))
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'"{post["id"]}-2"'
+
+
+@pytest.mark.parametrize("if_match", ['W/"{id}-1"', "*"])
+def test_delete_accepts_weak_and_any_tags(client, author, post, if_match):
+    assert _delete(client, post["id"], author[1], if_match=if_match.format(id=post["id"])).status_code == 204
+    assert client.get(f"/api/v1/posts/{post['id']}").status_code == 404
+
+
+@pytest.mark.parametrize("change", [_patch, _delete])
+def test_foreign_post_cannot_be_changed(client, make_auth_header, post, change):
+    _, headers = make_auth_header("mallory")
+    assert change(client, post["id"], headers, if_match="*").status_code == 403
+    assert client.get(f"/api/v1/posts/{post['id']}").json()["title"] == "Заголовок"
+
+
+def test_superuser_can_change_foreign_post(client, make_auth_header, post):
+    _, headers = make_auth_header("admin", is_superuser=True)
+    assert _patch(client, post["id"], headers, if_match="*").status_code == 200
+
+
+@pytest.mark.parametrize("change", [_patch, _delete])
+def test_change_invalidates_post_caches(client, posts_cache, author, post, change):
+    author_id, headers = author
+    post_id = post["id"]
+    # Кэшируем пост, его ETag, сжатые тела и первую страницу ленты автора
+    client.get(f"/api/v1/posts/{post_id}")
+    for encoding in ("gzip", "br"):
+        posts_cache.set_bytes(key=f"{post_id}:{encoding}", value=b'"1-1"\ncompressed')
+    client.get(f"/api/v1/users/{author_id}/posts")
+    list_etag = client.get("/api/v1/posts/").headers["ETag"]
+    version = posts_cache.get(LIST_VERSION_KEY)
+    assert posts_cache.get(f"{post_id}") and posts_cache.get_etag(f"{post_id}")
+    assert posts_cache.get(f"author:{author_id}")
+
+    assert change(client, post_id, headers, if_match="*").status_code in (200, 204)
+
+    assert posts_cache.get(f"{post_id}") is None
+    assert posts_cache.get_etag(f"{post_id}") is None
+    assert posts_cache.get_bytes(f"{post_id}:gzip") is None
+    assert posts_cache.get_bytes(f"{post_id}:br") is None
+    assert posts_cache.get(f"author:{author_id}") is None
+    assert int(posts_cache.get(LIST_VERSION_KEY)) > int(version)
+    assert client.get("/api/v1/posts/").headers["ETag"] != list_etag
@@ -0,0 +1,39 @@
+import pytest
+
+IDENTITY = {"Accept-Encoding": "identity"}
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+@pytest.fixture
+def post(client, make_auth_header):
+    _, headers = make_auth_header("author")
+    # Длиннее порога сжатия
+    payload = {"title": "Заголовок", "description": "Текст поста " * 100}
+    return client.post("/api/v1/posts/", json=payload, headers=headers).json()
+
+
+@pytest.fixture(params=["list", "detail"])
+def url(request, post):
+    return "/api/v1/posts/" if request.param == "list" else f"/api/v1/posts/{post['id']}"
+
+
+@pytest.mark.parametrize("headers", [IDENTITY, GZIP])
+def test_every_representation_varies_by_encoding(client, url, headers):
+    response = client.get(url, headers=headers)
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+    not_modified = client.get(url, headers={**headers, "If-None-Match": response.headers["ETag"]})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["Vary"] == "Accept-Encoding"
+
+
+def test_not_modified_returns_tag_in_the_form_client_holds(client, url):
+    strong_etag = client.get(url, headers=IDENTITY).headers["ETag"]
+    weak_etag = client.get(url, headers=GZIP).headers["ETag"]
+    assert weak_etag == f"W/{strong_etag}"
+
+    assert client.get(url, headers={**GZIP, "If-None-Match": weak_etag}).headers["ETag"] == weak_etag
+    assert client.get(url, headers={**IDENTITY, "If-None-Match": strong_etag}).headers["ETag"] == strong_etag
+    response = client.get(url, headers={**IDENTITY, "If-None-Match": f'"other", {weak_etag}'})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == weak_etag
@@ -0,0 +1,173 @@
+import time
+from datetime import datetime
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from src.api.v1.schemas import PostPageResponse
+from src.db import memory_cache
+from src.db.redis_cache import PostCacheRedis
+from src.models import Post, User
+from src.services import post_list_snapshot
+from src.services.post import PostService
+from src.services.post_list_snapshot import PostListMaterializer, serialize_post_list
+
+
+@pytest.fixture
+def posts_cache(monkeypatch, engine):
+    posts_cache = memory_cache.create_posts_cache()
+    monkeypatch.setattr(post_list_snapshot, "get_engine", lambda: engine)
+    monkeypatch.setattr(post_list_snapshot, "get_posts_cache", lambda: posts_cache)
+    return posts_cache
+
+
+@pytest.fixture
+def posts(session_factory):
+    with session_factory() as session:
+        session.add(User(uuid="author", username="author", email="author@example.com", hashed_password="x"))
+        for number in range(3):
+            session.add(Post(title=f"Заголовок {number}", description="Текст поста " * 50, author_id="author"))
+        session.commit()
+
+
+def test_snapshot_body_matches_json_response(posts_cache, posts, session_factory):
+    materializer = PostListMaterializer(size=2)
+    assert materializer.refresh()
+
+    with session_factory() as session:
+        post_list = PostService(posts_cache=posts_cache, session=session).get_post_list(limit=2)
+    # Так сериализовал бы FastAPI ответ с response_model=PostPageResponse
+    expected = JSONResponse(content=jsonable_encoder(PostPageResponse(**post_list))).body
+    assert materializer.snapshot.body == expected == serialize_post_list(post_list)
+    assert "Заголовок 2".encode() in materializer.snapshot.body
+    assert set(materializer.snapshot.encoded) == set(post_list_snapshot.SNAPSHOT_ENCODINGS)
+
+
+def test_thread_starts_on_first_request_only_when_enabled(posts_cache, posts):
+    materializer = PostListMaterializer(size=2, interval=0.05)
+    assert materializer.get_snapshot() is None
+    assert materializer._thread is None
+
+    materializer.enable()
+    try:
+        # Первый запрос снимка еще не получает, но запускает поток
+        materializer.get_snapshot()
+        deadline = time.monotonic() + 2
+        while materializer.get_snapshot() is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert materializer.get_snapshot() is not None
+    finally:
+        materializer.stop()
+    assert materializer.get_snapshot() is None
+
+
+def test_shared_snapshot_is_adopted_without_database(monkeypatch, posts_cache, posts):
+    builder = PostListMaterializer(size=2)
+    builder.refresh()
+
+    other = PostListMaterializer(size=2)
+    monkeypatch.setattr(PostService, "get_post_list", lambda *args, **kwargs: pytest.fail("rebuilt from the database"))
+    assert other.refresh()
+    assert other.snapshot.body == builder.snapshot.body
+    assert other.snapshot.etag == builder.snapshot.etag
+
+
+def _wait_for(condition, timeout: float = 2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def redis_posts_cache(monkeypatch, engine, make_redis):
+    posts_cache = PostCacheRedis(make_redis(0), make_redis(0, decode_responses=False))
+    monkeypatch.setattr(post_list_snapshot, "get_engine", lambda: engine)
+    monkeypatch.setattr(post_list_snapshot, "get_posts_cache", lambda: posts_cache)
+    yield posts_cache
+    posts_cache.close()
+
+
+@pytest.fixture
+def materializer(monkeypatch):
+    materializer = PostListMaterializer(interval=60)
+    monkeypatch.setattr(post_list_snapshot, "post_list_materializer", materializer)
+    monkeypatch.setattr("src.api.v1.resources.posts.post_list_materializer", materializer)
+    materializer.enable()
+    yield materializer
+    materializer.stop()
+
+
+def test_update_is_listed_immediately_with_redis(redis_posts_cache, materializer, client, make_auth_header):
+    client.app.dependency_overrides[post_list_snapshot.get_posts_cache] = lambda: redis_posts_cache
+    author, headers = make_auth_header("writer")
+    post = client.post("/api/v1/posts/", json={"title": "Старый заголовок", "description": "d"}, headers=headers).json()
+    client.get("/api/v1/posts/")
+    assert _wait_for(lambda: materializer.get_snapshot() is not None)
+    etag = client.get("/api/v1/posts/").headers["ETag"]
+
+    response = client.patch(
+        f"/api/v1/posts/{post['id']}", json={"title": "Новый заголовок"}, headers={**headers, "If-Match": "*"}
+    )
+    assert response.status_code == 200
+
+    # Интервал проверки — минута: новый список отдается без ожидания
+    response = client.get("/api/v1/posts/")
+    assert response.headers["ETag"] != etag
+    assert [item["title"] for item in response.json()["posts"]] == ["Новый заголовок"]
+
+
+def test_other_process_learns_of_change_through_channel(redis_posts_cache, make_redis, posts, session_factory):
+    materializer = PostListMaterializer(size=2, interval=60)
+    materializer.refresh()
+    assert materializer.snapshot is not None
+
+    # Пост меняет другой процесс: у него свой клиент Redis и свой список слушателей
+    writer_cache = PostCacheRedis(make_redis(0), make_redis(0, decode_responses=False))
+    with session_factory() as session:
+        post = session.query(Post).order_by(Post.id.desc()).first()
+        post.title = "Новый заголовок"
+        session.commit()
+        # Подписка асинхронная: ждем, пока поток слушателя подпишется на канал
+        assert _wait_for(lambda: writer_cache.cache.pubsub_numsub(post_list_snapshot.POSTS_INVALIDATION_CHANNEL)[0][1])
+        PostService(posts_cache=writer_cache, session=session).invalidate_posts({post.id: post.author_id}, "updated")
+
+    assert _wait_for(lambda: materializer.snapshot is None)
+    assert materializer.refresh()
+    assert "Новый заголовок".encode() in materializer.snapshot.body
+
+
+def test_failed_refresh_drops_snapshot(monkeypatch, posts_cache, posts):
+    materializer = PostListMaterializer(size=2, interval=0.01)
+    materializer.refresh()
+    def get_engine():
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(post_list_snapshot, "get_engine", get_engine)
+    materializer.start()
+    try:
+        assert _wait_for(lambda: materializer.snapshot is None)
+    finally:
+        materializer.stop()
+
+
+def test_posts_beyond_snapshot_window_are_reachable_by_cursor(client, session_factory):
+    with session_factory() as session:
+        session.add(User(uuid="author", username="author", email="author@example.com", hashed_password="x"))
+        created_at = datetime(2026, 1, 1)
+        # Одинаковое время создания: страницы различает только id
+        for number in range(5):
+            session.add(Post(title=f"Пост {number}", description="d", author_id="author", created_at=created_at))
+        session.commit()
+
+    titles, cursor = [], None
+    while True:
+        page = client.get("/api/v1/posts/", params={"limit": 2, **({"cursor": cursor} if cursor else {})}).json()
+        # Внутри страницы посты от старых к новым, страницы — от новых к старым
+        titles = [post["title"] for post in page["posts"]] + titles
+        if not (cursor := page["next_cursor"]):
+            break
+    assert titles == [f"Пост {number}" for number in range(5)]
+
+    assert client.get("/api/v1/posts/", params={"cursor": "not-a-cursor"}).status_code == 400
@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from src.api.v1.schemas import PostCreate
+from src.db import memory_cache
+from src.models import PostOutbox, User
+from src.services.outbox import PostOutboxWorker
+from src.services.post import PostService
+
+
+@pytest.fixture
+def post_service_factory(session_factory):
+    posts_cache = memory_cache.create_posts_cache()
+    with session_factory() as session:
+        session.add(User(uuid="author", username="author", email="author@example.com", hashed_password="x"))
+        session.commit()
+    return lambda: PostService(posts_cache=posts_cache, session=session_factory())
+
+
+def _outbox_events(session_factory):
+    with session_factory() as session:
+        return [event.event for event in session.query(PostOutbox).all()]
+
+
+def test_create_post_defers_cache_to_outbox_worker(monkeypatch, post_service_factory, session_factory):
+    monkeypatch.setattr(PostService, "outbox_enabled", True)
+    etag = post_service_factory().get_list_etag()
+    post = post_service_factory().create_post(PostCreate(title="t", description="d"), author_id="author")
+
+    assert _outbox_events(session_factory) == ["created"]
+    assert post_service_factory().get_list_etag() == etag
+    assert post_service_factory().get_post_etag(post["id"]) is None
+
+
+def test_create_post_invalidates_in_request_without_outbox_worker(monkeypatch, post_service_factory, session_factory):
+    monkeypatch.setattr(PostService, "outbox_enabled", False)
+    post_service = post_service_factory()
+    etag = post_service.get_list_etag()
+    post_service.posts_cache.set(key="author:author", value="stale page")
+    post = post_service_factory().create_post(PostCreate(title="t", description="d"), author_id="author")
+
+    # Событий, которые некому разобрать, нет, а список и лента автора уже сброшены
+    assert _outbox_events(session_factory) == []
+    assert post_service_factory().get_list_etag() != etag
+    assert post_service.posts_cache.get("author:author") is None
+    assert post_service_factory().get_post_etag(post["id"]) == f'"{post["id"]}-1"'
+
+
+def test_outbox_worker_does_not_touch_database_on_start(monkeypatch):
+    calls = []
+    monkeypatch.setattr(PostOutboxWorker, "process_batch", lambda self: calls.append(1) or 0)
+    worker = PostOutboxWorker(poll_interval=0.2)
+    worker.start()
+    try:
+        time.sleep(0.05)
+        assert calls == []
+        time.sleep(0.3)
+        assert calls
+    finally:
+        worker.stop()
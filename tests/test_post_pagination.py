@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import Session
+
+from src.db import memory_cache
+from src.models import Post, User
+from src.services import InvalidCursorError, encode_cursor
+from src.services.post import PostService
+
+TAMPERED_CURSORS = [
+    "not-a-cursor",
+    encode_cursor("x", 1),
+    encode_cursor(1),
+    encode_cursor(1, 2, 3),
+    encode_cursor(None, None),
+    encode_cursor(1.5, "x"),
+    encode_cursor(1.5, 10 ** 30),
+]
+
+
+def _add_posts(session: Session, titles, created_at: datetime, author_id: str = "author") -> list:
+    if session.get(User, author_id) is None:
+        session.add(User(uuid=author_id, username=author_id, email=f"{author_id}@example.com", hashed_password="x"))
+        session.commit()
+    posts = [Post(title=title, description="текст", author_id=author_id, created_at=created_at) for title in titles]
+    session.add_all(posts)
+    session.commit()
+    return [post.id for post in posts]
+
+
+def _read_all_pages(read_page) -> list:
+    ids, cursor = [], None
+    while True:
+        page = read_page(cursor)
+        ids.extend(post["id"] for post in page["posts"])
+        if not (cursor := page["next_cursor"]):
+            return ids
+
+
+@pytest.fixture
+def post_service_factory(session_factory):
+    posts_cache = memory_cache.create_posts_cache()
+    return lambda: PostService(posts_cache=posts_cache, session=session_factory())
+
+
+def test_author_feed_pages_through_equal_created_at(post_service_factory, session_factory):
+    now = datetime(2026, 1, 1)
+    with session_factory() as session:
+        older = _add_posts(session, ["a", "b", "c"], now - timedelta(days=1))
+        newer = _add_posts(session, ["d", "e", "f", "g"], now)
+        _add_posts(session, ["чужой"], now, author_id="other")
+
+    ids = _read_all_pages(lambda cursor: post_service_factory().get_author_posts("author", limit=2, cursor=cursor))
+    # Новые сначала, при равном времени — по возрастанию id
+    assert ids == newer + older
+
+
+def test_only_default_first_author_page_is_cached(post_service_factory, session_factory, monkeypatch):
+    monkeypatch.setattr("src.services.post.POSTS_PAGE_SIZE", 2)
+    with session_factory() as session:
+        _add_posts(session, ["a", "b", "c"], datetime(2026, 1, 1))
+    post_service = post_service_factory()
+
+    first_page = post_service.get_author_posts("author", limit=2)
+    assert post_service.posts_cache.get("author:author") is not None
+    post_service.posts_cache.delete("author:author")
+    post_service.get_author_posts("author", limit=1)
+    post_service.get_author_posts("author", limit=2, cursor=first_page["next_cursor"])
+    assert post_service.posts_cache.get("author:author") is None
+
+
+def test_cached_author_page_is_dropped_when_author_posts(post_service_factory, session_factory, monkeypatch):
+    monkeypatch.setattr("src.services.post.POSTS_PAGE_SIZE", 2)
+    with session_factory() as session:
+        _add_posts(session, ["a"], datetime(2026, 1, 1))
+        _add_posts(session, ["чужой"], datetime(2026, 1, 2), author_id="other")
+    post_service_factory().get_author_posts("author", limit=2)
+    post_service_factory().get_author_posts("other", limit=2)
+
+    with session_factory() as session:
+        [post_id] = _add_posts(session, ["b"], datetime(2026, 1, 3))
+        # Пока кэш не сброшен, отдается закэшированная страница
+        assert len(post_service_factory().get_author_posts("author", limit=2)["posts"]) == 1
+        post_service_factory().warm_created_posts([session.get(Post, post_id)])
+
+    assert post_service_factory().get_author_posts("author", limit=2)["posts"][0]["id"] == post_id
+    # Лента другого автора осталась в кэше
+    assert post_service_factory().posts_cache.get("author:other") is not None
+
+
+@pytest.mark.parametrize("cursor", TAMPERED_CURSORS)
+def test_tampered_cursor_is_rejected(client, cursor):
+    assert client.get("/api/v1/users/author/posts", params={"cursor": cursor}).status_code == 400
+    assert client.get("/api/v1/posts/search", params={"q": "текст", "cursor": cursor}).status_code == 400
+
+
+@pytest.fixture
+def pg_post_service_factory(pg_engine):
+    posts_cache = memory_cache.create_posts_cache()
+    sessions = []
+
+    def make():
+        sessions.append(Session(pg_engine))
+        return PostService(posts_cache=posts_cache, session=sessions[-1])
+
+    yield make
+    # Открытая транзакция не дала бы откатить миграции
+    for session in sessions:
+        session.close()
+
+
+def test_search_pages_through_equal_rank(pg_engine, pg_post_service_factory):
+    with Session(pg_engine) as session:
+        ties = _add_posts(session, ["кошка"] * 5, datetime(2026, 1, 1))
+        best = _add_posts(session, ["кошка кошка кошка"], datetime(2026, 1, 1))
+        _add_posts(session, ["собака"], datetime(2026, 1, 1))
+
+    ids = _read_all_pages(lambda cursor: pg_post_service_factory().search_posts("кошка", limit=2, cursor=cursor))
+    # Выше ранг сначала, при равном ранге — по убыванию id
+    assert ids == best + sorted(ties, reverse=True)
+
+
+@pytest.mark.parametrize("cursor", TAMPERED_CURSORS)
+def test_tampered_search_cursor_is_rejected_by_postgres(pg_engine, pg_post_service_factory, cursor):
+    with pytest.raises(InvalidCursorError):
+        pg_post_service_factory().search_posts("кошка", limit=2, cursor=cursor)
@@ -0,0 +1,136 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.core import profiling
+from src.core.profiling import ProfilingBusyError, ProfilingMiddleware, run_profiling, span
+
+# Строка collapsed stacks: кадры через ";", через пробел — вес
+COLLAPSED_LINE = re.compile(r"^[^ ;]+( [^ ;]+)?(;[^;]+)* \d+$")
+
+
+@pytest.fixture
+def client():
+    pytest.importorskip("requests")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        with span("redis:GET"):
+            time.sleep(0.002)
+        return {"id": item_id}
+
+    @app.get("/profiled")
+    def is_profiled():
+        return profiling._request_spans.get() is not None
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def profile_in_background():
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    def start(**kwargs):
+        future = executor.submit(run_profiling, **kwargs)
+        while profiling._active_session is None:
+            assert not future.done(), future.result()
+            time.sleep(0.001)
+        return future
+
+    yield start
+    executor.shutdown(wait=True)
+
+
+def _busy(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_middleware_records_nothing_without_session(client, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(profiling, "record_span", lambda *args: recorded.append(args))
+
+    assert client.get("/items/1").json() == {"id": 1}
+    assert client.get("/profiled").json() is False
+    assert recorded == []
+
+
+def test_profiling_stops_after_seconds():
+    started_at = time.monotonic()
+    report = run_profiling(seconds=0.05, interval_ms=1, max_requests=10)
+
+    assert time.monotonic() - started_at < 1
+    assert report["samples"] > 0
+    assert report["requests_profiled"] == 0
+    assert profiling._active_session is None
+
+
+def test_profiling_stops_after_max_requests(client, profile_in_background):
+    future = profile_in_background(seconds=10, interval_ms=1, max_requests=2)
+    assert client.get("/profiled").json() is True
+    client.get("/items/1")
+
+    report = future.result(timeout=2)
+
+    # Сессия закончилась, следующий запрос уже не профилируется
+    assert client.get("/profiled").json() is False
+    assert report["requests_profiled"] == 2
+    assert report["spans"]["redis:GET"]["count"] == 1
+    assert report["spans"]["redis:GET"]["max_ms"] >= 2
+
+
+def test_only_one_session_at_a_time(client, profile_in_background):
+    future = profile_in_background(seconds=10, interval_ms=1, max_requests=1)
+
+    with pytest.raises(ProfilingBusyError):
+        run_profiling(seconds=0.01)
+
+    client.get("/items/1")
+    assert future.result(timeout=2)["requests_profiled"] == 1
+    assert run_profiling(seconds=0.01)["requests_profiled"] == 0
+
+
+def test_admin_endpoint_answers_conflict_while_profiling(profile_in_background):
+    pytest.importorskip("requests")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from src.api.v1.resources import admin
+
+    app = FastAPI()
+    app.include_router(router=admin.router, prefix="/api/v1/admin")
+    app.dependency_overrides = {admin.get_superuser: lambda: None}
+    future = profile_in_background(seconds=0.5, interval_ms=1, max_requests=1)
+
+    response = TestClient(app).post("/api/v1/admin/profile", params={"seconds": 0.01})
+
+    assert response.status_code == 409
+    future.result(timeout=2)
+
+
+def test_report_is_in_collapsed_stacks_format(client, profile_in_background):
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy, args=(stop,))
+    worker.start()
+    try:
+        future = profile_in_background(seconds=10, interval_ms=1, max_requests=1)
+        client.get("/items/42")
+        report = future.result(timeout=2)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert all(COLLAPSED_LINE.match(line) for line in report["stacks"] + report["request_stacks"])
+    assert any(line.split(" ")[0].endswith(f"{__name__}:_busy") for line in report["stacks"])
+    # Путь с идентификатором сводится к шаблону, спан — дочерний кадр запроса
+    request_stacks = dict(line.rsplit(" ", 1) for line in report["request_stacks"])
+    assert set(request_stacks) == {"GET /items/{id}", "GET /items/{id};redis:GET"}
+    assert int(request_stacks["GET /items/{id};redis:GET"]) >= 2000
@@ -0,0 +1,168 @@
+import pytest
+
+from src.api.v1.schemas import UserCreate
+from src.db import memory_cache, redis_cache
+from src.db.redis_batch import batched, resolve
+from src.db.redis_cache import AccessCacheRedis, RefreshCacheRedis
+from src.services.user import UserService
+
+
+@pytest.fixture
+def round_trips(monkeypatch):
+    """Обращения к Redis: каждая команда вне пайплайна и каждый пайплайн — один запрос"""
+    calls = []
+    guarded_call = redis_cache._guarded_call
+
+    def counting_call(breaker, latency_name, span_name, func, *args, **kwargs):
+        calls.append(span_name)
+        return guarded_call(breaker, latency_name, span_name, func, *args, **kwargs)
+
+    monkeypatch.setattr(redis_cache, "_guarded_call", counting_call)
+    return calls
+
+
+def test_resolve_fetches_independent_reads_in_one_round_trip(make_redis, round_trips):
+    access, refresh = make_redis(1), make_redis(2)
+    access.set("token", "blocked")
+    refresh.sadd("user", "a", "b")
+    round_trips.clear()
+
+    @batched
+    def lookup():
+        return resolve(lambda: access.get("token"), lambda: refresh.smembers("user"))
+
+    assert lookup() == ["blocked", {"a", "b"}]
+    assert len(round_trips) == 1
+
+
+def test_replay_of_different_command_is_rejected(make_redis):
+    client = make_redis(0)
+    keys = iter(["first", "second"])
+
+    @batched
+    def lookup():
+        # Ключ меняется между записью и повтором: ответ для "first" не должен достаться "second"
+        return resolve(lambda: client.get(next(keys)))
+
+    with pytest.raises(RuntimeError):
+        lookup()
+
+
+def test_replay_with_fewer_commands_is_rejected(make_redis):
+    client = make_redis(0)
+    calls = iter([2, 1])
+
+    @batched
+    def lookup():
+        return resolve(lambda: [client.get(f"key{number}") for number in range(next(calls))])
+
+    with pytest.raises(RuntimeError):
+        lookup()
+
+
+def test_calls_without_pipelined_commands_run_once():
+    store = memory_cache.MemoryStore()
+    refresh_cache = memory_cache.RefreshCacheMemory(cache_instance=store)
+    refresh_cache.add_session("alice", "token-1", family="family-1", info="{}", expire=60)
+
+    @batched
+    def change():
+        return resolve(
+            lambda: store.incr("counter"),
+            lambda: refresh_cache.rotate("alice", "token-1", "token-2", family="family-1", expire=60),
+        )
+
+    # Повторный rotate с тем же токеном счел бы его переиспользованным и отозвал сессию
+    assert change() == [1, True]
+    assert store.get("counter") == "1"
+    assert refresh_cache.get_all("alice") == {"token-2"}
+
+
+def test_only_pipelined_calls_are_replayed(make_redis, round_trips):
+    client = make_redis(0)
+    client.set("key", "value")
+    store = memory_cache.MemoryStore()
+    round_trips.clear()
+
+    @batched
+    def lookup():
+        return resolve(lambda: store.incr("counter"), lambda: client.get("key"))
+
+    assert lookup() == [1, "value"]
+    assert store.get("counter") == "1"
+    assert len(round_trips) == 1
+
+
+def test_read_sees_earlier_writes_in_one_round_trip(make_redis, round_trips):
+    client = make_redis(0)
+
+    @batched
+    def write_then_read():
+        client.set("key", "value")
+        client.sadd("set", "member")
+        assert round_trips == []
+        return client.get("key")
+
+    assert write_then_read() == "value"
+    assert len(round_trips) == 1
+    assert client.smembers("set") == {"member"}
+
+
+def test_commands_to_other_databases_restore_home_database(make_redis, round_trips):
+    first, second = make_redis(1), make_redis(2)
+
+    @batched
+    def write_both():
+        first.set("key", "db1")
+        second.set("key", "db2")
+        return second.get("key")
+
+    assert write_both() == "db2"
+    assert len(round_trips) == 1
+    # Соединение вернулось в пул первого клиента: его команды снова идут в db1
+    assert first.get("key") == "db1"
+    assert make_redis(2).get("key") == "db2"
+
+
+def test_queued_writes_are_dropped_on_exception(make_redis, round_trips):
+    client = make_redis(0)
+
+    @batched
+    def fail_after_write():
+        client.set("key", "value")
+        raise ValueError("failed")
+
+    with pytest.raises(ValueError):
+        fail_after_write()
+    assert round_trips == []
+    assert client.get("key") is None
+
+
+@pytest.fixture
+def user_service_factory(make_redis, session_factory):
+    access_cache = AccessCacheRedis(make_redis(1))
+    refresh_cache = RefreshCacheRedis(make_redis(2))
+    return lambda: UserService(
+        access_tokens_cache=access_cache, refresh_tokens_cache=refresh_cache, session=session_factory()
+    )
+
+
+@pytest.fixture
+def access_header(user_service_factory):
+    user_service = user_service_factory()
+    user = user_service.register(UserCreate(username="alice", email="alice@example.com", password="secret"))
+    _, refresh_uuid = user_service.generate_refresh_token(user)
+    return f"Bearer {user_service.generate_access_token(user, refresh_uuid)}"
+
+
+def test_refresh_by_access_token_takes_two_round_trips(user_service_factory, access_header, round_trips):
+    # Проверка токена, затем блокировка старого access токена вместе с заменой refresh токена
+    assert user_service_factory().refresh_tokens_by_access_token(access_header)
+    assert len(round_trips) == 2
+
+
+def test_logout_takes_two_round_trips(user_service_factory, access_header, round_trips):
+    # Проверка токена, затем блокировка access токена вместе с отзывом сессии
+    assert user_service_factory().logout(access_header)
+    assert len(round_trips) == 2
+    assert user_service_factory().get_user_by_access_token(access_header) is None
@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+from src.api.v1.schemas import UserCreate
+from src.db.redis_cache import AccessCacheRedis, RefreshCacheRedis
+from src.services.user import UserService
+
+
+@pytest.fixture
+def refresh_cache(make_redis):
+    return RefreshCacheRedis(make_redis(2))
+
+
+@pytest.fixture
+def user_service_factory(make_redis, refresh_cache, session_factory):
+    access_cache = AccessCacheRedis(make_redis(1))
+    return lambda: UserService(
+        access_tokens_cache=access_cache,
+        refresh_tokens_cache=refresh_cache,
+        session=session_factory(),
+    )
+
+
+@pytest.fixture
+def user(user_service_factory):
+    return user_service_factory().register(UserCreate(username="alice", email="alice@example.com", password="secret"))
+
+
+def _refresh(user_service_factory, token: str):
+    return user_service_factory().refresh_tokens_by_refresh_token(f"Bearer {token}")
+
+
+def test_concurrent_rotation_of_same_token_succeeds_once(user_service_factory, refresh_cache, user):
+    refresh_token, _ = user_service_factory().generate_refresh_token(user)
+    barrier = threading.Barrier(2)
+    results = []
+
+    def rotate():
+        barrier.wait()
+        results.append(_refresh(user_service_factory, refresh_token))
+
+    threads = [threading.Thread(target=rotate) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    succeeded = [result for result in results if result]
+    assert len(succeeded) == 1
+    # Активен только токен победителя, сессия не раздвоилась
+    assert len(refresh_cache.get_all(user.uuid)) == 1
+    assert _refresh(user_service_factory, succeeded[0][0])
+
+
+def test_reuse_of_rotated_token_revokes_family(user_service_factory, refresh_cache, make_redis, user):
+    refresh_token, refresh_uuid = user_service_factory().generate_refresh_token(user)
+    new_refresh_token, new_access_token = _refresh(user_service_factory, refresh_token)
+    # Повтор в окне REFRESH_TOKEN_REUSE_GRACE_IN_SECONDS — дубль запроса: отказ без отзыва сессии
+    assert _refresh(user_service_factory, refresh_token) is None
+    assert len(refresh_cache.get_all(user.uuid)) == 1
+
+    # Окно истекло
+    make_redis(2).delete(f"family:{refresh_uuid}:rotated")
+    assert _refresh(user_service_factory, refresh_token) is None
+    assert refresh_cache.get_all(user.uuid) == set()
+    assert refresh_cache.get_sessions(user.uuid) == {}
+    assert _refresh(user_service_factory, new_refresh_token) is None
+    assert user_service_factory().get_user_by_access_token(f"Bearer {new_access_token}") is None
+
+
+def test_access_token_is_rejected_without_revoking_session(user_service_factory, refresh_cache, user):
+    refresh_token, refresh_uuid = user_service_factory().generate_refresh_token(user)
+    access_token = user_service_factory().generate_access_token(user, refresh_uuid)
+
+    assert _refresh(user_service_factory, access_token) is None
+    assert refresh_cache.get_all(user.uuid) == {refresh_uuid}
+    assert user_service_factory().get_user_by_access_token(f"Bearer {access_token}") is not None
+    assert _refresh(user_service_factory, refresh_token)
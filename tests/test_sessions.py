@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from src.db import memory_cache
+from src.db.redis_cache import RefreshCacheRedis
+
+EXPIRE = 60
+
+
+@pytest.fixture(params=["redis", "memory"])
+def refresh_cache(request):
+    if request.param == "memory":
+        return memory_cache.create_refresh_cache()
+    return RefreshCacheRedis(request.getfixturevalue("make_redis")(2))
+
+
+def _expire_session(refresh_cache, key: str, family: str):
+    refresh_cache.cache.hset(f"sessions:{key}", f"{family}:e", str(int(time.time()) - 1))
+
+
+def test_foreign_session_cannot_be_revoked(refresh_cache):
+    refresh_cache.add_session("alice", "alice-token", family="alice-session", info="{}", expire=EXPIRE)
+    refresh_cache.add_session("mallory", "mallory-token", family="mallory-session", info="{}", expire=EXPIRE)
+
+    assert not refresh_cache.revoke_session("mallory", "alice-session")
+
+    assert refresh_cache.get_all("alice") == {"alice-token"}
+    assert "alice-session" in refresh_cache.get_sessions("alice")
+    # Без указателя на последний токен семейства повторное использование не отозвало бы сессию
+    assert refresh_cache.cache.get("family:alice-session") == "alice-token"
+    assert refresh_cache.rotate("alice", "alice-token", "alice-token-2", family="alice-session", expire=EXPIRE)
+
+
+def test_own_session_is_revoked(refresh_cache):
+    refresh_cache.add_session("alice", "token", family="session", info="{}", expire=EXPIRE)
+    refresh_cache.rotate("alice", "token", "token-2", family="session", expire=EXPIRE)
+
+    assert refresh_cache.revoke_session("alice", "session")
+    assert refresh_cache.get_all("alice") == set()
+    assert refresh_cache.get_sessions("alice") == {}
+    assert not refresh_cache.revoke_session("alice", "session")
+
+
+def test_expired_sessions_are_pruned(refresh_cache):
+    refresh_cache.add_session("alice", "old-token", family="old", info="{}", expire=EXPIRE)
+    refresh_cache.add_session("alice", "new-token", family="new", info="{}", expire=EXPIRE)
+    refresh_cache.touch_sessions({("alice", "old"): 1})
+    _expire_session(refresh_cache, "alice", "old")
+
+    sessions = refresh_cache.get_sessions("alice")
+    assert set(sessions) == {"new", "new:e"}
+    assert "old:u" not in refresh_cache.cache.hgetall("sessions:alice")
+
+
+def test_rotation_extends_session_expiry(refresh_cache):
+    refresh_cache.add_session("alice", "token", family="session", info="{}", expire=EXPIRE)
+    _expire_session(refresh_cache, "alice", "session")
+
+    assert refresh_cache.rotate("alice", "token", "token-2", family="session", expire=EXPIRE)
+    assert int(refresh_cache.get_sessions("alice")["session:e"]) > time.time()
@@ -0,0 +1,129 @@
+import codecs
+import io
+import json
+
+import pytest
+from sqlmodel import Session, select
+
+from src.models import User
+from src.services.user import hash_password
+from src.services.user_import import UserImportService, read_rows
+
+CSV = (
+    "username,email,password\r\n"
+    "alice,alice@example.com,secret-1\r\n"
+    "bob,bob@example.com,secret-2\r\n"
+    "alice,alice2@example.com,secret-3\r\n"
+    "carol,not-an-email,secret-4\r\n"
+    "existing,existing@example.com,secret-5\r\n"
+    "dave,dave@example.com,secret-6\r\n"
+)
+
+
+def _utf8_lines(text: str):
+    # Как в admin.py: байты загруженного файла, декодированные с пропуском BOM
+    return codecs.iterdecode(io.BytesIO(codecs.BOM_UTF8 + text.encode()), "utf-8-sig")
+
+
+def test_csv_rows_skip_bom_and_extra_values():
+    rows = list(read_rows(_utf8_lines(CSV + "erin,erin@example.com,secret-7,лишнее\r\n"), "csv"))
+
+    assert rows[0] == (2, {"username": "alice", "email": "alice@example.com", "password": "secret-1"})
+    assert rows[-1] == (8, {"username": "erin", "email": "erin@example.com", "password": "secret-7"})
+
+
+def test_ndjson_rows_report_unparsable_lines():
+    lines = [
+        '{"username": "alice", "email": "alice@example.com", "password": "secret-1"}\n',
+        "\n",
+        "{oops\n",
+        "[1, 2]\n",
+    ]
+
+    assert list(read_rows(lines, "ndjson")) == [
+        (1, {"username": "alice", "email": "alice@example.com", "password": "secret-1"}),
+        (3, "Invalid JSON"),
+        (4, "Expected JSON object"),
+    ]
+
+
+@pytest.fixture
+def pg_session(pg_engine):
+    with Session(pg_engine) as session:
+        session.add(User(uuid="existing", username="existing", email="existing@example.com", hashed_password="x"))
+        session.commit()
+        yield session
+
+
+def test_import_reports_every_row_and_totals(pg_session):
+    # В пачке по два пользователя: alice и ее повтор попадают в разные пачки, bob и alice — в одну
+    service = UserImportService(pg_session, chunk_size=2, hash_workers=1)
+
+    reports = list(service.import_rows(read_rows(_utf8_lines(CSV), "csv")))
+
+    assert [(report["line"], report["status"]) for report in reports[:-1]] == [
+        (2, "created"),
+        (3, "created"),
+        (4, "duplicate"),
+        (5, "invalid"),
+        (6, "duplicate"),
+        (7, "created"),
+    ]
+    assert reports[-1] == {"summary": {"created": 3, "duplicate": 2, "invalid": 1}}
+    assert reports[3]["error"] == "email: value is not a valid email address"
+    users = {user.username: user for user in pg_session.exec(select(User))}
+    assert set(users) == {"alice", "bob", "dave", "existing"}
+    assert users["alice"].uuid == reports[0]["uuid"]
+    assert users["alice"].email == "alice@example.com"
+    assert users["alice"].hashed_password == hash_password("secret-1")
+    assert users["existing"].hashed_password == "x"
+
+
+def test_duplicates_within_one_chunk(pg_session):
+    lines = [
+        json.dumps({"username": name, "email": f"{name}@example.com", "password": "secret"}) + "\n"
+        for name in ("frank", "frank", "existing", "grace", "frank")
+    ]
+    service = UserImportService(pg_session, chunk_size=100, hash_workers=1)
+
+    reports = list(service.import_rows(read_rows(lines, "ndjson")))
+
+    statuses = [report["status"] for report in reports[:-1]]
+    assert statuses == ["created", "duplicate", "duplicate", "created", "duplicate"]
+    assert all("uuid" not in report for report in reports[:-1] if report["status"] == "duplicate")
+    assert reports[-1] == {"summary": {"created": 2, "duplicate": 3, "invalid": 0}}
+    assert pg_session.exec(select(User).where(User.username == "frank")).one().email == "frank@example.com"
+
+
+def test_reimport_marks_all_users_as_duplicates(pg_session):
+    service = UserImportService(pg_session, chunk_size=3, hash_workers=1)
+    list(service.import_rows(read_rows(_utf8_lines(CSV), "csv")))
+
+    reports = list(service.import_rows(read_rows(_utf8_lines(CSV), "csv")))
+
+    assert reports[-1] == {"summary": {"created": 0, "duplicate": 5, "invalid": 1}}
+
+
+def test_admin_endpoint_streams_report(pg_engine, pg_session, monkeypatch):
+    pytest.importorskip("requests")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from src.api.v1.resources import admin
+
+    app = FastAPI()
+    app.include_router(router=admin.router, prefix="/api/v1/admin")
+    app.dependency_overrides = {admin.get_superuser: lambda: None}
+    monkeypatch.setattr(admin, "get_engine", lambda: pg_engine)
+
+    response = TestClient(app).post(
+        "/api/v1/admin/users/import",
+        data=codecs.BOM_UTF8 + CSV.encode(),
+        headers={"Content-Type": "text/csv"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    reports = [json.loads(line) for line in response.text.splitlines()]
+    assert reports[0]["username"] == "alice"
+    assert reports[-1] == {"summary": {"created": 3, "duplicate": 2, "invalid": 1}}